@@ -0,0 +1,77 @@
+# adaptive_duration.py
+import threading
+import time
+
+from rdma_stats import SteadyStateDetector, mean_ci
+
+
+def aggregate_series(results):
+    """Sum per-second samples across streams, index-aligned, over the seconds every stream has reported.
+
+    Runs on the monitor thread while stream threads add results and samples, so both are copied first.
+    """
+    series = [[s["bw_gbps"] for s in list(r.get("samples", []))] for r in list(results.values())]
+    series = [s for s in series if s]
+    if not series:
+        return []
+    n = min(len(s) for s in series)
+    return [sum(s[i] for s in series) for i in range(n)]
+
+
+class AdaptiveDurationMonitor:
+    """Stop a client run once the aggregate bandwidth mean is known to within ``ci_target``.
+
+    Watches the index-aligned per-second aggregate of all streams, ignores warm-up using the
+    steady-state detector, and calls ``perf.stop_streams()`` when the relative half-width of
+    the confidence interval of the steady-state mean drops below ``ci_target``. The perftest
+    ``--duration`` (the run's hard ceiling) still applies if the target is never reached.
+    """
+
+    def __init__(self, perf, ci_target=0.01, confidence=0.95, min_duration=5, interval=1.0):
+        self.perf = perf
+        self.ci_target = ci_target
+        self.confidence = confidence
+        self.min_duration = min_duration
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.outcome = {"reason": "ceiling", "ci_target": ci_target, "confidence": confidence}
+        self._thread = None
+
+    def evaluate(self):
+        """Return (mean, relative half-width, steady sample count) for the current aggregate."""
+        detector = SteadyStateDetector()
+        for value in aggregate_series(self.perf.results):
+            detector.add(value)
+        if not detector.is_steady():
+            return None
+        steady = detector.samples[detector.steady_start:]
+        if len(steady) < 3:
+            return None
+        m, half = mean_ci(steady, self.confidence)
+        return m, (half / m if m > 0 else float("inf")), len(steady)
+
+    def loop(self):
+        started = time.monotonic()
+        while not self.stop_event.wait(self.interval):
+            elapsed = time.monotonic() - started
+            estimate = self.evaluate()
+            if estimate is None:
+                continue
+            m, rel, n = estimate
+            self.outcome.update({"elapsed_s": round(elapsed, 1), "agg_mean_gbps": round(m, 3),
+                                 "ci_rel": round(rel, 5), "steady_samples": n})
+            if elapsed >= self.min_duration and rel <= self.ci_target:
+                self.outcome["reason"] = "ci_target"
+                print(f"[Adaptive] Aggregate {m:.2f} Gbps +/- {rel * 100:.2f}% after {elapsed:.0f}s "
+                      f"({n} steady samples); stopping streams")
+                self.perf.stop_streams("adaptive")
+                return
+
+    def start(self):
+        self._thread = threading.Thread(target=self.loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self._thread:
+            self._thread.join()
@@ -0,0 +1,228 @@
+# bottleneck.py
+import argparse
+import json
+import os
+import threading
+import time
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+# A run at or above this share of the achievable rate is limited by the link (or PCIe) itself
+AT_CEILING_PCT = 90.0
+# CNP + pause frames per second at which congestion is taken as fully explaining the gap
+CONGESTION_RATE = 1000.0
+# Fewer QPs in flight than this cannot keep a modern NIC busy
+MIN_QPS = 8
+# Message sizes at or below this are message-rate (CPU) bound when the polling core is saturated
+SMALL_MESSAGE = 4096
+CPU_SATURATED = 0.95
+CATEGORIES = ["link", "pcie", "congestion", "numa", "cpu", "qp_count"]
+
+
+def _mean(values):
+    values = list(values)
+    return sum(values) / len(values) if values else None
+
+
+def read_process_times(proc_root="/proc"):
+    """{pid: (pgrp, utime + stime ticks)} for every process readable in /proc."""
+    times = {}
+    for name in os.listdir(proc_root):
+        if not name.isdigit():
+            continue
+        try:
+            with open(os.path.join(proc_root, name, "stat")) as f:
+                stat = f.read()
+        except OSError:
+            continue
+        fields = stat[stat.rfind(")") + 2:].split()
+        try:
+            times[int(name)] = (int(fields[2]), int(fields[11]) + int(fields[12]))
+        except (IndexError, ValueError):
+            continue
+    return times
+
+
+class CpuSampler:
+    """Per-stream CPU use from /proc: utime + stime of every process in each stream's process group,
+    sampled while the streams run (a process's counters are gone once it exits)."""
+
+    def __init__(self, perf, interval=1.0, proc_root="/proc"):
+        self.perf = perf
+        self.interval = interval
+        self.proc_root = proc_root
+        self.ticks = {}
+        self.window = {}
+        self.stop_event = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        groups = {a["proc"].pid: (tid, a["started"]) for tid, a in list(self.perf.stream_activity.items())}
+        if not groups:
+            return
+        now = time.monotonic()
+        for pid, (pgrp, ticks) in read_process_times(self.proc_root).items():
+            if pgrp not in groups:
+                continue
+            tid, started = groups[pgrp]
+            self.ticks[(tid, pid)] = max(self.ticks.get((tid, pid), 0), ticks)
+            first, _ = self.window.get(tid, (started, now))
+            self.window[tid] = (min(first, started), now)
+
+    def loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """{thread_id: {"cpu_s", "cpu_util"}}; cpu_util is cores busy on average (1.0 = one core)."""
+        self.stop_event.set()
+        if self._thread:
+            self._thread.join()
+        usage = {}
+        for (tid, _), ticks in self.ticks.items():
+            usage[tid] = usage.get(tid, 0) + ticks
+        out = {}
+        for tid, ticks in usage.items():
+            first, last = self.window[tid]
+            cpu_s = ticks / CLK_TCK
+            out[tid] = {"cpu_s": round(cpu_s, 2), "cpu_util": round(cpu_s / max(last - first, self.interval), 3)}
+        return out
+
+
+def score_link(m, add):
+    link = m.get("link") or {}
+    model = link.get("model") or {}
+    pct = link.get("pct_of_achievable")
+    if pct is None or model.get("limit") != "wire":
+        return
+    if pct >= AT_CEILING_PCT:
+        add(0.9, f"{link['total_gbps']:.1f} Gbps is {pct:.0f}% of the {link['achievable_gbps']:.1f} Gbps wire "
+                 f"ceiling for {model['size']} B messages (IB MTU {model.get('roce_mtu')})")
+
+
+def score_pcie(m, add):
+    link = m.get("link") or {}
+    model = link.get("model") or {}
+    pct = link.get("pct_of_achievable")
+    if "pcie_gbps" not in model or pct is None:
+        return
+    if model.get("limit") == "pcie" and pct >= AT_CEILING_PCT:
+        add(0.9, f"{link['total_gbps']:.1f} Gbps is {pct:.0f}% of the PCIe Gen{model.get('pcie_gen')} "
+                 f"x{model['pcie_width']} ceiling ({model['pcie_gbps']:.1f} Gbps), below the wire's "
+                 f"{model.get('wire_gbps', 0):.1f} Gbps")
+    if "pcie_degraded" in model:
+        add(0.8 if model.get("limit") == "pcie" else 0.4, f"PCIe link trained at {model['pcie_degraded']}")
+
+
+def score_congestion(m, add):
+    c = m.get("congestion") or {}
+    rate = c.get("cnp_per_s", 0) + c.get("pause_per_s", 0)
+    if c.get("cnp"):
+        add(0.5 + 0.4 * min(1.0, rate / CONGESTION_RATE),
+            f"{c['cnp']} CNPs ({c['cnp_per_s']:.0f}/s), {c.get('ecn_marked', 0)} ECN-marked packets")
+    if c.get("pause_frames"):
+        add(0.5 + 0.4 * min(1.0, rate / CONGESTION_RATE),
+            f"{c['pause_frames']} PFC pause frames ({c['pause_per_s']:.0f}/s)")
+    if c.get("out_of_sequence"):
+        add(0.6, f"{c['out_of_sequence']} out-of-sequence packets (drops on a fabric that should be lossless)")
+
+
+def score_numa(m, add):
+    nic = m.get("nic_numa_node")
+    streams = [s for s in m.get("streams", []) if s.get("numa_node") is not None]
+    if nic is None or not streams:
+        return
+    remote = [s for s in streams if s["numa_node"] != nic]
+    if not remote:
+        return
+    local = [s for s in streams if s["numa_node"] == nic]
+    evidence = (f"{len(remote)} of {len(streams)} streams run on cores outside NIC node {nic} "
+                f"(cores {sorted({s['core'] for s in remote})})")
+    score = 0.4 + 0.4 * len(remote) / len(streams)
+    remote_bw, local_bw = _mean(s["bw_gbps"] for s in remote), _mean(s["bw_gbps"] for s in local)
+    if local_bw and remote_bw < 0.9 * local_bw:
+        score += 0.15
+        evidence += f"; remote streams average {remote_bw:.1f} Gbps vs {local_bw:.1f} Gbps local"
+    add(score, evidence)
+
+
+def score_cpu(m, add):
+    streams = m.get("streams", [])
+    by_core = {}
+    for s in streams:
+        if s.get("core") is not None:
+            by_core.setdefault(s["core"], []).append(s)
+    shared = [s for group in by_core.values() if len(group) > 1 for s in group]
+    if shared:
+        worst = max(by_core.values(), key=len)
+        add(0.5 + 0.4 * len(shared) / len(streams),
+            f"{len(streams)} streams share {len(by_core)} core{'s' if len(by_core) > 1 else ''} "
+            f"(up to {len(worst)} on core {worst[0]['core']})")
+    saturated = [s for s in streams if (s.get("cpu_util") or 0) >= CPU_SATURATED]
+    if saturated and m.get("size", 0) <= SMALL_MESSAGE:
+        rate = sum(s.get("msg_rate_mpps") or 0 for s in streams)
+        add(0.6, f"{len(saturated)} streams keep their core {_mean(s['cpu_util'] for s in saturated) * 100:.0f}% "
+                 f"busy at {m['size']} B messages ({rate:.1f} Mpps total): message-rate bound")
+
+
+def score_qp_count(m, add):
+    qps = (m.get("threads") or 0) * (m.get("qdepth") or 0)
+    if 0 < qps < MIN_QPS:
+        add(0.3 + 0.5 * (1 - qps / MIN_QPS), f"only {qps} QPs in flight ({m['threads']} streams x -q {m['qdepth']})")
+
+
+SCORERS = {"link": score_link, "pcie": score_pcie, "congestion": score_congestion, "numa": score_numa,
+           "cpu": score_cpu, "qp_count": score_qp_count}
+
+
+def classify(metrics):
+    """Most likely limiting factor of one run from its recorded metrics.
+
+    Every category collects (score, evidence) pairs; its score is the strongest one. The highest-scoring
+    category wins. ``unknown`` means no ceiling, counter or placement signal explains the result.
+    """
+    candidates = []
+    for category, scorer in SCORERS.items():
+        found = []
+        scorer(metrics, lambda score, evidence: found.append((round(min(score, 1.0), 2), evidence)))
+        if found:
+            candidates.append({"category": category, "score": max(s for s, _ in found),
+                               "evidence": [e for _, e in sorted(found, reverse=True)]})
+    candidates.sort(key=lambda c: (-c["score"], CATEGORIES.index(c["category"])))
+    link = metrics.get("link") or {}
+    top = candidates[0] if candidates else {"category": "unknown", "score": 0.0, "evidence": [
+        "no ceiling, congestion, placement or QP-count signal explains the result"]}
+    slow = link.get("slow_streams") or []
+    return {"bottleneck": top["category"], "score": top["score"], "evidence": top["evidence"],
+            "pct_of_achievable": link.get("pct_of_achievable"), "slow_streams": slow,
+            "candidates": candidates}
+
+
+def print_diagnosis(diagnosis):
+    pct = diagnosis.get("pct_of_achievable")
+    print(f"\n[Diagnosis] Likely bottleneck: {diagnosis['bottleneck']} (score {diagnosis['score']:.2f}"
+          + (f", run at {pct:.0f}% of achievable)" if pct is not None else ")"))
+    for evidence in diagnosis["evidence"]:
+        print(f"- {evidence}")
+    others = [f"{c['category']} {c['score']:.2f}" for c in diagnosis["candidates"][1:]]
+    if others:
+        print(f"- Also considered: {', '.join(others)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify the limiting factor of a recorded run")
+    parser.add_argument("metrics", help="logs/<role>_<id>_diagnosis_<ts>.json, or a bare metrics fixture")
+    parser.add_argument("--json", action="store_true", help="Print the diagnosis as JSON")
+    args = parser.parse_args()
+
+    with open(args.metrics) as f:
+        data = json.load(f)
+    result = classify(data.get("metrics", data))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_diagnosis(result)
@@ -0,0 +1,54 @@
+# check_import_time.py
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Loaded only when the matching option is enabled; a plain client run must not pull them in
+OPTIONAL_MODULES = ["prometheus_client", "prometheus_exporter", "gpu_exporter", "pynvml", "numpy", "sqlite3",
+                    "result_db", "result_log", "timeline", "adaptive_duration", "trial_runner",
+                    "concurrent.futures"]
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure(module, python=sys.executable):
+    """Cumulative import time of ``module`` (usec, from -X importtime) and the modules it loaded, in a fresh interpreter."""
+    code = f"import sys, json, {module}; print(json.dumps(sorted(sys.modules)))"
+    proc = subprocess.run([python, "-X", "importtime", "-c", code], cwd=REPO, capture_output=True, text=True,
+                          check=True)
+    cumulative = None
+    for line in proc.stderr.splitlines():
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            cumulative = int(parts[1])
+    return cumulative, json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def check(module="run_rdma_test", budget_ms=60.0, runs=5):
+    """Best-of-``runs`` import time against the budget, plus optional modules that got imported."""
+    times, loaded = [], set()
+    for _ in range(runs):
+        usec, modules = measure(module)
+        times.append(usec / 1000.0)
+        loaded = set(modules)
+    best = min(times)
+    leaked = [m for m in OPTIONAL_MODULES if m in loaded]
+    return {"module": module, "best_ms": round(best, 1), "budget_ms": budget_ms,
+            "runs_ms": [round(t, 1) for t in times], "optional_loaded": leaked,
+            "ok": best <= budget_ms and not leaked}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if importing the CLI gets slow or loads optional subsystems")
+    parser.add_argument("--module", default="run_rdma_test", help="Module to import")
+    parser.add_argument("--budget-ms", type=float, default=60.0, help="Best-of-N cumulative import time allowed")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure")
+    args = parser.parse_args()
+
+    result = check(args.module, args.budget_ms, args.runs)
+    print(f"[Import Time] {result['module']}: best {result['best_ms']:.1f} ms "
+          f"(budget {result['budget_ms']:.0f} ms; runs {result['runs_ms']})")
+    if result["optional_loaded"]:
+        print(f"[Import Time] Optional modules imported at startup: {', '.join(result['optional_loaded'])}")
+    sys.exit(0 if result["ok"] else 1)
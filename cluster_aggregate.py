@@ -0,0 +1,246 @@
+# cluster_aggregate.py
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+import result_db
+from result_log import read_segments
+
+SEGMENT_NAME = re.compile(r"^(.*)\.(\d{3})\.(jsonl|csv)$")
+
+
+def find_inputs(paths):
+    """Expand files/directories into stream-log runs (grouped segments) and plain result files."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "**", "*"), recursive=True))
+        else:
+            files.append(path)
+    runs, results = {}, []
+    for f in sorted(set(files)):
+        name = os.path.basename(f)
+        if not name.startswith("client_"):
+            # Server stream logs count the same bytes again from the receiving side
+            continue
+        match = SEGMENT_NAME.match(f)
+        if match:
+            runs.setdefault(match.group(1), []).append(f)
+        elif name.endswith(".json") and "_qpn_thread" not in name:
+            results.append(f)
+    # A run with a stream log is covered by its samples; drop its summary/legacy files
+    results = [f for f in results if not any(f.startswith(base) for base in runs)]
+    return runs, results
+
+
+def load_stream_log(segments):
+    """Read one client's stream-log segments into flat arrays (stream code, ts, bw) plus the stream labels."""
+    segments = sorted(segments)
+    run, codes, ts, bw, labels = {}, [], [], [], {}
+    for record in read_segments(segments, "csv" if segments[0].endswith(".csv") else "jsonl"):
+        kind = record.get("type")
+        if kind == "run":
+            run = record
+        elif kind == "sample" and "bw_gbps" in record:
+            codes.append(labels.setdefault(str(record["thread_id"]), len(labels)))
+            ts.append(record["ts"])
+            bw.append(record["bw_gbps"])
+    client = f"{(run.get('env') or {}).get('hostname', os.path.basename(segments[0]).split('.')[0])}" \
+             f":{run.get('client_id', '?')}"
+    return client, list(labels), np.array(codes, dtype=np.int64), np.array(ts, dtype=np.float64), \
+        np.array(bw, dtype=np.float64)
+
+
+def load_result_file(path):
+    """Final per-stream averages from a result file (no time series)."""
+    runs = result_db.parse_result_file(path)
+    out = []
+    for run in runs:
+        client = f"{run['env'].get('hostname', os.path.basename(path))}:{run['config'].get('client_id', '?')}"
+        for s in run["streams"]:
+            if isinstance(s.get("bw_avg_gbps"), (int, float)):
+                out.append((client, str(s.get("thread_id")), float(s["bw_avg_gbps"])))
+    return out
+
+
+def jain_index(matrix):
+    """Jain's fairness per column of a (streams x seconds) matrix, ignoring NaN (inactive) cells."""
+    x = np.nan_to_num(matrix, nan=0.0)
+    n = np.sum(~np.isnan(matrix), axis=0)
+    total = x.sum(axis=0)
+    sq = (x * x).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        j = total * total / (n * sq)
+    return np.where(n > 0, j, np.nan)
+
+
+def build_timeline(client_series):
+    """Align every client's samples on a shared one-second grid.
+
+    Returns (stream_keys, stream_client, t0, matrix) where matrix[s, k] is the mean BW of
+    stream s during second k (NaN when it reported nothing).
+    """
+    keys, owners, ts_all, bw_all, idx_all = [], [], [], [], []
+    for client, labels, codes, ts, bw in client_series:
+        if not len(ts):
+            continue
+        idx_all.append(codes + len(keys))
+        keys.extend(f"{client}/{label}" for label in labels)
+        owners.extend([client] * len(labels))
+        ts_all.append(ts)
+        bw_all.append(bw)
+    if not keys:
+        return [], [], None, np.empty((0, 0))
+    idx = np.concatenate(idx_all)
+    ts = np.concatenate(ts_all)
+    bw = np.concatenate(bw_all)
+    t0 = np.floor(ts.min())
+    sec = (ts - t0).astype(np.int64)
+    shape = (len(keys), int(sec.max()) + 1)
+    flat = idx * shape[1] + sec
+    sums = np.bincount(flat, weights=bw, minlength=shape[0] * shape[1]).reshape(shape)
+    counts = np.bincount(flat, minlength=shape[0] * shape[1]).reshape(shape)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        matrix = np.where(counts > 0, sums / counts, np.nan)
+    return keys, owners, t0, matrix
+
+
+def summarize_timeline(keys, owners, matrix):
+    agg = np.nansum(matrix, axis=0)
+    active = np.sum(~np.isnan(matrix), axis=0)
+    jain = jain_index(matrix)
+    full = active == len(keys)
+    window = full if full.any() else active > 0
+    per_stream = np.nanmean(np.where(window, matrix, np.nan), axis=1)
+    owners = np.array(owners)
+    clients = {}
+    total = np.nansum(per_stream)
+    for client in sorted(set(owners)):
+        bw = float(np.nansum(per_stream[owners == client]))
+        clients[client] = {"streams": int(np.sum(owners == client)), "bw_gbps": round(bw, 3),
+                           "share_pct": round(bw / total * 100, 2) if total else 0.0}
+    return {
+        "streams": len(keys),
+        "clients": clients,
+        "seconds": int(matrix.shape[1]),
+        "full_coverage_seconds": int(full.sum()),
+        "agg_mean_gbps": round(float(agg[window].mean()), 3),
+        "agg_peak_gbps": round(float(agg.max()), 3),
+        "jain_mean": round(float(np.nanmean(jain[window])), 4),
+        "jain_min": round(float(np.nanmin(jain[window])), 4),
+        "stream_jain": round(float(jain_index(per_stream[:, None])[0]), 4),
+    }, agg, jain, active
+
+
+def summarize_results(rows):
+    """Cluster totals from final per-stream averages (legacy result files)."""
+    clients = {}
+    for client, _, bw in rows:
+        c = clients.setdefault(client, {"streams": 0, "bw_gbps": 0.0})
+        c["streams"] += 1
+        c["bw_gbps"] += bw
+    total = sum(c["bw_gbps"] for c in clients.values())
+    for c in clients.values():
+        c["bw_gbps"] = round(c["bw_gbps"], 3)
+        c["share_pct"] = round(c["bw_gbps"] / total * 100, 2) if total else 0.0
+    values = np.array([bw for _, _, bw in rows])
+    return {"streams": len(rows), "clients": clients, "agg_mean_gbps": round(total, 3),
+            "stream_jain": round(float(jain_index(values[:, None])[0]), 4) if len(values) else None}
+
+
+class ClusterAggregator:
+    """Collect per-client result files or live stream logs and compute cluster-wide throughput and fairness."""
+
+    def __init__(self, paths, workers=None):
+        self.paths = paths
+        self.workers = workers
+
+    def collect(self):
+        runs, results = find_inputs(self.paths)
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            series = list(pool.map(load_stream_log, runs.values()))
+            rows = [r for out in pool.map(load_result_file, results) for r in out]
+        return series, rows
+
+    def aggregate(self):
+        started = time.monotonic()
+        series, rows = self.collect()
+        report = {}
+        if series:
+            keys, owners, t0, matrix = build_timeline(series)
+            if keys:
+                report["timeline"], agg, jain, active = summarize_timeline(keys, owners, matrix)
+                report["timeline"]["t0"] = t0
+                self.timeline = (t0, agg, jain, active)
+        if rows:
+            report["results"] = summarize_results(rows)
+        report["elapsed_s"] = round(time.monotonic() - started, 2)
+        return report
+
+    def write_timeline_csv(self, path):
+        t0, agg, jain, active = self.timeline
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["ts", "second", "agg_bw_gbps", "active_streams", "jain_index"])
+            for k in range(len(agg)):
+                writer.writerow([int(t0 + k), k, round(float(agg[k]), 3), int(active[k]),
+                                 "" if np.isnan(jain[k]) else round(float(jain[k]), 4)])
+        print(f"[Cluster] Timeline written to {path}")
+
+
+def print_report(report):
+    for scope in ("timeline", "results"):
+        if scope not in report:
+            continue
+        r = report[scope]
+        label = "per-second samples" if scope == "timeline" else "final per-stream averages"
+        print(f"\n[Cluster] From {label}: {r['streams']} streams, {len(r['clients'])} clients")
+        print(f"- Aggregate BW: {r['agg_mean_gbps']:.2f} Gbps"
+              + (f" (peak {r['agg_peak_gbps']:.2f}, {r['full_coverage_seconds']}/{r['seconds']}s with all "
+                 f"streams reporting)" if scope == "timeline" else ""))
+        if scope == "timeline":
+            print(f"- Jain's fairness per second: mean {r['jain_mean']:.4f}, min {r['jain_min']:.4f}")
+        if r.get("stream_jain") is not None:
+            print(f"- Jain's fairness of per-stream averages: {r['stream_jain']:.4f}")
+        for client, c in r["clients"].items():
+            print(f"  {client:<30} {c['streams']:>5} streams {c['bw_gbps']:>10.2f} Gbps {c['share_pct']:>6.2f}%")
+    print(f"[Cluster] Aggregated in {report['elapsed_s']}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate RDMA results from many client hosts")
+    parser.add_argument("paths", nargs="+", help="Result files, stream-log segments or directories "
+                                                 "(e.g. one collected logs/ directory per client)")
+    parser.add_argument("--workers", type=int, help="Loader processes (default: CPU count)")
+    parser.add_argument("--follow", type=float,
+                        help="Re-aggregate live stream logs every N seconds until interrupted")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--timeline-csv", help="Write the per-second cluster timeline here")
+    args = parser.parse_args()
+
+    aggregator = ClusterAggregator(args.paths, workers=args.workers)
+    try:
+        while True:
+            report = aggregator.aggregate()
+            if args.json:
+                print(json.dumps(report, indent=2))
+            else:
+                print_report(report)
+            if not args.follow:
+                break
+            time.sleep(args.follow)
+    except KeyboardInterrupt:
+        pass
+
+    if "timeline" in report:
+        path = args.timeline_csv or f"logs/cluster_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        aggregator.write_timeline_csv(path)
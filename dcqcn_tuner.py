@@ -0,0 +1,291 @@
+# dcqcn_tuner.py
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+
+import port_counters
+from load_sweep import LoadSweep
+from rdma_perf_tool import RDMAPerf
+
+DEBUGFS_ROOT = "/sys/kernel/debug/mlx5"
+
+# Reaction point (sender rate control) and notification point (CNP generation) knobs in mlx5 cc_params
+RP_PARAMS = ["rp_ai_rate", "rp_hai_rate", "rp_min_rate", "rp_clamp_tgt_rate", "rp_clamp_tgt_rate_ati",
+             "rp_threshold", "rp_time_reset", "rp_byte_reset", "rp_dce_tcp_g", "rp_dce_tcp_rtt",
+             "rp_rate_reduce_monitor_period", "rp_initial_alpha_value", "rp_gd", "rp_max_rate"]
+NP_PARAMS = ["np_min_time_between_cnps", "np_cnp_dscp", "np_cnp_prio_mode", "np_cnp_prio"]
+
+
+class DebugfsParamBackend:
+    """Read/write congestion-control parameters under ``<root>/<pci_addr>/cc_params``.
+
+    Handles both layouts seen in the field: a directory with one file per parameter (mlx5)
+    and a single ``key: value`` file (what enable_rocev2_dcqcn.sh writes ``ecn_en: 1`` into).
+    Point ``root`` at a fake tree to exercise the tuner without hardware.
+    """
+
+    def __init__(self, pci_addr, root=DEBUGFS_ROOT):
+        self.path = os.path.join(root, pci_addr, "cc_params")
+        if not os.path.exists(self.path):
+            raise RuntimeError(f"No cc_params at {self.path} (is debugfs mounted and are you root?)")
+
+    def available(self):
+        if os.path.isdir(self.path):
+            return sorted(os.listdir(self.path))
+        return sorted(self._read_file())
+
+    def _read_file(self):
+        values = {}
+        with open(self.path) as f:
+            for line in f:
+                key, sep, value = line.partition(":")
+                if sep:
+                    values[key.strip()] = value.strip()
+        return values
+
+    def read(self, name):
+        if os.path.isdir(self.path):
+            with open(os.path.join(self.path, name)) as f:
+                return f.read().strip()
+        return self._read_file()[name]
+
+    def write(self, name, value):
+        if os.path.isdir(self.path):
+            with open(os.path.join(self.path, name), "w") as f:
+                f.write(f"{value}\n")
+        else:
+            # One file holds every key: rewrite it whole with only ``name`` changed
+            with open(self.path) as f:
+                lines = f.read().splitlines()
+            replaced = False
+            for i, line in enumerate(lines):
+                key, sep, _ = line.partition(":")
+                if sep and key.strip() == name:
+                    lines[i] = f"{name}: {value}"
+                    replaced = True
+            if not replaced:
+                lines.append(f"{name}: {value}")
+            with open(self.path, "w") as f:
+                f.write("\n".join(lines) + "\n")
+
+    def snapshot(self, names):
+        return {name: self.read(name) for name in names}
+
+    def apply(self, params):
+        for name, value in params.items():
+            self.write(name, value)
+
+
+def parse_grid(specs, grid_file=None):
+    """``name=v1,v2,...`` specs (and/or a JSON {name: [values]} file) into an ordered grid."""
+    grid = {}
+    if grid_file:
+        with open(grid_file) as f:
+            grid.update({k: list(v) for k, v in json.load(f).items()})
+    for spec in specs or []:
+        name, sep, values = spec.partition("=")
+        if not sep or not values:
+            raise ValueError(f"Bad --param {spec!r}; expected name=v1,v2,...")
+        grid[name.strip()] = [v.strip() for v in values.split(",") if v.strip()]
+    return grid
+
+
+def grid_points(grid):
+    names = list(grid)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(grid[n] for n in names))]
+
+
+def pareto_front(rows, objectives):
+    """Rows not dominated on ``objectives`` [(field, "max"|"min")]; rows missing a field never dominate."""
+    def better_or_equal(a, b, field, goal):
+        return a[field] >= b[field] if goal == "max" else a[field] <= b[field]
+
+    def strictly_better(a, b, field, goal):
+        return a[field] > b[field] if goal == "max" else a[field] < b[field]
+
+    usable = [r for r in rows if all(r.get(f) is not None for f, _ in objectives)]
+    front = []
+    for r in usable:
+        dominated = any(
+            all(better_or_equal(o, r, f, g) for f, g in objectives)
+            and any(strictly_better(o, r, f, g) for f, g in objectives)
+            for o in usable if o is not r)
+        if not dominated:
+            front.append(r)
+    return front
+
+
+class BandwidthTrial:
+    """Short load-sweep step: rate-limited bw streams plus a latency probe (same server setup as --load-sweep)."""
+
+    def __init__(self, perf, link_speed, load_pct=100, probe_port=None):
+        self.sweep = LoadSweep(perf, link_speed, steps=[load_pct], probe_port=probe_port)
+        self.load_pct = load_pct
+
+    def __call__(self):
+        row = self.sweep.run_step(self.load_pct)
+        return {"throughput_gbps": row["achieved_gbps"], "t_avg_usec": row["t_avg_usec"],
+                "t_99_percentile_usec": row["t_99_percentile_usec"]}
+
+
+class IncastTrial:
+    """One incast.py run; throughput is the aggregate with every client joined."""
+
+    def __init__(self, incast):
+        self.incast = incast
+
+    def __call__(self):
+        report = self.incast.run()
+        last = report["joins"][-1] if report else {}
+        return {"throughput_gbps": last.get("agg_bw_gbps"), "jain_index": last.get("jain_mean"),
+                "max_min_ratio": last.get("max_min_ratio_mean")}
+
+
+class DCQCNTuner:
+    """Apply every parameter set in a grid, run a short trial and rank the settings.
+
+    Each point records throughput, CNP/ECN/pause rates from port counter deltas and, for
+    bandwidth trials, probe latency. The Pareto front over (max throughput, min CNP rate,
+    min p99 latency) is reported. Original parameter values are restored at the end.
+    """
+
+    def __init__(self, backend, grid, trial, rdma_dev=None, iface=None, settle=1.0,
+                 counter_root=port_counters.IB_ROOT):
+        self.backend = backend
+        self.grid = grid
+        self.trial = trial
+        self.rdma_dev = rdma_dev
+        self.iface = iface
+        self.settle = settle
+        self.counter_root = counter_root
+        self.rows = []
+
+    def run_point(self, index, params, total):
+        print(f"\n[DCQCN Tuner] Point {index + 1}/{total}: {params}")
+        self.backend.apply(params)
+        time.sleep(self.settle)
+        before = port_counters.snapshot(self.rdma_dev, self.iface, root=self.counter_root)
+        metrics = self.trial()
+        after = port_counters.snapshot(self.rdma_dev, self.iface, root=self.counter_root)
+        row = {"point": index, **params, **metrics,
+               **port_counters.congestion_summary(*port_counters.deltas(before, after))}
+        print(f"[DCQCN Tuner] -> {row.get('throughput_gbps')} Gbps, {row['cnp_per_s']} CNP/s, "
+              f"p99 {row.get('t_99_percentile_usec')} usec")
+        return row
+
+    def run(self):
+        unknown = [n for n in self.grid if n not in self.backend.available()]
+        if unknown:
+            raise ValueError(f"Parameters not exposed by the backend: {unknown}")
+        original = self.backend.snapshot(list(self.grid))
+        points = grid_points(self.grid)
+        try:
+            for i, params in enumerate(points):
+                self.rows.append(self.run_point(i, params, len(points)))
+        finally:
+            self.backend.apply(original)
+            print(f"[DCQCN Tuner] Restored {original}")
+        return self.rows
+
+    def objectives(self):
+        objectives = [("throughput_gbps", "max"), ("cnp_per_s", "min")]
+        if any(r.get("t_99_percentile_usec") is not None for r in self.rows):
+            objectives.append(("t_99_percentile_usec", "min"))
+        return objectives
+
+    def print_report(self):
+        front = {r["point"] for r in pareto_front(self.rows, self.objectives())}
+        names = list(self.grid)
+        widths = {n: max(len(n), 8) for n in names}
+        header = (" ".join(f"{n:>{widths[n]}}" for n in names)
+                  + f" {'Gbps':>9} {'CNP/s':>10} {'ECN/s':>10} {'Pause/s':>9} {'p99':>8}")
+        print(f"\n[DCQCN Tuner] {len(self.rows)} points; * = Pareto-best on "
+              f"{', '.join(f'{g} {f}' for f, g in self.objectives())}")
+        print("  " + header)
+        for r in sorted(self.rows, key=lambda r: -(r.get("throughput_gbps") or 0)):
+            p99 = r.get("t_99_percentile_usec")
+            gbps = r.get("throughput_gbps")
+            print(("* " if r["point"] in front else "  ")
+                  + " ".join(f"{str(r[n]):>{widths[n]}}" for n in names)
+                  + f" {gbps if gbps is not None else 'N/A':>9} {r['cnp_per_s']:>10} {r['ecn_per_s']:>10}"
+                  + f" {r['pause_per_s']:>9} {p99 if p99 is not None else 'N/A':>8}")
+
+    def write_results(self):
+        os.makedirs("logs", exist_ok=True)
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = f"logs/dcqcn_tune_{ts}.csv"
+        front = {r["point"] for r in pareto_front(self.rows, self.objectives())}
+        fields = sorted({k for r in self.rows for k in r}, key=lambda k: (k != "point", k not in self.grid, k))
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=[*fields, "pareto"])
+            writer.writeheader()
+            for r in self.rows:
+                writer.writerow({**r, "pareto": r["point"] in front})
+        print(f"[DCQCN Tuner] Wrote {path}")
+        return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep DCQCN cc_params and report the Pareto-best settings")
+    parser.add_argument("--device", required=True, help="RDMA device whose cc_params are tuned")
+    parser.add_argument("--pci-addr", help="PCI address under the debugfs root (default: from sysfs)")
+    parser.add_argument("--debugfs-root", default=DEBUGFS_ROOT, help="cc_params root (point at a fake tree to test)")
+    parser.add_argument("--counter-root", default=port_counters.IB_ROOT, help="sysfs root for port counters")
+    parser.add_argument("--iface", help="Net interface for pause counters (ethtool -S)")
+    parser.add_argument("--param", action="append", help="name=v1,v2,... (repeatable; RP/NP cc_params)")
+    parser.add_argument("--grid", help="JSON file {param: [values]}")
+    parser.add_argument("--settle", type=float, default=1.0, help="Seconds to wait after applying a point")
+    parser.add_argument("--list-params", action="store_true", help="Print the parameters the backend exposes")
+    # Trial: bandwidth step against a running persistent server + lat server, or an incast via agents
+    parser.add_argument("--server-ip", help="RDMA address of the server (bandwidth and incast trials)")
+    parser.add_argument("--threads", type=int, default=8, help="Bandwidth trial streams")
+    parser.add_argument("--size", type=int, default=65536, help="Message size in bytes")
+    parser.add_argument("--qdepth", type=int, default=1024, help="Queue depth per thread")
+    parser.add_argument("--test-type", choices=["write", "read", "send"], default="write")
+    parser.add_argument("--duration", type=int, default=10, help="Seconds per trial")
+    parser.add_argument("--base-port", type=int, default=18515, help="Base TCP port for RDMA sessions")
+    parser.add_argument("--link-speed", type=int, default=400, help="Total link speed in Gbps")
+    parser.add_argument("--load-pct", type=float, default=100, help="Offered load of the bandwidth trial")
+    parser.add_argument("--probe-port", type=int, help="Latency server port (default: base-port + 1000)")
+    parser.add_argument("--incast-server-agent", help="Run an incast trial instead: server agent")
+    parser.add_argument("--incast-client-agents", nargs="+", help="Incast trial client agents")
+    parser.add_argument("--stagger", type=int, default=2, help="Incast trial: seconds between joins")
+    args = parser.parse_args()
+
+    device = args.device
+    pci_addr = args.pci_addr or os.path.basename(os.path.realpath(os.path.join(args.counter_root, device, "device")))
+    backend = DebugfsParamBackend(pci_addr, args.debugfs_root)
+    if args.list_params:
+        for name in backend.available():
+            role = "RP" if name in RP_PARAMS else "NP" if name in NP_PARAMS else "  "
+            print(f"{role} {name} = {backend.read(name)}")
+        raise SystemExit(0)
+
+    grid = parse_grid(args.param, args.grid)
+    if not grid:
+        parser.error("Give at least one --param name=v1,v2,... or --grid")
+    if not args.server_ip:
+        parser.error("--server-ip is required for both the bandwidth and the incast trial")
+
+    if args.incast_server_agent:
+        from incast import IncastTest
+        from rdma_agent import AgentClient
+        trial = IncastTrial(IncastTest(
+            AgentClient(args.incast_server_agent), [AgentClient(a) for a in args.incast_client_agents or []],
+            args.server_ip, device=device, threads=args.threads, size=args.size, qdepth=args.qdepth,
+            test_type=args.test_type, base_port=args.base_port, stagger=args.stagger, hold=args.duration))
+    else:
+        perf = RDMAPerf(role="client", device=device, threads=args.threads, qdepth=args.qdepth, size=args.size,
+                        duration=args.duration, server_ip=args.server_ip, base_port=args.base_port,
+                        test_type=args.test_type)
+        trial = BandwidthTrial(perf, args.link_speed, args.load_pct, args.probe_port)
+
+    tuner = DCQCNTuner(backend, grid, trial, rdma_dev=device, iface=args.iface, settle=args.settle,
+                       counter_root=args.counter_root)
+    tuner.run()
+    tuner.print_report()
+    tuner.write_results()
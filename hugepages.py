@@ -0,0 +1,142 @@
+# hugepages.py
+import glob
+import os
+import re
+import threading
+import time
+
+NODE_ROOT = "/sys/devices/system/node"
+IB_ROOT = "/sys/class/infiniband"
+# perftest --use_hugepages allocates from the default hugepage size (2 MiB, as configured by install.py)
+DEFAULT_PAGE_KB = 2048
+
+
+def _read_int(path, default=None):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return default
+
+
+def parse_cpulist(text):
+    """"0-3,8,10-11" -> {0, 1, 2, 3, 8, 10, 11}."""
+    cpus = set()
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        cpus.update(range(int(lo), int(hi or lo) + 1))
+    return cpus
+
+
+def cpu_nodes(root=NODE_ROOT):
+    """{cpu: numa node} from sysfs; empty on hosts without NUMA topology."""
+    nodes = {}
+    for path in glob.glob(os.path.join(root, "node[0-9]*", "cpulist")):
+        node = int(re.search(r"node(\d+)", path).group(1))
+        try:
+            with open(path) as f:
+                cpus = parse_cpulist(f.read())
+        except (OSError, ValueError):
+            continue
+        for cpu in cpus:
+            nodes[cpu] = node
+    return nodes
+
+
+def device_numa_node(rdma_dev, base_path=IB_ROOT):
+    """NUMA node of the NIC's PCI function, or None when unknown (-1 on single-node hosts)."""
+    node = _read_int(os.path.join(base_path, rdma_dev, "device", "numa_node"))
+    return node if node is not None and node >= 0 else None
+
+
+def node_pools(page_kb=DEFAULT_PAGE_KB, root=NODE_ROOT):
+    """{node: {"nr", "free", "surplus"}} hugepage counts of one page size per NUMA node."""
+    pools = {}
+    for path in glob.glob(os.path.join(root, "node[0-9]*", "hugepages", f"hugepages-{page_kb}kB")):
+        node = int(re.search(r"node(\d+)", path).group(1))
+        pools[node] = {name: _read_int(os.path.join(path, f"{name}_hugepages"), 0)
+                       for name in ("nr", "free", "surplus")}
+    return pools
+
+
+def check_pools(stream_bytes, cores, page_kb=DEFAULT_PAGE_KB, root=NODE_ROOT, nic_node=None):
+    """Hugepages each NUMA node must supply for streams pinned to ``cores`` (stream i -> cores[i]).
+
+    perftest allocates its buffers on the node of the CPU it runs on, so each node needs enough free
+    pages for its own streams. A node that falls short makes the kernel take pages from another node
+    (remote buffers); the plan only fails when the pools together cannot cover every stream.
+    """
+    page_bytes = page_kb * 1024
+    pages_per_stream = -(-stream_bytes // page_bytes)
+    pools = node_pools(page_kb, root)
+    placement = cpu_nodes(root)
+    need = {}
+    for core in cores:
+        node = placement.get(core, nic_node if nic_node is not None else 0)
+        need[node] = need.get(node, 0) + pages_per_stream
+    nodes = []
+    for node in sorted(set(need) | set(pools)):
+        pool = pools.get(node, {"nr": 0, "free": 0, "surplus": 0})
+        nodes.append({"node": node, "need_pages": need.get(node, 0), "free_pages": pool["free"],
+                      "nr_pages": pool["nr"], "nic_local": node == nic_node,
+                      "ok": need.get(node, 0) <= pool["free"]})
+    total_need = sum(need.values())
+    total_free = sum(p["free"] for p in pools.values())
+    return {"page_kb": page_kb, "pages_per_stream": pages_per_stream, "need_pages": total_need,
+            "free_pages": total_free, "nodes": nodes, "ok": bool(pools) and total_need <= total_free,
+            "remote": [n["node"] for n in nodes if not n["ok"]]}
+
+
+class HugepageSampler:
+    """Sample per-node free hugepages during a run; ``stop()`` returns pool size, the free count before
+    and after, and peak consumption per node (free before - lowest free seen)."""
+
+    def __init__(self, page_kb=DEFAULT_PAGE_KB, interval=1.0, root=NODE_ROOT):
+        self.page_kb = page_kb
+        self.interval = interval
+        self.root = root
+        self.before = {}
+        self.low = {}
+        self.samples = []
+        self.stop_event = threading.Event()
+        self._thread = None
+        self._t0 = None
+
+    def sample(self):
+        pools = node_pools(self.page_kb, self.root)
+        self.samples.append({"t": round(time.monotonic() - self._t0, 3),
+                             "free": {node: p["free"] for node, p in pools.items()}})
+        for node, pool in pools.items():
+            self.low[node] = min(self.low.get(node, pool["free"]), pool["free"])
+        return pools
+
+    def loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self._t0 = time.monotonic()
+        self.before = self.sample()
+        self._thread = threading.Thread(target=self.loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self._thread:
+            self._thread.join()
+        after = self.sample()
+        page_bytes = self.page_kb * 1024
+        nodes = []
+        for node in sorted(self.before):
+            free_before = self.before[node]["free"]
+            peak = max(free_before - self.low.get(node, free_before), 0)
+            nodes.append({"node": node, "nr_pages": self.before[node]["nr"], "free_before": free_before,
+                          "free_min": self.low.get(node, free_before),
+                          "free_after": after.get(node, {}).get("free"),
+                          "peak_used_pages": peak, "peak_used_bytes": peak * page_bytes})
+        return {"page_kb": self.page_kb, "nodes": nodes,
+                "peak_used_pages": sum(n["peak_used_pages"] for n in nodes),
+                "peak_used_bytes": sum(n["peak_used_bytes"] for n in nodes),
+                "samples": self.samples}
@@ -0,0 +1,209 @@
+# incast.py
+import argparse
+import json
+import os
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+from cluster_aggregate import build_timeline, jain_index
+from rdma_agent import AgentClient
+
+
+def series_from_job(client, job):
+    """Turn an agent client job into cluster_aggregate's (client, labels, codes, ts, bw) series."""
+    labels, codes, ts, bw = [], [], [], []
+    for result in job.get("results", []):
+        samples = result.get("samples", [])
+        if not samples:
+            continue
+        codes.extend([len(labels)] * len(samples))
+        labels.append(str(result["thread_id"]))
+        ts.extend(client.local_ts(s["ts"]) for s in samples)
+        bw.extend(s["bw_gbps"] for s in samples)
+    name = f"{client.host}:{job['config'].get('client_id')}"
+    return name, labels, np.array(codes, dtype=np.int64), np.array(ts, dtype=np.float64), \
+        np.array(bw, dtype=np.float64)
+
+
+def convergence_time(jain, start, end, threshold, settle):
+    """Seconds from ``start`` until Jain's index stays >= threshold for ``settle`` consecutive seconds."""
+    run = 0
+    for k in range(start, min(end, len(jain))):
+        run = run + 1 if jain[k] >= threshold else 0
+        if run >= settle:
+            return k - settle + 1 - start
+    return None
+
+
+class IncastTest:
+    """Many clients -> one server port range, joined one after another.
+
+    The coordinator assigns every client its own slice of the server's persistent ports
+    (client_id * threads + i, as RDMAPerf clients already do), starts the server, then
+    schedules client k to start at t0 + k * stagger so all clients stop together after
+    ``hold`` seconds with every client active. Per-second samples from all streams are
+    aligned to report fairness, max/min stream ratio and convergence time after each join.
+    """
+
+    def __init__(self, server_agent, client_agents, server_ip, device=None, client_device=None, threads=1,
+                 size=65536, qdepth=1024, test_type="write", base_port=18515, stagger=5, hold=10,
+                 lead=3.0, jain_threshold=0.9, settle=3):
+        self.server = server_agent
+        self.clients = client_agents
+        self.server_ip = server_ip
+        self.device = device
+        self.client_device = client_device or device
+        self.threads = threads
+        self.size = size
+        self.qdepth = qdepth
+        self.test_type = test_type
+        self.base_port = base_port
+        self.stagger = stagger
+        self.hold = hold
+        self.lead = lead
+        self.jain_threshold = jain_threshold
+        self.settle = settle
+
+    def perf_args(self, device):
+        return {"device": device, "size": self.size, "qdepth": self.qdepth, "test_type": self.test_type,
+                "base_port": self.base_port}
+
+    def plan(self, t0):
+        n = len(self.clients)
+        return [{"client_id": k, "start_at": t0 + k * self.stagger,
+                 "duration": (n - 1 - k) * self.stagger + self.hold,
+                 "ports": [self.base_port + k * self.threads + i for i in range(self.threads)]}
+                for k in range(n)]
+
+    def run(self):
+        for agent in [self.server, *self.clients]:
+            status = agent.sync_clock()
+            print(f"[Incast] Agent {agent.url} ({status['hostname']}) clock offset {agent.clock_offset * 1000:.1f} ms")
+
+        n = len(self.clients)
+        server_job = self.server.start_server(threads=n * self.threads, **self.perf_args(self.device))
+        print(f"[Incast] Server job {server_job}: ports {self.base_port}..{self.base_port + n * self.threads - 1}")
+
+        t0 = time.time() + self.lead
+        plan = self.plan(t0)
+        jobs = []
+        for agent, step in zip(self.clients, plan):
+            job_id = agent.start_client(start_at=step["start_at"], server_ip=self.server_ip, threads=self.threads,
+                                        client_id=step["client_id"], duration=step["duration"],
+                                        **self.perf_args(self.client_device))
+            print(f"[Incast] Client {step['client_id']} on {agent.url}: join at +{step['start_at'] - t0:.0f}s "
+                  f"for {step['duration']}s, ports {step['ports']}")
+            jobs.append((agent, job_id))
+
+        finished = []
+        try:
+            ceiling = self.lead + (n - 1) * self.stagger + self.hold + 30
+            for agent, job_id in jobs:
+                finished.append((agent, agent.wait(job_id, timeout=ceiling)))
+        finally:
+            if len(finished) < len(jobs):
+                for agent, job_id in jobs:
+                    agent.stop(job_id)
+            self.server.stop(server_job)
+
+        for agent, job in finished:
+            if job["state"] == "failed":
+                print(f"[Incast] Client job on {agent.url} failed: {job['error']}")
+        return self.analyze(t0, plan, [series_from_job(agent, job) for agent, job in finished])
+
+    def analyze(self, t0, plan, series):
+        keys, owners, first, matrix = build_timeline(series)
+        if not keys:
+            print("[Incast] No per-second samples were collected")
+            return None
+        # Re-base the grid on the planned start so join k falls on second k * stagger
+        shift = int(round(first - np.floor(t0)))
+        if shift > 0:
+            matrix = np.hstack([np.full((len(keys), shift), np.nan), matrix])
+        elif shift < 0:
+            matrix = matrix[:, -shift:]
+
+        agg = np.nansum(matrix, axis=0)
+        active = np.sum(~np.isnan(matrix), axis=0)
+        jain = jain_index(matrix)
+        with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN seconds before the first join
+            ratio = np.nanmax(matrix, axis=0) / np.nanmin(matrix, axis=0)
+
+        timeline = [{"second": k, "agg_bw_gbps": round(float(agg[k]), 3), "active_streams": int(active[k]),
+                     "jain_index": None if np.isnan(jain[k]) else round(float(jain[k]), 4),
+                     "max_min_ratio": None if not np.isfinite(ratio[k]) else round(float(ratio[k]), 3)}
+                    for k in range(matrix.shape[1])]
+        joins = []
+        for step in plan:
+            start = int(round(step["start_at"] - t0))
+            end = start + self.stagger if step["client_id"] < len(plan) - 1 else matrix.shape[1]
+            window = slice(start, min(end, matrix.shape[1]))
+            joins.append({
+                "client_id": step["client_id"],
+                "join_second": start,
+                "convergence_s": convergence_time(jain, start, end, self.jain_threshold, self.settle),
+                "agg_bw_gbps": round(float(np.nanmean(agg[window])), 3) if agg[window].size else None,
+                "jain_mean": round(float(np.nanmean(jain[window])), 4) if np.any(~np.isnan(jain[window])) else None,
+                "max_min_ratio_mean": round(float(np.nanmean(np.where(np.isfinite(ratio[window]), ratio[window],
+                                                                      np.nan))), 3)
+                if np.any(np.isfinite(ratio[window])) else None,
+            })
+        return {"streams": keys, "jain_threshold": self.jain_threshold, "settle_s": self.settle,
+                "stagger_s": self.stagger, "hold_s": self.hold, "joins": joins, "timeline": timeline}
+
+
+def print_report(report):
+    print(f"\n[Incast] {len(report['streams'])} streams, joins every {report['stagger_s']}s; converged = Jain >= "
+          f"{report['jain_threshold']} for {report['settle_s']}s")
+    header = f"{'Client':>6} {'Join@s':>7} {'Converge s':>11} {'Agg Gbps':>10} {'Jain':>7} {'Max/Min':>8}"
+    print(header)
+    print("-" * len(header))
+    for j in report["joins"]:
+        conv = f"{j['convergence_s']}" if j["convergence_s"] is not None else "never"
+        jain = f"{j['jain_mean']:.4f}" if j["jain_mean"] is not None else "N/A"
+        ratio = f"{j['max_min_ratio_mean']:.2f}" if j["max_min_ratio_mean"] is not None else "N/A"
+        agg = f"{j['agg_bw_gbps']:.2f}" if j["agg_bw_gbps"] is not None else "N/A"
+        print(f"{j['client_id']:>6} {j['join_second']:>7} {conv:>11} {agg:>10} {jain:>7} {ratio:>8}")
+
+
+def write_report(report):
+    os.makedirs("logs", exist_ok=True)
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = f"logs/incast_{ts}.json"
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[Incast] Report with per-second timeline written to {path}")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incast: many clients joining one server port range")
+    parser.add_argument("--server-agent", required=True, help="Agent on the server host (host[:port])")
+    parser.add_argument("--client-agents", nargs="+", required=True,
+                        help="Agents on the client hosts in join order; repeat an agent to run several clients there")
+    parser.add_argument("--server-ip", required=True, help="RDMA address of the server")
+    parser.add_argument("--device", help="RDMA device on the server (auto-detected by the agent if not set)")
+    parser.add_argument("--client-device", help="RDMA device on the clients (default: --device)")
+    parser.add_argument("--threads", type=int, default=1, help="Streams per client")
+    parser.add_argument("--size", type=int, default=65536, help="Message size in bytes")
+    parser.add_argument("--qdepth", type=int, default=1024, help="Queue depth per thread")
+    parser.add_argument("--test-type", choices=["write", "read", "send"], default="write")
+    parser.add_argument("--base-port", type=int, default=18515, help="First server port")
+    parser.add_argument("--stagger", type=int, default=5, help="Seconds between client joins")
+    parser.add_argument("--hold", type=int, default=10, help="Seconds to run with every client active")
+    parser.add_argument("--jain-threshold", type=float, default=0.9, help="Jain's index counted as converged")
+    parser.add_argument("--settle", type=int, default=3, help="Seconds the threshold must hold to count as converged")
+    args = parser.parse_args()
+
+    test = IncastTest(AgentClient(args.server_agent), [AgentClient(a) for a in args.client_agents],
+                      args.server_ip, device=args.device, client_device=args.client_device, threads=args.threads,
+                      size=args.size, qdepth=args.qdepth, test_type=args.test_type, base_port=args.base_port,
+                      stagger=args.stagger, hold=args.hold, jain_threshold=args.jain_threshold, settle=args.settle)
+    report = test.run()
+    if report:
+        print_report(report)
+        write_report(report)
@@ -20,7 +20,7 @@ def install_packages():
     ]
     run(f"apt-get update && apt-get install -y {' '.join(packages)}")
     run("pip3 install --upgrade pip")
-    run("pip3 install prometheus_client")
+    run("pip3 install prometheus_client numpy")
 
 def configure_hugepages():
     print("Configuring hugepages and mounting hugetlbfs")
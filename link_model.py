@@ -0,0 +1,162 @@
+# link_model.py
+import argparse
+import math
+
+from rdma_device import device_pci_addr, get_rdma_interface, read_pcie_link, read_sysfs
+
+# GT/s -> (generation, line encoding efficiency); Gen6 runs FLIT mode (242 of 256 bytes carry TLPs)
+PCIE_GENERATIONS = {2.5: (1, 8 / 10), 5.0: (2, 8 / 10), 8.0: (3, 128 / 130), 16.0: (4, 128 / 130),
+                    32.0: (5, 128 / 130), 64.0: (6, 242 / 256)}
+# Per-TLP bytes around the payload: framing + sequence number + 4DW header (64-bit addressing) + LCRC
+TLP_OVERHEAD = {1: 24, 2: 24, 3: 26, 4: 26, 5: 26, 6: 20}
+DEFAULT_MPS = 256
+
+# Ethernet / RoCE v2 per-packet overhead in bytes
+PREAMBLE_IFG = 20  # preamble + SFD 8, inter-frame gap 12
+ETH_HEADER = 14
+FCS = 4
+MIN_FRAME = 64
+IPV4_HEADER = 20
+IPV6_HEADER = 40
+UDP_HEADER = 8
+BTH = 12
+ICRC = 4
+RETH = 16  # first packet of an RDMA WRITE
+AETH = 4  # first and last packet of an RDMA READ response
+IB_MTUS = (4096, 2048, 1024, 512, 256)
+
+# Streams below this share of their fair share of the ceiling are flagged
+SLOW_STREAM_RATIO = 0.7
+
+
+def pcie_ceiling(speed_gts, width, mps=DEFAULT_MPS):
+    """Data Gbps one direction of a PCIe link can carry with ``mps``-byte TLPs (DLLP traffic ignored)."""
+    gen, encoding = PCIE_GENERATIONS.get(speed_gts, (None, 128 / 130))
+    tlp_eff = mps / (mps + TLP_OVERHEAD.get(gen, 26))
+    return {"pcie_gen": gen, "pcie_speed_gts": speed_gts, "pcie_width": width, "pcie_mps": mps,
+            "pcie_efficiency": round(encoding * tlp_eff, 4),
+            "pcie_gbps": round(speed_gts * width * encoding * tlp_eff, 2)}
+
+
+def roce_mtu(netdev_mtu, ipv6=False):
+    """Largest IB path MTU whose RoCE v2 packet (with RETH) fits in the netdev MTU."""
+    headers = (IPV6_HEADER if ipv6 else IPV4_HEADER) + UDP_HEADER + BTH + RETH + ICRC
+    for mtu in IB_MTUS:
+        if mtu + headers <= netdev_mtu:
+            return mtu
+    return IB_MTUS[-1]
+
+
+def wire_ceiling(size, link_gbps, netdev_mtu, test_type="write", ipv6=False):
+    """Message goodput of an Ethernet link for RoCE v2: headers, ICRC, FCS, preamble and IFG per packet."""
+    pmtu = roce_mtu(netdev_mtu, ipv6)
+    packets = max(1, math.ceil(size / pmtu))
+    headers = ETH_HEADER + (IPV6_HEADER if ipv6 else IPV4_HEADER) + UDP_HEADER + BTH + ICRC + FCS
+    wire = 0
+    for i in range(packets):
+        payload = min(pmtu, size - i * pmtu) if size else 0
+        if test_type == "write" and i == 0:
+            payload += RETH
+        elif test_type == "read" and i in (0, packets - 1):
+            payload += AETH
+        wire += max(headers + payload, MIN_FRAME) + PREAMBLE_IFG
+    efficiency = size / wire if wire else 0.0
+    return {"roce_mtu": pmtu, "packets_per_message": packets, "wire_efficiency": round(efficiency, 4),
+            "wire_gbps": round(link_gbps * efficiency, 2)}
+
+
+def device_link(rdma_dev):
+    """Ethernet speed (Gbps) and MTU of the device's netdev, plus its PCIe link; None where unknown."""
+    iface = get_rdma_interface(rdma_dev)
+    speed = read_sysfs(f"/sys/class/net/{iface}/speed") if iface else "N/A"
+    mtu = read_sysfs(f"/sys/class/net/{iface}/mtu") if iface else "N/A"
+    pci_addr = device_pci_addr(rdma_dev)
+    return {
+        "interface": iface,
+        "speed_gbps": int(speed) / 1000.0 if speed.isdigit() else None,
+        "mtu": int(mtu) if mtu.isdigit() else None,
+        "pci_addr": pci_addr,
+        "pcie": read_pcie_link(pci_addr) if pci_addr else {},
+    }
+
+
+def link_ceilings(size, link_gbps=None, netdev_mtu=1500, pcie=None, test_type="write", ipv6=False,
+                  mps=DEFAULT_MPS):
+    """Wire and PCIe ceilings for one message size; ``achievable_gbps`` is the lower of the two."""
+    model = {"size": size}
+    ceilings = {}
+    if link_gbps:
+        model.update(wire_ceiling(size, link_gbps, netdev_mtu, test_type, ipv6))
+        model["link_gbps"] = link_gbps
+        ceilings["wire"] = model["wire_gbps"]
+    if pcie and pcie.get("speed_gts") and pcie.get("width"):
+        model.update(pcie_ceiling(pcie["speed_gts"], pcie["width"], mps))
+        ceilings["pcie"] = model["pcie_gbps"]
+        if (pcie.get("max_speed_gts") or 0) > pcie["speed_gts"] or (pcie.get("max_width") or 0) > pcie["width"]:
+            model["pcie_degraded"] = (f"{pcie['speed_gts']:g} GT/s x{pcie['width']} "
+                                      f"(capable of {pcie['max_speed_gts']:g} GT/s x{pcie['max_width']})")
+    if ceilings:
+        model["limit"] = min(ceilings, key=ceilings.get)
+        model["achievable_gbps"] = ceilings[model["limit"]]
+    return model
+
+
+def annotate_streams(rows, achievable_gbps, stream_cap_gbps=None, slow_ratio=SLOW_STREAM_RATIO):
+    """Add ``pct_of_achievable`` (against each stream's fair share of the ceiling) and ``below_model`` to
+    ``rows``; return the aggregate efficiency and the slow stream ids."""
+    rows = [r for r in rows if r.get("status", "ok") != "failed" and "bw_avg_gbps" in r]
+    if not rows or not achievable_gbps:
+        return None
+    fair = achievable_gbps / len(rows)
+    if stream_cap_gbps:
+        fair = min(fair, stream_cap_gbps)
+    total = 0.0
+    slow = []
+    for r in rows:
+        bw = r.get("bw_ss_mean_gbps", r["bw_avg_gbps"])
+        total += bw
+        r["pct_of_achievable"] = round(100.0 * bw / fair, 1)
+        r["below_model"] = bw < slow_ratio * fair
+        if r["below_model"]:
+            slow.append(r["thread_id"])
+    expected = fair * len(rows)
+    return {"achievable_gbps": round(expected, 2), "stream_share_gbps": round(fair, 3), "total_gbps": round(total, 2),
+            "pct_of_achievable": round(100.0 * total / expected, 1), "slow_streams": slow,
+            "slow_ratio": slow_ratio}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Wire (RoCE v2) and PCIe goodput ceilings per message size")
+    parser.add_argument("--device", help="Read link speed, MTU and PCIe link from this RDMA device's sysfs")
+    parser.add_argument("--speed", type=float, help="Ethernet link speed in Gbps (overrides sysfs)")
+    parser.add_argument("--mtu", type=int, help="Netdev MTU (overrides sysfs; default 1500)")
+    parser.add_argument("--pcie-gts", type=float, help="PCIe link speed in GT/s (overrides sysfs)")
+    parser.add_argument("--pcie-width", type=int, help="PCIe link width (overrides sysfs)")
+    parser.add_argument("--mps", type=int, default=DEFAULT_MPS, help="PCIe MaxPayloadSize in bytes")
+    parser.add_argument("--test-type", choices=["write", "read", "send"], default="write")
+    parser.add_argument("--ipv6", action="store_true", help="RoCE v2 over IPv6 GIDs")
+    parser.add_argument("--sizes", default="64,256,1024,4096,16384,65536,1048576", help="Comma-separated message sizes")
+    args = parser.parse_args()
+
+    link = device_link(args.device) if args.device else {"pcie": {}}
+    speed = args.speed or link.get("speed_gbps")
+    mtu = args.mtu or link.get("mtu") or 1500
+    pcie = dict(link["pcie"])
+    if args.pcie_gts:
+        pcie["speed_gts"] = args.pcie_gts
+    if args.pcie_width:
+        pcie["width"] = args.pcie_width
+    if args.device:
+        pcie_text = (f"{pcie['speed_gts']:g} GT/s x{pcie['width']}" if pcie.get("speed_gts") and pcie.get("width")
+                     else "unknown")
+        print(f"[Link Model] {args.device} ({link['interface']}, {link['pci_addr']}): {speed or '?'} Gbps, "
+              f"MTU {mtu}, PCIe {pcie_text}")
+    print(f"{'Size':>9} {'IB MTU':>6} {'Pkts':>5} {'Wire eff':>8} {'Wire Gbps':>9} {'PCIe Gbps':>9} "
+          f"{'Achievable':>10} {'Limit':>5}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        m = link_ceilings(size, speed, mtu, pcie, args.test_type, args.ipv6, args.mps)
+        print(f"{size:>9} {m.get('roce_mtu', '-'):>6} {m.get('packets_per_message', '-'):>5} "
+              f"{m.get('wire_efficiency', 0) * 100:>7.1f}% {m.get('wire_gbps', 0):>9.2f} {m.get('pcie_gbps', 0):>9.2f} "
+              f"{m.get('achievable_gbps', 0):>10.2f} {m.get('limit', '-'):>5}")
+    if "pcie_degraded" in m:
+        print(f"- PCIe link trained below its capability: {m['pcie_degraded']}")
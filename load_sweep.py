@@ -0,0 +1,146 @@
+# load_sweep.py
+import csv
+import os
+import threading
+import time
+from datetime import datetime
+
+from rdma_perf_tool import RDMAPerf
+
+DEFAULT_LOAD_STEPS = [10, 20, 30, 40, 50, 60, 70, 80, 90, 100]
+LAT_FIELDS = ["t_min_usec", "t_typical_usec", "t_avg_usec", "t_99_percentile_usec", "t_999_percentile_usec"]
+
+
+def parse_load_steps(text):
+    steps = sorted({float(x) for x in text.split(",") if x.strip()})
+    if not steps or steps[0] <= 0 or steps[-1] > 100:
+        raise ValueError(f"Load steps must be within (0, 100]: {text}")
+    return steps
+
+
+class LoadSweep:
+    """Sweep offered load with rate-limited bw streams while probing latency on a separate port.
+
+    The server side must keep listeners up between steps: a persistent bw server on the
+    bandwidth base port and a latency server (same size/iterations) on ``probe_port``.
+    """
+
+    def __init__(self, perf, link_speed, steps=None, probe_port=None, probe_size=None,
+                 probe_warmup=2.0, break_factor=2.0, label=None):
+        self.perf = perf
+        self.link_speed = link_speed
+        self.steps = steps or DEFAULT_LOAD_STEPS
+        self.probe_port = probe_port or perf.base_port + 1000
+        self.probe_size = probe_size or perf.size
+        self.probe_warmup = min(probe_warmup, perf.duration / 4.0)
+        self.break_factor = break_factor
+        self.label = label or ""
+        self.rows = []
+
+    def make_probe(self):
+        return RDMAPerf(
+            role="client",
+            device=self.perf.device,
+            threads=1,
+            size=self.probe_size,
+            server_ip=self.perf.server_ip,
+            base_port=self.probe_port,
+            client_id=0,
+            test_type=self.perf.test_type,
+            latency="lat",
+            iterations=self.perf.iterations,
+            gid_index=self.perf.gid_index,
+            watchdog=self.perf.watchdog,
+            setup_grace=self.perf.setup_grace,
+            use_hugepages=self.perf.use_hugepages,
+        )
+
+    def run_step(self, load_pct):
+        offered_gbps = self.link_speed * load_pct / 100.0
+        self.perf.reset_results()
+        self.perf.rate_limit_gbps = offered_gbps / self.perf.threads
+        print(f"\n[Load Sweep] Step {load_pct:g}% -> {offered_gbps:.2f} Gbps offered "
+              f"({self.perf.rate_limit_gbps:.3f} Gbps x {self.perf.threads} streams)")
+        # Raise here, not in the bw thread, if the binary cannot pace the streams
+        self.perf.check_perftest_flags(self.perf.perftest_binary())
+
+        bw_thread = threading.Thread(target=self.perf.run)
+        bw_thread.start()
+        time.sleep(self.probe_warmup)
+
+        probe = self.make_probe()
+        probe.run()
+        bw_thread.join()
+
+        lat = next(iter(probe.results.values()), {})
+        achieved = sum(r.get("bw_avg_gbps", 0.0) for r in self.perf.results.values())
+        row = {
+            "label": self.label,
+            "device": self.perf.device,
+            "test_type": self.perf.test_type,
+            "size": self.perf.size,
+            "threads": self.perf.threads,
+            "load_pct": load_pct,
+            "offered_gbps": round(offered_gbps, 3),
+            "achieved_gbps": round(achieved, 3),
+        }
+        for field in LAT_FIELDS:
+            row[field] = lat.get(field)
+        if lat.get("t_99_percentile_usec") is None:
+            print(f"[Load Sweep] No latency result at {load_pct:g}% (is the lat server up on port {self.probe_port}?)")
+        return row
+
+    def find_break_load(self):
+        """First load step whose p99 exceeds break_factor x the p99 at the lowest load."""
+        valid = [r for r in self.rows if r["t_99_percentile_usec"] is not None]
+        if not valid:
+            return None
+        baseline = valid[0]["t_99_percentile_usec"]
+        for row in valid[1:]:
+            if row["t_99_percentile_usec"] > baseline * self.break_factor:
+                return row["load_pct"]
+        return None
+
+    def run(self):
+        # Per-step summaries go to the sweep CSV; don't litter logs/ with one file per step
+        log_csv, log_json = self.perf.log_csv, self.perf.log_json
+        self.perf.log_csv = self.perf.log_json = False
+        try:
+            for load_pct in self.steps:
+                self.rows.append(self.run_step(load_pct))
+        finally:
+            self.perf.log_csv, self.perf.log_json = log_csv, log_json
+            self.perf.rate_limit_gbps = None
+
+        self.print_table()
+        return self.write_csv()
+
+    def print_table(self):
+        print("\n[Load Sweep] Latency vs offered load")
+        header = (f"{'Load%':>6} {'Offered':>9} {'Achieved':>9} {'min':>8} {'typical':>8} "
+                  f"{'avg':>8} {'p99':>8} {'p99.9':>8}")
+        print(header)
+        print("-" * len(header))
+        for r in self.rows:
+            lat = [f"{r[f]:8.2f}" if r[f] is not None else f"{'N/A':>8}" for f in LAT_FIELDS]
+            print(f"{r['load_pct']:>6g} {r['offered_gbps']:>9.2f} {r['achieved_gbps']:>9.2f} {' '.join(lat)}")
+
+        break_load = self.find_break_load()
+        if break_load is not None:
+            print(f"- p99 breaks (> {self.break_factor:g}x low-load p99) at {break_load:g}% load")
+        else:
+            print(f"- p99 stayed within {self.break_factor:g}x of low-load p99 across the sweep")
+
+    def write_csv(self):
+        os.makedirs("logs", exist_ok=True)
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        csv_file = f"logs/load_sweep_{self.perf.client_id}_{ts}.csv"
+        fieldnames = ["label", "device", "test_type", "size", "threads", "load_pct",
+                      "offered_gbps", "achieved_gbps", *LAT_FIELDS]
+        with open(csv_file, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            for row in self.rows:
+                writer.writerow(row)
+        print(f"[Load Sweep] Wrote {csv_file}")
+        return csv_file
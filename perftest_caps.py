@@ -0,0 +1,130 @@
+# perftest_caps.py
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+
+PERFTEST_BINARIES = ["ib_write_bw", "ib_read_bw", "ib_send_bw", "ib_write_lat", "ib_read_lat", "ib_send_lat"]
+CAPS_CACHE = os.path.expanduser("~/.cache/rdma_perf/perftest_caps.json")
+CAPS_VERSION = 1
+
+# "  -x, --gid-index=<index>", "      --report_per_second", "  -F, --CPU-freq"
+HELP_FLAG = re.compile(r"(?<![\w-])(--[A-Za-z][\w-]*|-[A-Za-z])\b")
+VERSION = re.compile(r"(\d+\.\d+(?:\.\d+)?)")
+
+_memo = {}
+
+
+def binary_key(path):
+    """[path, mtime_ns, size]: a caps entry is reused only while the binary on disk is unchanged."""
+    st = os.stat(path)
+    return [path, st.st_mtime_ns, st.st_size]
+
+
+def parse_help(text):
+    """Every short and long option mentioned in ``--help`` output."""
+    flags = set()
+    for line in text.splitlines():
+        stripped = line.lstrip()
+        if stripped.startswith("-"):
+            # Option column only; descriptions may mention other flags
+            flags.update(HELP_FLAG.findall(stripped.split("  ")[0]))
+    return sorted(flags)
+
+
+def _run(cmd):
+    try:
+        return subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def probe_binary(path):
+    """Run ``--help`` and ``--version`` once and parse the supported flags and the version."""
+    version = VERSION.search(_run([path, "--version"]).split(":")[-1])
+    return {"key": binary_key(path), "version": version.group(1) if version else None,
+            "flags": parse_help(_run([path, "--help"]))}
+
+
+def get_perftest_caps(binaries=PERFTEST_BINARIES, refresh=False, cache_path=CAPS_CACHE):
+    """Binary name -> {"path", "version", "flags"} (None when not installed), served from a disk cache
+    keyed by path, mtime and size; only new or changed binaries are probed."""
+    paths = {name: shutil.which(name) for name in binaries}
+    keys = {}
+    for name, path in paths.items():
+        try:
+            keys[name] = binary_key(path) if path else None
+        except OSError:
+            keys[name] = None
+    memo_key = (cache_path, json.dumps(keys, sort_keys=True))
+    if not refresh and memo_key in _memo:
+        return _memo[memo_key]
+
+    cached = {}
+    if cache_path and not refresh:
+        try:
+            with open(cache_path) as f:
+                data = json.load(f)
+            if data.get("version") == CAPS_VERSION:
+                cached = data.get("binaries", {})
+        except (OSError, ValueError):
+            pass
+
+    stale = [name for name, key in keys.items() if key and cached.get(name, {}).get("key") != key]
+    if stale:
+        from concurrent.futures import ThreadPoolExecutor  # only on a cache miss
+        with ThreadPoolExecutor(max_workers=len(stale)) as pool:
+            for name, entry in zip(stale, pool.map(probe_binary, [paths[n] for n in stale])):
+                cached[name] = entry
+        if cache_path:
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                tmp = f"{cache_path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump({"version": CAPS_VERSION, "binaries": cached}, f, indent=2)
+                os.replace(tmp, cache_path)
+            except OSError:
+                pass
+
+    caps = {}
+    for name, key in keys.items():
+        entry = cached.get(name) if key else None
+        caps[name] = {"path": key[0], "version": entry["version"], "flags": set(entry["flags"])} if entry else None
+    _memo[memo_key] = caps
+    return caps
+
+
+def supports(caps, binary, flag):
+    entry = caps.get(binary)
+    return bool(entry) and flag in entry["flags"]
+
+
+def perftest_version(caps=None):
+    caps = caps or get_perftest_caps()
+    versions = {e["version"] for e in caps.values() if e and e["version"]}
+    return ", ".join(sorted(versions)) if versions else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Probe and cache the flags supported by the perftest binaries")
+    parser.add_argument("--refresh", action="store_true", help="Re-probe every binary even if the cache is current")
+    parser.add_argument("--flags", action="store_true", help="List every flag per binary")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    caps = get_perftest_caps(refresh=args.refresh)
+    elapsed = (time.monotonic() - started) * 1000
+    print(f"{'Binary':<14} {'Version':<10} {'Flags':>5} {'report_per_second':>18} {'run_infinitely':>15} Path")
+    for name, entry in caps.items():
+        if not entry:
+            print(f"{name:<14} {'missing':<10}")
+            continue
+        print(f"{name:<14} {entry['version'] or 'N/A':<10} {len(entry['flags']):>5} "
+              f"{'yes' if '--report_per_second' in entry['flags'] else 'no':>18} "
+              f"{'yes' if '--run_infinitely' in entry['flags'] else 'no':>15} {entry['path']}")
+        if args.flags:
+            print("    " + " ".join(sorted(entry["flags"])))
+    print(f"[Perftest Caps] {sum(1 for e in caps.values() if e)} binaries in {elapsed:.1f} ms")
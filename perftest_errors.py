@@ -0,0 +1,76 @@
+# perftest_errors.py
+import re
+
+# (category, pattern, retryable): known perftest failure signatures, matched against stdout and stderr lines
+SIGNATURES = [
+    ("connect_failed", r"Couldn't connect to|Unable to (open file descriptor for|init the) socket connection|"
+                       r"Connection refused", True),
+    ("exchange_failed", r"Failed to exchange data between server and clients|"
+                        r"Unable to connect the HCA's through the link", True),
+    ("port_in_use", r"Couldn't listen to port|Address already in use|Unable to bind", True),
+    ("qp_create_failed", r"(Couldn't|Unable to|Failed to) create (QP|the QP)|ibv_create_qp failed", False),
+    ("qp_modify_failed", r"(Failed to|Couldn't) modify QP", False),
+    ("mr_reg_failed", r"(Couldn't|Failed to|Unable to) (allocate|register) MR|ibv_reg_mr failed|"
+                      r"Cannot allocate memory|Couldn't allocate (the )?buffer", False),
+    ("cq_create_failed", r"(Couldn't|Failed to) create (the )?CQ", False),
+    ("device_not_found", r"No IB devices found|IB device \S+ not found|Couldn't get device (info|attributes)|"
+                         r"Unable to find the Infiniband/RoCE device", False),
+    ("gid_invalid", r"Failed to query GID|Couldn't get local GID|gid index \d+ (is )?(invalid|out of range)", False),
+    ("unsupported_option", r"unrecognized option|invalid option|unknown option", False),
+    ("completion_error", r"Completion with error|Problems with warm up|poll CQ failed|Failed status \d+", False),
+]
+_COMPILED = [(category, re.compile(pattern, re.IGNORECASE), retryable) for category, pattern, retryable in SIGNATURES]
+
+ACTIONS = ("continue", "retry", "abort")
+
+
+def classify(line):
+    """{"category", "retryable", "message"} for a known failure line, else None."""
+    line = line.strip()
+    if not line:
+        return None
+    for category, pattern, retryable in _COMPILED:
+        if pattern.search(line):
+            return {"category": category, "retryable": retryable, "message": line}
+    return None
+
+
+def parse_action_map(text):
+    """"connect_failed=retry,mr_reg_failed=abort" -> {category: action}."""
+    actions = {}
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        category, sep, action = item.strip().partition("=")
+        known = [c for c, _, _ in SIGNATURES] + ["exit_code"]
+        if not sep or category not in known or action not in ACTIONS:
+            raise ValueError(f"Expected CATEGORY=ACTION with CATEGORY in {known} and ACTION in {list(ACTIONS)}: {item}")
+        actions[category] = action
+    return actions
+
+
+class ErrorPolicy:
+    """What to do when a stream fails: continue (the others keep running), retry it with exponential
+    backoff, or abort the run. ``actions`` overrides ``default`` per category. A default of ``retry``
+    only applies to retryable categories, and ``retry`` falls back to ``continue`` once ``max_retries``
+    is spent."""
+
+    def __init__(self, default="continue", actions=None, max_retries=3, backoff_base=1.0, backoff_max=30.0):
+        self.default = default
+        self.actions = actions or {}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def action_for(self, error, attempt):
+        action = self.actions.get(error["category"])
+        if action is None:
+            action = self.default
+            if action == "retry" and not error["retryable"]:
+                action = "continue"
+        if action == "retry" and attempt > self.max_retries:
+            return "continue"
+        return action
+
+    def delay(self, attempt):
+        return min(self.backoff_base * 2 ** (attempt - 1), self.backoff_max)
@@ -0,0 +1,110 @@
+# port_counters.py
+import os
+import re
+import subprocess
+import time
+
+IB_ROOT = "/sys/class/infiniband"
+
+# Congestion-control counters under ports/<n>/hw_counters (mlx5 names)
+CNP_COUNTERS = ["np_cnp_sent", "rp_cnp_handled", "rp_cnp_ignored"]
+ECN_COUNTERS = ["np_ecn_marked_roce_packets"]
+# ethtool -S pause counters: rx_prio3_pause, tx_pause_ctrl_phy, rx_pause_ctrl_phy ...
+PAUSE_STAT = re.compile(r"^(rx|tx)_(prio\d+_)?pause(_ctrl)?(_phy)?$")
+# Per-priority (PFC) counters: rx_prio3_pause, tx_prio3_bytes ...
+PRIO_STAT = re.compile(r"^(rx|tx)_prio(\d)_(pause|bytes)$")
+ETHTOOL_STAT = re.compile(f"{PAUSE_STAT.pattern}|{PRIO_STAT.pattern}")
+# Port-wide pause counters; the NIC also counts the same frames per priority
+GLOBAL_PAUSE_STAT = re.compile(r"^(rx|tx)_pause(_ctrl)?(_phy)?$")
+
+
+def _read_int_dir(path):
+    values = {}
+    if not os.path.isdir(path):
+        return values
+    for name in os.listdir(path):
+        try:
+            with open(os.path.join(path, name)) as f:
+                values[name] = int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+    return values
+
+
+def read_hw_counters(rdma_dev, port=1, root=IB_ROOT):
+    """hw_counters plus the standard port counters (port_xmit_data, port_rcv_data ...) of one RDMA port."""
+    base = os.path.join(root, rdma_dev, "ports", str(port))
+    counters = _read_int_dir(os.path.join(base, "counters"))
+    counters.update(_read_int_dir(os.path.join(base, "hw_counters")))
+    return counters
+
+
+def read_ethtool_stats(iface, pattern=None):
+    """``ethtool -S`` as a dict of ints, optionally filtered by a compiled regex."""
+    try:
+        out = subprocess.check_output(["ethtool", "-S", iface], stderr=subprocess.DEVNULL, text=True)
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+    stats = {}
+    for line in out.splitlines():
+        name, sep, value = line.strip().partition(":")
+        if not sep:
+            continue
+        name = name.strip()
+        if pattern and not pattern.match(name):
+            continue
+        try:
+            stats[name] = int(value.strip())
+        except ValueError:
+            continue
+    return stats
+
+
+def snapshot(rdma_dev, iface=None, port=1, root=IB_ROOT):
+    """One timestamped read of the RDMA port counters and the interface's pause counters."""
+    counters = read_hw_counters(rdma_dev, port, root) if rdma_dev else {}
+    if iface and iface != "N/A":
+        counters.update(read_ethtool_stats(iface, ETHTOOL_STAT))
+    return {"ts": time.time(), "counters": counters}
+
+
+def deltas(before, after):
+    """Per-counter increase between two snapshots, plus the elapsed seconds."""
+    elapsed = after["ts"] - before["ts"]
+    diff = {name: value - before["counters"].get(name, value) for name, value in after["counters"].items()}
+    return elapsed, diff
+
+
+def pause_frames(diff):
+    """Pause frames in a counter delta: the port-wide counters when the NIC has them, else the per-priority
+    ones (never both, which would count every PFC frame twice)."""
+    port_wide = [v for k, v in diff.items() if GLOBAL_PAUSE_STAT.match(k)]
+    if port_wide:
+        return sum(port_wide)
+    return sum(v for k, v in diff.items() if PRIO_STAT.match(k) and k.endswith("_pause"))
+
+
+def congestion_summary(elapsed, diff):
+    """CNP, ECN-marked and pause-frame totals and rates from counter deltas."""
+    cnp = sum(diff.get(c, 0) for c in ("np_cnp_sent", "rp_cnp_handled"))
+    ecn = sum(diff.get(c, 0) for c in ECN_COUNTERS)
+    pause = pause_frames(diff)
+    rate = (lambda n: round(n / elapsed, 3)) if elapsed > 0 else (lambda n: 0.0)
+    return {"cnp": cnp, "cnp_per_s": rate(cnp), "ecn_marked": ecn, "ecn_per_s": rate(ecn),
+            "pause_frames": pause, "pause_per_s": rate(pause)}
+
+
+def priority_summary(elapsed, diff):
+    """Per-priority pause frames and wire Gbps from counter deltas: {prio: {"rx_pause": ...}}."""
+    prios = {}
+    for name, value in diff.items():
+        m = PRIO_STAT.match(name)
+        if not m:
+            continue
+        direction, prio, kind = m.group(1), int(m.group(2)), m.group(3)
+        entry = prios.setdefault(prio, {"rx_pause": 0, "tx_pause": 0, "rx_gbps": 0.0, "tx_gbps": 0.0})
+        if kind == "pause":
+            entry[f"{direction}_pause"] += value
+        elif elapsed > 0:
+            entry[f"{direction}_gbps"] = round(value * 8 / elapsed / 1e9, 3)
+    return dict(sorted(prios.items()))
@@ -1,11 +1,12 @@
 # prometheus_exporter.py
-from prometheus_client import start_http_server, Gauge
 import threading
 
-def start_prometheus_exporter(port=9100):
+
+def start_prometheus_exporter(port=9100, registry=None):
+    """Serve ``registry`` (default: prometheus_client's global REGISTRY) on ``port`` from a daemon thread."""
     def _run():
-        from prometheus_client import REGISTRY
-        start_http_server(port)
+        from prometheus_client import REGISTRY, start_http_server
+        start_http_server(port, registry=REGISTRY if registry is None else registry)
         print(f"[Prometheus Exporter] Started at http://0.0.0.0:{port}/metrics")
         threading.Event().wait()  # Keeps it alive
 
@@ -0,0 +1,322 @@
+# rdma_agent.py
+import argparse
+import hmac
+import ipaddress
+import itertools
+import json
+import os
+import re
+import socket
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rdma_perf_tool import RDMAPerf
+
+DEFAULT_AGENT_PORT = 18600
+# Shared secret for agents listening beyond loopback; coordinators read the same variable
+TOKEN_ENV = "RDMA_AGENT_TOKEN"
+
+NAME_RE = re.compile(r"^[\w.-]+$")
+HOSTNAME_RE = re.compile(r"^(?=.{1,253}$)[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?"
+                         r"(\.[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?)*$")
+
+
+def _name(value):
+    return isinstance(value, str) and bool(NAME_RE.match(value))
+
+
+def _host(value):
+    if not isinstance(value, str):
+        return False
+    try:
+        ipaddress.ip_address(value)
+        return True
+    except ValueError:
+        return bool(HOSTNAME_RE.match(value))
+
+
+def _int(lo, hi):
+    return lambda value: isinstance(value, int) and not isinstance(value, bool) and lo <= value <= hi
+
+
+def _choice(*choices):
+    return lambda value: value in choices
+
+
+def _gid_index(value):
+    return value is None or value == "auto" or _int(0, 255)(value)
+
+
+# RDMAPerf keyword arguments a coordinator may set, with their validators; everything else is refused
+PERF_ARGS = {
+    "device": _name,
+    "server_ip": _host,
+    "size": _int(1, 1 << 31),
+    "qdepth": _int(1, 1 << 16),
+    "threads": _int(1, 4096),
+    "duration": _int(1, 7 * 86400),
+    "base_port": _int(1024, 65535),
+    "client_id": _int(0, 4096),
+    "test_type": _choice("write", "read", "send"),
+    "latency": _choice("bw", "lat"),
+    "iterations": _int(1, 1 << 31),
+    "gid_index": _gid_index,
+    "use_report_gbits": lambda value: isinstance(value, bool),
+}
+
+
+def validate_perf_args(perf_args):
+    """Reject anything but whitelisted, well-typed RDMAPerf kwargs (they end up on perftest's command line)."""
+    if not isinstance(perf_args, dict):
+        raise ValueError("'perf' must be an object")
+    for key, value in perf_args.items():
+        check = PERF_ARGS.get(key)
+        if check is None:
+            raise ValueError(f"unsupported perf argument {key!r}; allowed: {sorted(PERF_ARGS)}")
+        if value is not None and not check(value):
+            raise ValueError(f"invalid value for {key}: {value!r}")
+    return perf_args
+
+
+class AgentJob:
+    """One RDMAPerf role run by the agent: a client run, or a persistent server until stopped."""
+
+    def __init__(self, job_id, role, perf_args, start_at=None):
+        self.id = job_id
+        self.role = role
+        self.perf_args = perf_args
+        self.start_at = start_at
+        self.state = "pending"
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.perf = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        try:
+            self.perf = RDMAPerf(role=self.role, persistent_server=self.role == "server", **self.perf_args)
+            if self.start_at:
+                # Synchronized start: the coordinator hands out an absolute time in this host's clock
+                delay = self.start_at - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            self.started = time.time()
+            self.state = "running"
+            if self.role == "server":
+                self.perf.start_persistent_server()
+                return
+            self.perf.run()
+            self.state = "done"
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            print(f"[Agent] Job {self.id} failed: {e}")
+        self.finished = time.time()
+
+    def stop(self):
+        if not self.perf or self.state != "running":
+            return
+        if self.role == "server":
+            self.perf.stop_persistent_server()
+            self.state = "done"
+            self.finished = time.time()
+        else:
+            self.perf.stop_streams("agent_stop")
+
+    def describe(self, with_results=True):
+        out = {"id": self.id, "role": self.role, "state": self.state, "error": self.error,
+               "start_at": self.start_at, "started": self.started, "finished": self.finished,
+               "config": self.perf.run_config() if self.perf else self.perf_args}
+        if with_results and self.perf:
+            out["results"] = [{k: v for k, v in dict(r).items() if k != "connections"}
+                              for r in list(self.perf.results.values())]
+        return out
+
+
+class RDMAAgent:
+    """Per-host agent that runs RDMAPerf client/server roles on behalf of a remote coordinator.
+
+    JSON over HTTP:
+      GET  /status               host name, clock and job list
+      POST /server               start a persistent server ({"perf": {...RDMAPerf kwargs}})
+      POST /client               start a client run ({"perf": {...}, "start_at": epoch seconds})
+      GET  /jobs/<id>            job state and per-stream results (with per-second samples)
+      POST /jobs/<id>/stop       stop a client's streams or a persistent server
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_AGENT_PORT, token=None):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self.httpd = None
+
+    def submit(self, role, body):
+        start_at = body.get("start_at")
+        if start_at is not None and (isinstance(start_at, bool) or not isinstance(start_at, (int, float))):
+            raise ValueError(f"invalid start_at: {start_at!r}")
+        job = AgentJob(next(self._ids), role, validate_perf_args(body.get("perf", {})), start_at)
+        self.jobs[job.id] = job
+        print(f"[Agent] Job {job.id}: {role} {job.perf_args}"
+              + (f" at {job.start_at:.3f}" if job.start_at else ""))
+        job.thread.start()
+        return job
+
+    def status(self):
+        return {"hostname": socket.gethostname(), "time": time.time(),
+                "jobs": [j.describe(with_results=False) for j in self.jobs.values()]}
+
+    def authorized(self, header):
+        if not self.token:
+            return True
+        return hmac.compare_digest((header or "").encode(), f"Bearer {self.token}".encode())
+
+    def handle(self, method, path, body):
+        parts = [p for p in path.split("/") if p]
+        if method == "GET" and parts == ["status"]:
+            return 200, self.status()
+        if method == "POST" and parts in (["server"], ["client"]):
+            try:
+                job = self.submit(parts[0], body)
+            except ValueError as e:
+                return 400, {"error": str(e)}
+            return 200, job.describe(with_results=False)
+        if len(parts) >= 2 and parts[0] == "jobs" and parts[1].isdigit():
+            job = self.jobs.get(int(parts[1]))
+            if not job:
+                return 404, {"error": f"no job {parts[1]}"}
+            if method == "GET" and len(parts) == 2:
+                return 200, job.describe()
+            if method == "POST" and parts[2:] == ["stop"]:
+                job.stop()
+                return 200, job.describe(with_results=False)
+        return 404, {"error": f"unknown request {method} {path}"}
+
+    def serve_forever(self):
+        agent = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    if not agent.authorized(self.headers.get("Authorization")):
+                        code, payload = 401, {"error": "missing or wrong agent token"}
+                    elif not isinstance(body, dict):
+                        code, payload = 400, {"error": "request body must be a JSON object"}
+                    else:
+                        code, payload = agent.handle(method, self.path, body)
+                except ValueError as e:
+                    code, payload = 400, {"error": f"bad request: {e}"}
+                except Exception as e:
+                    code, payload = 500, {"error": str(e)}
+                data = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._reply("GET")
+
+            def do_POST(self):
+                self._reply("POST")
+
+            def log_message(self, fmt, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        print(f"[Agent] Listening on {self.host}:{self.port}" + (" (token required)" if self.token else ""))
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        for job in self.jobs.values():
+            job.stop()
+        if self.httpd:
+            self.httpd.server_close()
+
+
+class AgentClient:
+    """Coordinator-side handle for one agent (``host`` or ``host:port``)."""
+
+    def __init__(self, address, timeout=10.0, token=None):
+        host, _, port = address.partition(":")
+        self.host = host
+        self.url = f"http://{host}:{port or DEFAULT_AGENT_PORT}"
+        self.timeout = timeout
+        self.token = token or os.environ.get(TOKEN_ENV)
+        self.clock_offset = 0.0
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        req = urllib.request.Request(self.url + path, data=data, method=method, headers=headers)
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            return json.loads(resp.read())
+
+    def sync_clock(self):
+        """Estimate agent clock minus local clock from a round trip to /status."""
+        sent = time.time()
+        status = self.request("GET", "/status")
+        received = time.time()
+        self.clock_offset = status["time"] - (sent + received) / 2
+        return status
+
+    def start_server(self, **perf_args):
+        return self.request("POST", "/server", {"perf": perf_args})["id"]
+
+    def start_client(self, start_at=None, **perf_args):
+        body = {"perf": perf_args}
+        if start_at:
+            body["start_at"] = start_at + self.clock_offset
+        return self.request("POST", "/client", body)["id"]
+
+    def job(self, job_id):
+        return self.request("GET", f"/jobs/{job_id}")
+
+    def stop(self, job_id):
+        return self.request("POST", f"/jobs/{job_id}/stop", {})
+
+    def wait(self, job_id, timeout=None, poll=1.0):
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            job = self.job(job_id)
+            if job["state"] in ("done", "failed"):
+                return job
+            if deadline and time.monotonic() > deadline:
+                self.stop(job_id)
+                return self.job(job_id)
+            time.sleep(poll)
+
+    def local_ts(self, agent_ts):
+        return agent_ts - self.clock_offset
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-host agent running RDMAPerf roles for a coordinator")
+    parser.add_argument("--listen", default="127.0.0.1",
+                        help=f"Address to listen on; anything but loopback requires --token (or ${TOKEN_ENV})")
+    parser.add_argument("--port", type=int, default=DEFAULT_AGENT_PORT, help="Agent HTTP port")
+    parser.add_argument("--token", default=os.environ.get(TOKEN_ENV),
+                        help=f"Shared secret coordinators must send (they read ${TOKEN_ENV})")
+    args = parser.parse_args()
+    try:
+        loopback = ipaddress.ip_address(args.listen).is_loopback
+    except ValueError:
+        loopback = args.listen == "localhost"
+    if not loopback and not args.token:
+        parser.error(f"--listen {args.listen} accepts remote jobs; set --token or ${TOKEN_ENV}")
+
+    agent = RDMAAgent(args.listen, args.port, token=args.token)
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[Agent] Stopping jobs...")
+        agent.shutdown()
@@ -1,4 +1,13 @@
+import argparse
+import ipaddress
+import json
 import os
+import platform
+import socket
+import subprocess
+import time
+
+from perftest_caps import perftest_version
 
 def read_sysfs(path):
     try:
@@ -7,95 +16,357 @@ def read_sysfs(path):
     except Exception:
         return "N/A"
 
-def get_rdma_device_interface_mapping():
-    base_path = "/sys/class/infiniband"
-    debugfs_root = "/sys/kernel/debug/mlx5"
-    mapping = {}
+IB_ROOT = "/sys/class/infiniband"
+DEBUGFS_ROOT = "/sys/kernel/debug/mlx5"
+PCI_ROOT = "/sys/bus/pci/devices"
+INVENTORY_CACHE = os.path.expanduser("~/.cache/rdma_perf/inventory.json")
+INVENTORY_VERSION = 1
+
+
+def _listdir(path):
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return []
+
+
+def inventory_key(base_path=IB_ROOT):
+    """Cheap fingerprint of what the inventory depends on: device set, port states, netdevs and operstate."""
+    key = []
+    for dev in _listdir(base_path):
+        ports = [read_sysfs(os.path.join(base_path, dev, "ports", p, "state"))
+                 for p in _listdir(os.path.join(base_path, dev, "ports"))]
+        ifaces = [[iface, read_sysfs(f"/sys/class/net/{iface}/operstate")]
+                  for iface in _listdir(os.path.join(base_path, dev, "device/net"))]
+        key.append([dev, ports, ifaces])
+    return key
+
+
+def _scan_device(rdma_dev, base_path=IB_ROOT, debugfs_root=DEBUGFS_ROOT):
+    """sysfs/debugfs facts for one RDMA device (everything except ethtool)."""
+    info = {
+        "interface": "N/A",
+        "mac": "N/A",
+        "link_state": "Unknown",
+        "mtu": "N/A",
+        "speed_gbps": "N/A",
+        "roce_mode": "RoCE v1 or IB",
+        "cnp_received": "N/A",
+        "dcqcn_enabled": "N/A",
+        "pci_addr": "N/A",
+    }
+    ifaces = _listdir(os.path.join(base_path, rdma_dev, "device/net"))
+    if not ifaces:
+        return info
+    try:
+        iface_name = ifaces[0]
+        iface_path = f"/sys/class/net/{iface_name}"
+        speed_raw = read_sysfs(os.path.join(iface_path, "speed"))
+        info.update({
+            "interface": iface_name,
+            "link_state": read_sysfs(os.path.join(iface_path, "operstate")).upper(),
+            "mtu": read_sysfs(os.path.join(iface_path, "mtu")),
+            "speed_gbps": speed_raw if speed_raw != "-1" else "N/A",
+            "mac": read_sysfs(os.path.join(iface_path, "address")),
+            "pci_addr": os.path.basename(os.path.realpath(os.path.join(base_path, rdma_dev, "device"))),
+        })
+
+        # RoCEv2 if any GID index is typed "RoCE v2"; stop at the first hit
+        gid_types_path = os.path.join(base_path, rdma_dev, "ports/1/gid_attrs/types")
+        for gid_file in _listdir(gid_types_path):
+            if read_sysfs(os.path.join(gid_types_path, gid_file)) == "RoCE v2":
+                info["roce_mode"] = "RoCE v2"
+                break
+
+        if info["link_state"] == "UP" and info["roce_mode"] == "RoCE v2":
+            cc_params_path = os.path.join(debugfs_root, info["pci_addr"], "cc_params")
+            if os.path.isdir(cc_params_path):
+                expected_fields = ["rp_dce_tcp_g", "rp_threshold", "rp_clamp_tgt_rate"]
+                available = all(os.path.exists(os.path.join(cc_params_path, f)) for f in expected_fields)
+                info["dcqcn_enabled"] = "Yes" if available else "Partial"
+            elif os.path.isfile(cc_params_path):
+                info["dcqcn_enabled"] = "Yes" if "ecn_en: 1" in read_sysfs(cc_params_path) else "No"
+            else:
+                info["dcqcn_enabled"] = "Not Found"
+    except Exception:
+        pass
+    return info
+
 
+def build_inventory(base_path=IB_ROOT, debugfs_root=DEBUGFS_ROOT, max_workers=16):
+    """Scan every device in parallel, then run ``ethtool -S`` once per UP RoCEv2 interface."""
+    from concurrent.futures import ThreadPoolExecutor
+    from port_counters import read_ethtool_stats
+
+    devices = _listdir(base_path)
+    if not devices:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(devices))) as pool:
+        infos = dict(zip(devices, pool.map(lambda d: _scan_device(d, base_path, debugfs_root), devices)))
+        ifaces = sorted({i["interface"] for i in infos.values()
+                         if i["link_state"] == "UP" and i["roce_mode"] == "RoCE v2"})
+        stats = dict(zip(ifaces, pool.map(read_ethtool_stats, ifaces))) if ifaces else {}
+    for info in infos.values():
+        if info["interface"] in stats:
+            info["cnp_received"] = "Yes" if any("cnp" in k.lower() for k in stats[info["interface"]]) else "No"
+    return infos
+
+
+def get_rdma_device_interface_mapping(refresh=False, cache_path=INVENTORY_CACHE, base_path=IB_ROOT):
+    """Device -> interface/link/RoCE/DCQCN facts, served from a disk cache while the device set and
+    link states are unchanged. ``refresh`` forces a rescan; ``cache_path=None`` disables the cache."""
     if not os.path.exists(base_path):
-        print("No RDMA devices found in /sys/class/infiniband")
+        print(f"No RDMA devices found in {base_path}")
         return {}
 
-    for rdma_dev in os.listdir(base_path):
-        net_dir = os.path.join(base_path, rdma_dev, "device/net")
-        iface_name = "N/A"
-        mac_addr = "N/A"
-        link_state = "Unknown"
-        mtu = "N/A"
-        speed_gbps = "N/A"
-        roce_mode = "RoCE v1 or IB"
-        cnp_received = "N/A"
-        dcqcn_enabled = "N/A"
-        pci_addr = "N/A"
-
-        if os.path.isdir(net_dir):
-            try:
-                iface_name = os.listdir(net_dir)[0]
-                iface_path = f"/sys/class/net/{iface_name}"
-
-                link_state = read_sysfs(os.path.join(iface_path, "operstate")).upper()
-                mtu = read_sysfs(os.path.join(iface_path, "mtu"))
-                speed_raw = read_sysfs(os.path.join(iface_path, "speed"))
-                speed_gbps = speed_raw if speed_raw != "-1" else "N/A"
-                mac_addr = read_sysfs(os.path.join(iface_path, "address"))
-
-                # Detect RoCEv2 by scanning all GID indices
-                gid_types_path = os.path.join(base_path, rdma_dev, "ports/1/gid_attrs/types")
-                if os.path.isdir(gid_types_path):
-                    for gid_file in os.listdir(gid_types_path):
-                        gid_type_path = os.path.join(gid_types_path, gid_file)
-                        gid_type = read_sysfs(gid_type_path)
-                        if gid_type == "RoCE v2":
-                            roce_mode = "RoCE v2"
-                            break
-
-                # Get PCI address
-                try:
-                    pci_link = os.path.realpath(os.path.join(base_path, rdma_dev, "device"))
-                    pci_addr = os.path.basename(pci_link)
-                except Exception:
-                    pci_addr = "N/A"
-
-                # If RoCEv2 is active and interface is UP, check CNP/DCQCN
-                if link_state == "UP" and roce_mode == "RoCE v2":
-                    ethtool_output = os.popen(f"ethtool -S {iface_name} 2>/dev/null | grep -i cnp").read()
-                    cnp_received = "Yes" if "cnp" in ethtool_output.lower() else "No"
-
-                    # Detect DCQCN model
-                    cc_params_path = os.path.join(debugfs_root, pci_addr, "cc_params")
-                    if os.path.isdir(cc_params_path):
-                        expected_fields = ["rp_dce_tcp_g", "rp_threshold", "rp_clamp_tgt_rate"]
-                        available = all(os.path.exists(os.path.join(cc_params_path, f)) for f in expected_fields)
-                        dcqcn_enabled = "Yes" if available else "Partial"
-                    elif os.path.isfile(cc_params_path):
-                        cc_params = read_sysfs(cc_params_path)
-                        dcqcn_enabled = "Yes" if "ecn_en: 1" in cc_params else "No"
-                    else:
-                        dcqcn_enabled = "Not Found"
-
-            except Exception:
-                pass
-
-        mapping[rdma_dev] = {
-            "interface": iface_name,
-            "mac": mac_addr,
-            "link_state": link_state,
-            "mtu": mtu,
-            "speed_gbps": speed_gbps,
-            "roce_mode": roce_mode,
-            "cnp_received": cnp_received,
-            "dcqcn_enabled": dcqcn_enabled,
-            "pci_addr": pci_addr
-        }
+    key = inventory_key(base_path)
+    if cache_path and not refresh:
+        try:
+            with open(cache_path) as f:
+                cached = json.load(f)
+            if cached.get("version") == INVENTORY_VERSION and cached.get("key") == key:
+                return cached["mapping"]
+        except (OSError, ValueError):
+            pass
 
+    mapping = build_inventory(base_path)
+    if cache_path:
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"version": INVENTORY_VERSION, "key": key, "created": time.time(), "mapping": mapping}, f)
+            os.replace(tmp, cache_path)
+        except OSError:
+            pass
     return mapping
 
 
+def get_rdma_interface(rdma_dev):
+    """Net interface backing an RDMA device (RoCE), or None."""
+    net_dir = os.path.join(IB_ROOT, rdma_dev or "", "device/net")
+    try:
+        ifaces = sorted(os.listdir(net_dir))
+    except OSError:
+        return None
+    return ifaces[0] if ifaces else None
+
+
+_gid_tables = {}
+_iface_networks = {}
+_routes = {}
+
+
+def read_gid_table(rdma_dev, port=1, base_path=IB_ROOT, refresh=False):
+    """Populated GID entries of one port: [{index, gid, type, ndev}], cached per process."""
+    key = (base_path, rdma_dev, port)
+    if key in _gid_tables and not refresh:
+        return _gid_tables[key]
+    port_path = os.path.join(base_path, rdma_dev, "ports", str(port))
+    table = []
+    for name in _listdir(os.path.join(port_path, "gids")):
+        gid = read_sysfs(os.path.join(port_path, "gids", name))
+        if gid == "N/A" or set(gid.replace(":", "")) <= {"0"}:
+            continue
+        table.append({
+            "index": int(name),
+            "gid": gid,
+            # Unpopulated entries fail to read (EINVAL) and come back as N/A
+            "type": read_sysfs(os.path.join(port_path, "gid_attrs/types", name)),
+            "ndev": read_sysfs(os.path.join(port_path, "gid_attrs/ndevs", name)),
+        })
+    table.sort(key=lambda e: e["index"])
+    _gid_tables[key] = table
+    return table
+
+
+def gid_to_ip(gid):
+    """GID text to an ipaddress object; IPv4-mapped GIDs (::ffff:a.b.c.d) become IPv4."""
+    try:
+        addr = ipaddress.IPv6Address(gid)
+    except ValueError:
+        return None
+    return addr.ipv4_mapped or addr
+
+
+def interface_networks(ndev):
+    """Addresses with prefix length configured on a netdev (``ip -j addr``), cached per process."""
+    if ndev in _iface_networks:
+        return _iface_networks[ndev]
+    networks = []
+    try:
+        out = subprocess.check_output(["ip", "-j", "addr", "show", "dev", ndev], stderr=subprocess.DEVNULL, text=True)
+        for link in json.loads(out):
+            for a in link.get("addr_info", []):
+                networks.append(ipaddress.ip_interface(f"{a['local']}/{a['prefixlen']}"))
+    except (OSError, subprocess.CalledProcessError, ValueError, KeyError):
+        pass
+    _iface_networks[ndev] = networks
+    return networks
+
+
+def resolve_server_address(server_ip):
+    """``server_ip`` (address or hostname) as an ipaddress object; None if it does not resolve to a
+    routable address."""
+    try:
+        addr = ipaddress.ip_address(server_ip)
+        return None if addr.is_loopback else addr
+    except ValueError:
+        pass
+    try:
+        infos = socket.getaddrinfo(server_ip, None, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError):
+        return None
+    # Prefer IPv4, as perftest's out-of-band connection does
+    for info in sorted(infos, key=lambda i: i[0] != socket.AF_INET):
+        addr = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not addr.is_loopback:
+            return addr
+    return None
+
+
+def egress_route(target):
+    """Netdev and source address the kernel would use to reach ``target`` (``ip -j route get``),
+    cached per process; {} when there is no route or ``ip`` is unavailable."""
+    key = str(target)
+    if key in _routes:
+        return _routes[key]
+    route = {}
+    try:
+        out = subprocess.check_output(["ip", "-j", "route", "get", key], stderr=subprocess.DEVNULL, text=True)
+        entry = (json.loads(out) or [{}])[0]
+        route = {"dev": entry.get("dev"), "src": entry.get("prefsrc")}
+    except (OSError, subprocess.CalledProcessError, ValueError, IndexError):
+        pass
+    _routes[key] = route
+    return route
+
+
+def resolve_gid_index(rdma_dev, server_ip=None, port=1, base_path=IB_ROOT):
+    """Pick the RoCE v2 GID that can reach ``server_ip``.
+
+    Candidates must be RoCE v2, not link-local and in the server's address family. Among those,
+    the GID holding the source address of the kernel's route to the server wins, then a GID on the
+    route's egress netdev, then one in the server's subnet; otherwise the first global RoCE v2 GID
+    of that family is used, so routed (L3) fabrics still get a RoCE v2 GID. Without a server
+    (server role) the first global RoCE v2 IPv4 GID wins, then IPv6. Returns the choice, why it
+    was chosen and every rejected GID with its reason; ``gid_index`` is None only when no RoCE v2
+    GID of the right family exists. A hostname is resolved first; one that does not resolve (or
+    resolves to loopback) is treated like no server.
+    """
+    target = resolve_server_address(server_ip) if server_ip else None
+    route = egress_route(target) if target is not None else {}
+    table = read_gid_table(rdma_dev, port, base_path)
+    candidates, rejected = [], []
+    for entry in table:
+        ip = gid_to_ip(entry["gid"])
+        reason = None
+        if entry["type"] != "RoCE v2":
+            reason = f"type {entry['type']}"
+        elif ip is None or ip.is_link_local:
+            reason = "link-local"
+        elif target is not None and ip.version != target.version:
+            reason = f"IPv{ip.version} GID for IPv{target.version} server"
+        if reason:
+            rejected.append({"index": entry["index"], "gid": entry["gid"], "reason": reason})
+            continue
+        match = "global"
+        if target is not None:
+            if route.get("src") and str(ip) == route["src"]:
+                match = "route source"
+            elif route.get("dev") and entry["ndev"] == route["dev"]:
+                match = "egress netdev"
+            elif any(n.ip == ip and target in n.network for n in interface_networks(entry["ndev"])):
+                match = "subnet"
+        candidates.append((entry, ip, match))
+
+    preference = ["route source", "egress netdev", "subnet", "global"]
+    if target is None:
+        candidates.sort(key=lambda c: (c[1].version, c[0]["index"]))
+    else:
+        candidates.sort(key=lambda c: (preference.index(c[2]), c[0]["index"]))
+    choice = candidates[0] if candidates else None
+    for entry, ip, match in candidates[1:]:
+        rejected.append({"index": entry["index"], "gid": entry["gid"],
+                         "reason": f"lower preference than {choice[0]['index']} ({match})"})
+    return {
+        "device": rdma_dev,
+        "port": port,
+        "gid_index": choice[0]["index"] if choice else None,
+        "gid": choice[0]["gid"] if choice else None,
+        "ip": str(choice[1]) if choice else None,
+        "match": choice[2] if choice else None,
+        "route": route,
+        "rejected": sorted(rejected, key=lambda r: r["index"]),
+    }
+
+
+def _parse_gts(text):
+    """"16.0 GT/s PCIe" -> 16.0; None when unreadable ("Unknown", N/A)."""
+    try:
+        return float(text.split()[0])
+    except (ValueError, IndexError):
+        return None
+
+
+def read_pcie_link(pci_addr, pci_root=PCI_ROOT):
+    """Negotiated and maximum PCIe link of a PCI function: {speed_gts, width, max_speed_gts, max_width}."""
+    dev_path = os.path.join(pci_root, pci_addr)
+
+    def width(name):
+        value = read_sysfs(os.path.join(dev_path, name))
+        return int(value) if value.isdigit() else None
+
+    return {
+        "speed_gts": _parse_gts(read_sysfs(os.path.join(dev_path, "current_link_speed"))),
+        "width": width("current_link_width"),
+        "max_speed_gts": _parse_gts(read_sysfs(os.path.join(dev_path, "max_link_speed"))),
+        "max_width": width("max_link_width"),
+    }
+
+
+def device_pci_addr(rdma_dev, base_path=IB_ROOT):
+    dev_path = os.path.join(base_path, rdma_dev, "device")
+    return os.path.basename(os.path.realpath(dev_path)) if os.path.exists(dev_path) else None
+
+
+def get_run_environment(rdma_dev=None):
+    """Host and NIC facts stored alongside results (firmware, kernel, perftest version)."""
+    env = {
+        "hostname": socket.gethostname(),
+        "kernel": platform.release(),
+        "python": platform.python_version(),
+    }
+    if rdma_dev:
+        dev_path = os.path.join("/sys/class/infiniband", rdma_dev)
+        env.update({
+            "fw_ver": read_sysfs(os.path.join(dev_path, "fw_ver")),
+            "hca_type": read_sysfs(os.path.join(dev_path, "hca_type")),
+            "board_id": read_sysfs(os.path.join(dev_path, "board_id")),
+            "pci_addr": os.path.basename(os.path.realpath(os.path.join(dev_path, "device")))
+            if os.path.exists(dev_path) else "N/A",
+        })
+        pci_addr = device_pci_addr(rdma_dev)
+        pcie = read_pcie_link(pci_addr) if pci_addr else {}
+        if pcie.get("speed_gts") and pcie.get("width"):
+            env["pcie_link"] = f"{pcie['speed_gts']:g} GT/s x{pcie['width']}"
+    env["perftest_version"] = perftest_version() or "N/A"
+    return env
+
+
 if __name__ == "__main__":
-    rdma_map = get_rdma_device_interface_mapping()
+    parser = argparse.ArgumentParser(description="RDMA device / interface inventory")
+    parser.add_argument("--refresh", action="store_true", help="Rescan even if the cached inventory is current")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the inventory cache")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    rdma_map = get_rdma_device_interface_mapping(refresh=args.refresh,
+                                                 cache_path=None if args.no_cache else INVENTORY_CACHE)
     header = f"{'RDMA Dev':<15} {'Interface':<15} {'MAC Addr':<18} {'Link':<8} {'MTU':<6} {'Speed':<8} {'RoCE Mode':<15} {'CNP':<6} {'DCQCN':<9} {'PCI Addr'}"
     print(header)
     print("-" * len(header))
     for dev, info in rdma_map.items():
         print(f"{dev:<15} {info['interface']:<15} {info['mac']:<18} {info['link_state']:<8} {info['mtu']:<6} {info['speed_gbps']:<8} "
               f"{info['roce_mode']:<15} {info['cnp_received']:<6} {info['dcqcn_enabled']:<9} {info['pci_addr']}")
+    print(f"[Inventory] {len(rdma_map)} devices in {(time.monotonic() - started) * 1000:.1f} ms")
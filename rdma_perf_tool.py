@@ -1,27 +1,153 @@
-import os,re,socket
+import os,re,socket,signal
 import subprocess
 import threading
 import time
 import json
 import csv
 from datetime import datetime
-from prometheus_client import start_http_server, Gauge
 
-from prometheus_client import CollectorRegistry
-from prometheus_exporter import start_prometheus_exporter
+from rdma_stats import SteadyStateDetector, mean
+from rdma_device import get_run_environment, get_rdma_interface, resolve_gid_index
+import port_counters
+import link_model
+import perftest_caps
+from perftest_errors import ErrorPolicy, classify as classify_error
+from stream_watchdog import StreamWatchdog, escalate
 
-# Global Prometheus registry shared across NVIDIA and AMD
-global_prometheus_registry = CollectorRegistry()
+# Optional subsystems (prometheus_client, result log/DB writers, timeline, adaptive stop) are imported
+# where they are enabled, so plain client runs start without them.
+
+# Prometheus registry shared across NVIDIA and AMD, created on first use
+global_prometheus_registry = None
+_metric_cache = {}
+
+# Bucket upper bounds (usec) for per-port latency histograms
+LAT_BUCKETS_USEC = (1, 2, 3, 5, 7.5, 10, 15, 20, 30, 50, 75, 100, 200, 500, 1000, float("inf"))
+# Persistent server respawn policy: exits faster than CRASH_UPTIME_SEC with a non-zero code
+# count as crashes and back off exponentially; everything else respawns immediately.
+CRASH_UPTIME_SEC = 2.0
+RESPAWN_BACKOFF_BASE_SEC = 0.25
+RESPAWN_BACKOFF_MAX_SEC = 30.0
+BW_STEADY_FIELDS = ["bw_raw_avg_gbps", "bw_ss_mean_gbps", "bw_ss_p5_gbps", "bw_ss_p50_gbps", "bw_ss_p95_gbps",
+                    "ss_warmup_samples", "ss_cooldown_samples"]
+QOS_FIELDS = ["priority", "dscp", "tclass"]
+STATUS_FIELDS = ["status", "attempts", "error_category", "error_message", "timeout_reason"]
+LINK_FIELDS = ["pct_of_achievable", "below_model"]
+PLACEMENT_FIELDS = ["core", "numa_node", "cpu_util"]
+LAT_ROW_FIELDS = ["payload_size", "iterations", "t_min_usec", "t_max_usec", "t_typical_usec",
+                  "t_avg_usec", "t_stdev_usec", "t_99_percentile_usec", "t_999_percentile_usec"]
+
+
+class _NullMetric:
+    """Stands in for every metric when Prometheus is disabled."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def set(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+NULL_METRIC = _NullMetric()
+
+
+def prometheus_registry():
+    global global_prometheus_registry
+    if global_prometheus_registry is None:
+        from prometheus_client import CollectorRegistry
+        global_prometheus_registry = CollectorRegistry()
+    return global_prometheus_registry
+
+
+def _gauge(name, doc, labels=(), registry=None):
+    """Register a Gauge once per registry so several RDMAPerf instances can coexist (no-op without a registry)."""
+    if registry is None:
+        return NULL_METRIC
+    key = (id(registry), name)
+    if key not in _metric_cache:
+        from prometheus_client import Gauge
+        _metric_cache[key] = Gauge(name, doc, list(labels), registry=registry)
+    return _metric_cache[key]
+
+
+def _histogram(name, doc, labels=(), buckets=LAT_BUCKETS_USEC, registry=None):
+    if registry is None:
+        return NULL_METRIC
+    key = (id(registry), name)
+    if key not in _metric_cache:
+        from prometheus_client import Histogram
+        _metric_cache[key] = Histogram(name, doc, list(labels), buckets=buckets, registry=registry)
+    return _metric_cache[key]
+
+
+def parse_lat_row(line):
+    """Parse an ib_*_lat summary row; returns None for anything else."""
+    parts = line.split()
+    if len(parts) < 9 or not re.match(r"^\d+\s+\d+", line.strip()):
+        return None
+    try:
+        row = {"payload_size": int(parts[0]), "iterations": int(parts[1])}
+        for field, value in zip(LAT_ROW_FIELDS[2:], parts[2:9]):
+            row[field] = float(value)
+    except ValueError:
+        return None
+    return row
+
+
+def parse_priorities(text):
+    """"3,0" or "3:26,0" -> [{"priority": 3, "dscp": 26, "tclass": 104}, ...].
+
+    DSCP defaults to priority x 8 (the default dscp -> priority map); the GRH traffic class
+    carries DSCP in its upper six bits.
+    """
+    priorities = []
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        prio, _, dscp = item.strip().partition(":")
+        prio = int(prio)
+        dscp = int(dscp) if dscp else prio * 8
+        if not 0 <= prio <= 7 or not 0 <= dscp <= 63:
+            raise ValueError(f"Priority must be 0-7 and DSCP 0-63: {item}")
+        priorities.append({"priority": prio, "dscp": dscp, "tclass": dscp << 2})
+    if not priorities:
+        raise ValueError(f"No priorities in {text!r}")
+    return priorities
+
+
+def new_lat_histogram():
+    return {"buckets": [b if b != float("inf") else "+Inf" for b in LAT_BUCKETS_USEC],
+            "counts": [0] * len(LAT_BUCKETS_USEC), "count": 0, "sum": 0.0}
+
+
+def observe_lat_histogram(hist, value):
+    for i, bound in enumerate(LAT_BUCKETS_USEC):
+        if value <= bound:
+            hist["counts"][i] += 1
+            break
+    hist["count"] += 1
+    hist["sum"] += value
 
 
-global_prometheus_registry = CollectorRegistry()
 class RDMAPerf:
     def __init__(self, role, device=None, threads=1, qdepth=512, size=65536, duration=60,
                  server_ip=None, base_port=18515, log_csv=False, log_json=False,
                  persistent_server=False, enable_prometheus=False, prometheus_port=9100,
-                 client_id=0, test_type="write",use_report_gbits=True,latency="bw"):
+                 client_id=0, test_type="write",use_report_gbits=True,latency="bw",
+                 rate_limit_gbps=None, rate_limit_type="SW", iterations=None, infinite_run=False,
+                 adaptive=False, ci_target=0.01, min_duration=5, stream_log=None, log_flush_interval=2.0,
+                 log_rotate_mb=64, log_rotate_minutes=None, results_db=None, timeline=False, timeline_interval=1.0,
+                 gid_index="auto", priorities=None, error_policy=None, watchdog=True, setup_grace=15.0,
+                 stall_timeout=10.0, use_hugepages=False, link_speed=None):
         self.role = role
         self.device = device or self.auto_detect_rdma_device()
+        self.interface = get_rdma_interface(self.device)
         self.threads = threads
         self.qdepth = qdepth
         self.size = size
@@ -38,10 +164,54 @@ class RDMAPerf:
         self.port = 1
         self.results = {}
         self.cpu_cores = self.get_cpu_cores()
-        self.supports_report_per_second = self.check_binary_supports("--report_per_second", "ib_write_bw")
+        self.perftest_caps = perftest_caps.get_perftest_caps()
         self.use_report_gbits = use_report_gbits
         self.report_per_second = True
         self.latency = latency
+        self.rate_limit_gbps = rate_limit_gbps
+        self.rate_limit_type = rate_limit_type
+        self.iterations = iterations
+        self.infinite_run = infinite_run
+        self.adaptive = adaptive
+        self.ci_target = ci_target
+        self.min_duration = min_duration
+        self.adaptive_outcome = None
+        self.procs = {}
+        self.stop_reason = None
+        self.streams_stopped = threading.Event()
+        self.error_policy = error_policy or ErrorPolicy()
+        self.watchdog = watchdog
+        self.setup_grace = setup_grace
+        self.stall_timeout = stall_timeout
+        self.stream_activity = {}
+        self.launch_order = None
+        self.stream_log = stream_log
+        self.log_flush_interval = log_flush_interval
+        self.log_rotate_mb = log_rotate_mb
+        self.log_rotate_minutes = log_rotate_minutes
+        self.result_log = None
+        self.results_db = results_db
+        self.run_ts = None
+        self.run_started = None
+        self.timeline = timeline
+        self.timeline_interval = timeline_interval
+        self.gid_resolution = None
+        self.gid_index = self.resolve_gid(gid_index)
+        self.priorities = priorities or []
+        self.priority_counters = None
+        self.run_counters = None
+        self._counters_before = None
+        self.use_hugepages = use_hugepages
+        self.link_speed = link_speed
+        self.link_efficiency = None
+        self.stream_cores = {}
+        self.stream_cpu = {}
+        self.diagnosis = None
+        self.hugepage_usage = None
+        self._hugepage_sampler = None
+        self._flag_warnings = set()
+        if use_hugepages and not self.check_binary_supports("--use_hugepages", self.perftest_binary()):
+            print(f"[Hugepages] {self.perftest_binary()} has no --use_hugepages; buffers use regular pages")
         self.active_threads = {}
         self.monitor_stop = threading.Event()
         self.server_thread_log = {}
@@ -56,26 +226,218 @@ class RDMAPerf:
         self.port_rkey = Gauge('rdma_port_rkey', 'Last seen RKey per RDMA server port', ['port'])
         self.port_vaddr = Gauge('rdma_port_vaddr', 'Last seen VAddr per RDMA server port', ['port'])"""
 
-        self.registry = global_prometheus_registry
+        self.registry = prometheus_registry() if enable_prometheus else None
 
-        self.thread_count = Gauge('rdma_active_threads', 'RDMA listener threads', registry=self.registry)
-        self.port_binary = Gauge('rdma_server_port_binary', 'RDMA binary used per port', ['port', 'binary'],
-                                 registry=self.registry)
-        self.port_core = Gauge('rdma_server_thread_core', 'CPU core per RDMA port', ['port', 'core'],
-                               registry=self.registry)
-        self.port_respawns = Gauge('rdma_server_thread_respawns', 'Number of times server thread respawned', ['port'],
-                                   registry=self.registry)
-        self.port_bw_gbps = Gauge('rdma_port_bw_gbps', 'Average bandwidth per port in Gbps', ['port'],
+        self.thread_count = _gauge('rdma_active_threads', 'RDMA listener threads', registry=self.registry)
+        self.port_binary = _gauge('rdma_server_port_binary', 'RDMA binary used per port', ['port', 'binary'],
                                   registry=self.registry)
-        self.port_msg_rate_mpps = Gauge('rdma_port_msg_rate_mpps', 'Message rate per port in Mpps', ['port'],
-                                        registry=self.registry)
-        self.port_rkey = Gauge('rdma_port_rkey', 'Last seen RKey per RDMA server port', ['port'],
-                               registry=self.registry)
-        self.port_vaddr = Gauge('rdma_port_vaddr', 'Last seen VAddr per RDMA server port', ['port'],
+        self.port_core = _gauge('rdma_server_thread_core', 'CPU core per RDMA port', ['port', 'core'],
                                 registry=self.registry)
+        self.port_respawns = _gauge('rdma_server_thread_respawns', 'Number of times server thread respawned',
+                                    ['port', 'reason'], registry=self.registry)
+        self.port_bw_gbps = _gauge('rdma_port_bw_gbps', 'Average bandwidth per port in Gbps', ['port'],
+                                   registry=self.registry)
+        self.port_msg_rate_mpps = _gauge('rdma_port_msg_rate_mpps', 'Message rate per port in Mpps', ['port'],
+                                         registry=self.registry)
+        self.port_rkey = _gauge('rdma_port_rkey', 'Last seen RKey per RDMA server port', ['port'],
+                                registry=self.registry)
+        self.port_vaddr = _gauge('rdma_port_vaddr', 'Last seen VAddr per RDMA server port', ['port'],
+                                 registry=self.registry)
+        self.port_lat_avg_usec = _gauge('rdma_port_lat_avg_usec', 'Last average latency per port in usec', ['port'],
+                                        registry=self.registry)
+        self.port_lat_p99_usec = _gauge('rdma_port_lat_p99_usec', 'Last 99th percentile latency per port in usec',
+                                        ['port'], registry=self.registry)
+        self.port_lat_hist = _histogram('rdma_port_lat_usec', 'Per-connection average latency per port in usec',
+                                        ['port'], registry=self.registry)
+        self.port_priority = _gauge('rdma_port_priority', 'Traffic priority per RDMA port', ['port', 'priority'],
+                                    registry=self.registry)
+        self.priority_bw_gbps = _gauge('rdma_priority_bw_gbps', 'Bandwidth per traffic priority in Gbps',
+                                       ['priority'], registry=self.registry)
 
         os.makedirs("logs", exist_ok=True)
 
+    def run_config(self):
+        """Configuration that identifies a run; stored with results so runs can be compared."""
+        return {
+            "role": self.role,
+            "device": self.device,
+            "test_type": self.test_type,
+            "latency": self.latency,
+            "size": self.size,
+            "qdepth": self.qdepth,
+            "threads": self.threads,
+            "duration": self.duration,
+            "server_ip": self.server_ip,
+            "base_port": self.base_port,
+            "client_id": self.client_id,
+            "gid_index": self.gid_index,
+            "priorities": self.priorities,
+            "use_hugepages": self.use_hugepages,
+        }
+
+    def open_result_log(self, role, id_val):
+        """Start the append-only record log for this run (enabled with stream_log='jsonl'|'csv')."""
+        self.run_ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if not self.stream_log:
+            return
+        from result_log import ResultLogWriter
+        ts = self.run_ts
+        self.result_log = ResultLogWriter(
+            f"logs/{role}_{id_val}_{ts}", fmt=self.stream_log, flush_interval=self.log_flush_interval,
+            rotate_bytes=int(self.log_rotate_mb * 1024 * 1024) if self.log_rotate_mb else None,
+            rotate_seconds=self.log_rotate_minutes * 60 if self.log_rotate_minutes else None)
+        self.result_log.run(**self.run_config(), env=get_run_environment(self.device))
+        if self.gid_resolution:
+            self.result_log.event("gid_resolution", **self.gid_resolution)
+        print(f"[Result Log] Recording to {self.result_log.segments[0]}")
+
+    def log_stream_result(self, thread_id):
+        if self.result_log:
+            data = {k: v for k, v in self.results.get(thread_id, {}).items()
+                    if k not in ("samples", "connections", "thread_id")}
+            self.result_log.result(thread_id, **data)
+
+    def store_results(self, source):
+        """Ingest this run into the SQLite result warehouse when results_db is set."""
+        if not self.results_db:
+            return
+        import result_db
+        run = result_db.make_run(source, self.run_config(), [
+            {k: v for k, v in r.items() if k not in ("samples", "connections")} for r in self.results.values()
+        ], env=get_run_environment(self.device), started=self.run_started)
+        conn = result_db.connect(self.results_db)
+        with conn:
+            run_id = result_db.ingest_run(conn, run)
+        conn.close()
+        if run_id is not None:
+            print(f"[Result DB] Stored run {run_id} in {self.results_db}")
+
+    def reset_results(self):
+        """Clear per-run state so the same instance can be run again."""
+        self.results = {}
+        self.procs = {}
+        self.stream_activity = {}
+        self.stop_reason = None
+        self.streams_stopped.clear()
+        self.adaptive_outcome = None
+        self.run_ts = None
+        self.run_started = None
+        self.priority_counters = None
+        self.run_counters = None
+        self.hugepage_usage = None
+        self.link_efficiency = None
+        self.stream_cores = {}
+        self.stream_cpu = {}
+        self.diagnosis = None
+
+    def resolve_gid(self, gid_index):
+        """``-x`` for every stream: an explicit index, or "auto" = RoCE v2 GID that reaches server_ip."""
+        if gid_index != "auto":
+            return gid_index
+        self.gid_resolution = resolve_gid_index(self.device, self.server_ip if self.role == "client" else None,
+                                                port=self.port)
+        res = self.gid_resolution
+        for r in res["rejected"]:
+            print(f"[GID] {self.device} port {self.port} index {r['index']} ({r['gid']}) rejected: {r['reason']}")
+        if res["gid_index"] is None:
+            print(f"[GID] No usable RoCE v2 GID on {self.device}; leaving the GID to perftest's default")
+        else:
+            print(f"[GID] Using index {res['gid_index']} ({res['ip']}, {res['match']}) on {self.device} "
+                  f"port {self.port}")
+        return res["gid_index"]
+
+    def stream_qos(self, port):
+        """Priority/DSCP/traffic class of the stream on ``port``; priorities are assigned round-robin
+        by port offset so client thread i and the server port it connects to always agree."""
+        if not self.priorities:
+            return {}
+        return dict(self.priorities[(port - self.base_port) % len(self.priorities)])
+
+    def start_port_counters(self):
+        # Client bw runs always take them for the bottleneck diagnosis
+        if self.priorities or (self.role == "client" and self.latency == "bw"):
+            self._counters_before = port_counters.snapshot(self.device, self.interface)
+
+    def finish_port_counters(self):
+        """Congestion counters over the run, plus per-priority pause/wire counters grouped with the
+        streams on each priority."""
+        if self._counters_before is None:
+            return
+        elapsed, diff = port_counters.deltas(self._counters_before, port_counters.snapshot(self.device, self.interface))
+        self._counters_before = None
+        self.run_counters = {"elapsed_s": round(elapsed, 3), **port_counters.congestion_summary(elapsed, diff),
+                             "out_of_sequence": diff.get("out_of_sequence")}
+        if not self.priorities:
+            return
+        counters = port_counters.priority_summary(elapsed, diff)
+        report = {}
+        for qos in self.priorities:
+            prio = qos["priority"]
+            streams = [r for r in self.results.values() if r.get("priority") == prio]
+            entry = report.setdefault(prio, {"priority": prio, "dscp": qos["dscp"], "tclass": qos["tclass"],
+                                             "streams": 0, "bw_gbps": 0.0})
+            if entry["streams"]:
+                continue
+            entry["streams"] = len(streams)
+            entry["bw_gbps"] = round(sum(r.get("bw_ss_mean_gbps", r.get("bw_avg_gbps", 0.0)) for r in streams), 3)
+            lat = [r["t_avg_usec"] for r in streams if "t_avg_usec" in r]
+            if lat:
+                entry["t_avg_usec"] = round(mean(lat), 3)
+        for prio, c in counters.items():
+            if prio in report or any(c.values()):
+                report.setdefault(prio, {"priority": prio, "streams": 0}).update(c)
+        self.priority_counters = {"elapsed_s": round(elapsed, 3), "out_of_sequence": diff.get("out_of_sequence"),
+                                  "priorities": [report[p] for p in sorted(report)]}
+        if self.result_log:
+            self.result_log.event("priority_counters", **self.priority_counters)
+
+    def start_hugepage_sampler(self):
+        if self.use_hugepages:
+            from hugepages import HugepageSampler
+            self._hugepage_sampler = HugepageSampler()
+            self._hugepage_sampler.start()
+
+    def finish_hugepage_sampler(self):
+        """Per-node hugepage consumption over the run (free pages before, lowest, after)."""
+        if self._hugepage_sampler is None:
+            return
+        self.hugepage_usage = self._hugepage_sampler.stop()
+        self._hugepage_sampler = None
+        if self.result_log:
+            self.result_log.event("hugepages", **self.hugepage_usage)
+
+    def print_hugepage_summary(self):
+        usage = self.hugepage_usage
+        if not usage:
+            return
+        print(f"\n[Summary] Hugepages ({usage['page_kb']} kB), peak in use {usage['peak_used_pages']} pages "
+              f"({usage['peak_used_bytes'] / 2**20:.0f} MiB):")
+        for n in usage["nodes"]:
+            print(f"- node {n['node']}: {n['peak_used_pages']} used at peak, free {n['free_before']} -> "
+                  f"min {n['free_min']} -> {n['free_after']} of {n['nr_pages']}")
+        if usage["nodes"] and not usage["peak_used_pages"]:
+            print("- No hugepages were consumed; perftest fell back to regular pages (check hugetlbfs and shmmax)")
+
+    def print_priority_summary(self):
+        if not self.priority_counters:
+            return
+        print("\n[Summary] Per-priority traffic:")
+        print(f"{'Prio':>4} {'DSCP':>4} {'Streams':>7} {'BW Gbps':>9} {'TX wire':>9} {'RX wire':>9} "
+              f"{'TX pause':>9} {'RX pause':>9}")
+        for p in self.priority_counters["priorities"]:
+            dscp = p.get("dscp")
+            print(f"{p['priority']:>4} {dscp if dscp is not None else '-':>4} {p['streams']:>7} "
+                  f"{p.get('bw_gbps', 0.0):>9.2f} {p.get('tx_gbps', 0.0):>9.2f} {p.get('rx_gbps', 0.0):>9.2f} "
+                  f"{p.get('tx_pause', 0):>9} {p.get('rx_pause', 0):>9}")
+        ours = {q["priority"] for q in self.priorities}
+        leaked = [p["priority"] for p in self.priority_counters["priorities"]
+                  if p["priority"] not in ours and (p.get("tx_gbps") or p.get("rx_gbps"))]
+        if leaked:
+            print(f"- Traffic seen on priorities {leaked} that no stream was assigned to (check DSCP trust/mapping)")
+        oos = self.priority_counters["out_of_sequence"]
+        if oos is not None:
+            print(f"- out_of_sequence: {oos}" + (" (packets were dropped; not lossless)" if oos else " (lossless)"))
+
     def auto_detect_rdma_device(self):
         base_path = "/sys/class/infiniband"
         for dev in os.listdir(base_path):
@@ -84,18 +446,44 @@ class RDMAPerf:
         raise RuntimeError("No RDMA device found.")
 
     def get_cpu_cores(self):
+        """CPUs this process may run on (honours cgroup/taskset limits, unlike nproc's count)."""
         try:
-            output = subprocess.check_output("nproc", shell=True).decode()
-            return list(range(int(output.strip())))
-        except:
-            return list(range(64))
+            return sorted(os.sched_getaffinity(0))
+        except (AttributeError, OSError):
+            return list(range(os.cpu_count() or 64))
 
     def check_binary_supports(self, flag, binary):
-        try:
-            out = subprocess.check_output([binary, "--help"], stderr=subprocess.STDOUT, text=True)
-            return flag in out
-        except:
-            return False
+        return perftest_caps.supports(self.perftest_caps, binary, flag)
+
+    def requested_flags(self):
+        """(option, flags, required, fallback) for every optional perftest flag this run would pass.
+        Required ones would mislabel (priorities) or leave unpaced (load sweep) the results without them."""
+        requested = []
+        if self.gid_index is not None:
+            requested.append(("--gid-index", ["-x"], False, "perftest picks its default GID"))
+        if self.priorities:
+            requested.append(("--priorities", ["--tclass", "--sl"], True, None))
+        if self.latency == "bw" and self.rate_limit_gbps:
+            requested.append(("--load-sweep pacing", ["--rate_limit", "--rate_units", "--rate_limit_type"], True, None))
+        if self.latency != "bw" and self.iterations:
+            requested.append(("--iterations", ["-n"], False, "perftest runs its default iteration count"))
+        return requested
+
+    def check_perftest_flags(self, binary):
+        """Before launching: warn (once) about flags ``binary`` lacks that can be dropped, raise if a
+        required one is missing. A binary that is not installed is left to fail at launch."""
+        if not self.perftest_caps.get(binary):
+            return
+        for option, flags, required, fallback in self.requested_flags():
+            missing = [f for f in flags if not self.check_binary_supports(f, binary)]
+            if not missing:
+                continue
+            if required:
+                raise RuntimeError(f"unsupported_option: {binary} has no {', '.join(missing)} "
+                                   f"(needed for {option}); upgrade perftest")
+            if (binary, option) not in self._flag_warnings:
+                self._flag_warnings.add((binary, option))
+                print(f"[Perftest Caps] {binary} has no {', '.join(missing)}; ignoring {option}, {fallback}")
 
 
 
@@ -113,160 +501,571 @@ class RDMAPerf:
                 mpps = float(parts[4])
                 self.port_bw_gbps.labels(port=str(port)).set(bw_gbps)
                 self.port_msg_rate_mpps.labels(port=str(port)).set(mpps)
-                self.results[port] = {
-                    "thread_id": port,
+                self.results.setdefault(port, {"thread_id": port, **self.stream_qos(port)}).update({
                     "bw_avg_gbps": bw_gbps,
                     "msg_rate_mpps": mpps
-                }
+                })
+                prio = self.results[port].get("priority")
+                if prio is not None:
+                    self.priority_bw_gbps.labels(priority=str(prio)).set(sum(
+                        r.get("bw_avg_gbps", 0.0) for r in self.results.values() if r.get("priority") == prio))
+                if self.result_log:
+                    self.result_log.sample(port, bw_gbps=bw_gbps, msg_rate_mpps=mpps)
                 print(f"[Metrics] Port {port} BW: {bw_gbps} Gbps, MsgRate: {mpps} Mpps")
             except Exception as e:
                 print(f"[WARN] Failed to parse line: {line} - {e}")
 
-    def launch_persistent_server_thread(self, core, port, binary):
-        args = self.build_common_args(binary)
+    def monitor_lat_output(self, port, stream):
+        """Record every lat summary row on a persistent port; one row per client connection."""
+        for line in stream:
+            row = parse_lat_row(line)
+            if not row:
+                continue
+            entry = self.results.setdefault(port, {"thread_id": port, "connections_served": 0,
+                                                   "lat_histogram": new_lat_histogram(), **self.stream_qos(port)})
+            entry.update(row)
+            entry["connections_served"] += 1
+            observe_lat_histogram(entry["lat_histogram"], row["t_avg_usec"])
+            if self.result_log:
+                self.result_log.result(port, connection=entry["connections_served"], **row)
+            self.port_lat_avg_usec.labels(port=str(port)).set(row["t_avg_usec"])
+            self.port_lat_p99_usec.labels(port=str(port)).set(row["t_99_percentile_usec"])
+            self.port_lat_hist.labels(port=str(port)).observe(row["t_avg_usec"])
+            print(f"[Metrics] Port {port} connection #{entry['connections_served']}: "
+                  f"avg {row['t_avg_usec']:.2f} usec, p99 {row['t_99_percentile_usec']:.2f} usec")
+
+    def build_server_cmd(self, core, port, binary):
+        args = self.build_common_args(binary, self.stream_qos(port))
+        if self.latency != "bw":
+            return [
+                "taskset", "-c", str(core),
+                binary, "-d", self.device, "-F", "-s", str(self.size),
+                "--port", str(port), *args.split()
+            ]
         cmd = [
             "taskset", "-c", str(core),
             binary, "-d", self.device, "-i", "1", "-F",
             "-s", str(self.size), "-q", str(self.qdepth),
             "--port", str(port), *args.split()
         ]
+        if self.infinite_run:
+            if self.check_binary_supports("--run_infinitely", binary):
+                cmd.append("--run_infinitely")
+            else:
+                print(f"[Persistent Thread] {binary} has no --run_infinitely; falling back to immediate respawn")
+        return cmd
+
+    def record_respawn(self, port, reason, exit_code=None):
+        log = self.server_thread_log.setdefault(port, {"respawns": {}, "last_exit_code": None})
+        log["respawns"][reason] = log["respawns"].get(reason, 0) + 1
+        if exit_code is not None:
+            log["last_exit_code"] = exit_code
+        self.port_respawns.labels(port=str(port), reason=reason).inc()
+        if self.result_log:
+            self.result_log.event("respawn", port=port, respawn_reason=reason, exit_code=exit_code)
+
+    def launch_persistent_server_thread(self, core, port, binary):
+        cmd = self.build_server_cmd(core, port, binary)
+        monitor = self.monitor_lat_output if self.latency != "bw" else self.monitor_bw_output
 
         def loop_runner():
-            while True:
-                proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-                self.monitor_bw_output(port, proc.stdout)
-                proc.wait()
-                time.sleep(1)
+            reason, exit_code, crashes = "launch", None, 0
+            while not self.monitor_stop.is_set():
+                self.record_respawn(port, reason, exit_code)
+                started = time.monotonic()
+                proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                        start_new_session=True)
+                self.procs[port] = proc
+                monitor(port, proc.stdout)
+                exit_code = proc.wait()
+                uptime = time.monotonic() - started
+                if self.monitor_stop.is_set():
+                    break
+
+                if exit_code != 0 and uptime < CRASH_UPTIME_SEC:
+                    crashes += 1
+                    reason = "crash_loop" if crashes > 1 else "crash"
+                    delay = min(RESPAWN_BACKOFF_BASE_SEC * 2 ** (crashes - 1), RESPAWN_BACKOFF_MAX_SEC)
+                    print(f"[Persistent Thread] Port {port} exited with {exit_code} after {uptime:.1f}s, "
+                          f"respawning in {delay:.2f}s ({reason})")
+                    self.monitor_stop.wait(delay)
+                else:
+                    crashes = 0
+                    reason = "client_done" if exit_code == 0 else "error_exit"
 
-        print(f"[Persistent Thread] Starting monitor thread for port {port}")
+        print(f"[Persistent Thread] Starting monitor thread for port {port}: {' '.join(cmd)}")
         t = threading.Thread(target=loop_runner, daemon=True)
         t.start()
 
         self.port_binary.labels(port=str(port), binary=binary).set(1)
         self.port_core.labels(port=str(port), core=str(core)).set(1)
-        self.port_respawns.labels(port=str(port)).inc()
+        qos = self.stream_qos(port)
+        if qos:
+            self.port_priority.labels(port=str(port), priority=str(qos["priority"])).set(1)
 
-    def build_common_args(self, binary=None):
+    def build_common_args(self, binary=None, qos=None):
+        # Each optional flag is passed only if the binary lists it; check_perftest_flags() has already
+        # warned about, or refused, the ones it lacks
         args = []
+        if self.gid_index is not None and self.check_binary_supports("-x", binary):
+            args.append(f"-x {self.gid_index}")
+        if qos and self.check_binary_supports("--tclass", binary) and self.check_binary_supports("--sl", binary):
+            # Traffic class for RoCE v2 (DSCP trust), service level for IB / PCP trust
+            args.append(f"--tclass={qos['tclass']}")
+            args.append(f"--sl={qos['priority']}")
         if self.latency == "bw":
             args.append("--report_gbits")
-        if self.report_per_second and binary == "ib_write_bw" and self.supports_report_per_second:
+        if (self.latency == "bw" and self.report_per_second
+                and self.check_binary_supports("--report_per_second", binary)):
             args.append("--report_per_second")
+        if (self.latency == "bw" and self.rate_limit_gbps
+                and all(self.check_binary_supports(f, binary)
+                        for f in ("--rate_limit", "--rate_units", "--rate_limit_type"))):
+            # Client-side pacing; used by the load sweep to set offered load per stream
+            args.append(f"--rate_limit={self.rate_limit_gbps:.3f}")
+            args.append("--rate_units=g")
+            args.append(f"--rate_limit_type={self.rate_limit_type}")
+        if self.latency != "bw" and self.iterations and self.check_binary_supports("-n", binary):
+            args.append(f"-n {self.iterations}")
+        if self.use_hugepages and self.check_binary_supports("--use_hugepages", binary):
+            args.append("--use_hugepages")
         return " ".join(args)
 
+    def handle_client_line(self, thread_id, line, state):
+        """Parse one line of client perftest output as it is produced."""
+        line = line.strip()
+        if not line:
+            return
+        try:
+            if "QPN" in line and "RKey" in line:
+                match_qpn = re.search(r"QPN\s+(0x[0-9a-fA-F]+)", line)
+                match_rkey = re.search(r"RKey\s+(0x[0-9a-fA-F]+)", line)
+                match_vaddr = re.search(r"VAddr\s+(0x[0-9a-fA-F]+)", line)
+                if match_qpn and match_rkey and match_vaddr:
+                    self.results[thread_id].setdefault("connections", []).append({
+                        "qpn": match_qpn.group(1),
+                        "rkey": match_rkey.group(1),
+                        "vaddr": match_vaddr.group(1)
+                    })
+
+            elif line.startswith("GID:"):
+                gid = line.split("GID:")[1].strip()
+                self.results[thread_id]["gid"] = gid
+
+            elif line.startswith("-") and len(set(line)) == 1:
+                state["header_seen"] = True
+
+            elif self.latency != "bw" and state["header_seen"] and parse_lat_row(line):
+                row = parse_lat_row(line)
+                self.results[thread_id].update(row)
+                print(f"[Thread {thread_id}] Avg Latency = {row['t_avg_usec']:.2f} usec")
+
+            elif self.latency == "bw" and len(line.split()) >= 5 and line.split()[0].isdigit():
+                parts = line.split()
+                bw_gbps = float(parts[3])
+                mpps = float(parts[4])
+                # With --report_per_second every row but the last is a one-second sample; the last
+                # row is perftest's run summary, so samples are committed one row behind.
+                if state["pending"] is not None:
+                    self.add_bw_sample(thread_id, state, *state["pending"])
+                state["pending"] = (time.time(), bw_gbps, mpps)
+                self.results[thread_id].update({
+                    "bw_avg_gbps": bw_gbps,
+                    "msg_rate_mpps": mpps
+                })
+                print(f"[Thread {thread_id}] BW = {bw_gbps:.2f} Gbps, MsgRate = {mpps:.3f} Mpps")
+
+        except Exception as e:
+            print(f"[WARN] Parsing error on thread {thread_id}: {e}")
+
+    def run_client_attempt(self, thread_id, cmd):
+        """Run one perftest client process; stderr is classified live on its own reader thread."""
+        state = {"header_seen": False, "pending": None, "detector": SteadyStateDetector(), "error": None,
+                 "stderr": [], "timed_out": None}
+        # Own process group so the whole taskset/perftest chain can be signalled
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                    start_new_session=True)
+        except OSError as e:
+            state["stderr"].append(f"{cmd[0]}: {e.strerror}")
+            return 127, state
+        self.procs[thread_id] = proc
+        activity = {"proc": proc, "started": time.monotonic(), "last_output": None, "samples": False,
+                    "per_second": self.latency == "bw" and "--report_per_second" in cmd}
+        self.stream_activity[thread_id] = activity
+
+        def read_stderr():
+            for line in proc.stderr:
+                state["stderr"].append(line.rstrip())
+                self.check_stream_error(thread_id, proc, state, line)
+
+        err_reader = threading.Thread(target=read_stderr, daemon=True)
+        err_reader.start()
+        for line in proc.stdout:
+            activity["last_output"] = time.monotonic()
+            self.check_stream_error(thread_id, proc, state, line)
+            self.handle_client_line(thread_id, line, state)
+            activity["samples"] = activity["samples"] or state["pending"] is not None
+        proc.wait()
+        err_reader.join()
+        state["timed_out"] = activity.get("timed_out")
+        return proc.returncode, state
+
+    def check_stream_error(self, thread_id, proc, state, line):
+        """Fail fast: on the first known perftest failure line, mark the stream and kill its process group."""
+        if state["error"] is not None:
+            return
+        error = classify_error(line)
+        if not error:
+            return
+        state["error"] = error
+        print(f"[ERROR] Thread {thread_id} {error['category']}: {error['message']}")
+        threading.Thread(target=escalate, args=([proc],), kwargs={"signals": (signal.SIGTERM, signal.SIGKILL)},
+                         daemon=True).start()
+
+    def run_client_stream(self, thread_id, cmd, qos):
+        """Run one client stream to completion, applying the error policy (continue / retry / abort)."""
+        base = {"thread_id": thread_id, "gid_index": self.gid_index, **qos}
+        self.results.setdefault(thread_id, dict(base))
+        attempt = 0
+        while True:
+            attempt += 1
+            exit_code, state = self.run_client_attempt(thread_id, cmd)
+            if state["timed_out"]:
+                self.results[thread_id].update({"attempts": attempt, "timeout_reason": state["timed_out"]})
+                self.finalize_stopped_stream(thread_id, state, status="timed_out",
+                                             reason=f"timeout:{state['timed_out']}")
+                if self.result_log:
+                    self.result_log.event("stream_timeout", thread_id=thread_id, timeout_reason=state["timed_out"],
+                                          exit_code=exit_code, samples=len(self.results[thread_id].get("samples", [])))
+                return
+            error = state["error"]
+            if error is None and exit_code != 0 and not self.stop_reason:
+                error = {"category": "exit_code", "retryable": False,
+                         "message": state["stderr"][-1] if state["stderr"] else f"exit code {exit_code}"}
+            if error is None:
+                self.results[thread_id]["attempts"] = attempt
+                if exit_code != 0:
+                    self.finalize_stopped_stream(thread_id, state)
+                else:
+                    self.finalize_client_stream(thread_id, state)
+                return
+
+            record = {**error, "attempt": attempt, "exit_code": exit_code, "ts": round(time.time(), 3)}
+            self.results[thread_id].setdefault("errors", []).append(record)
+            if state["stderr"]:
+                print(f"[STDERR] {' | '.join(state['stderr'][-5:])}")
+            if self.result_log:
+                self.result_log.event("stream_failed", thread_id=thread_id, category=error["category"],
+                                      message=error["message"], attempt=attempt, exit_code=exit_code,
+                                      stderr="\n".join(state["stderr"]))
+
+            action = self.error_policy.action_for(error, attempt)
+            if action == "retry" and not self.stop_reason:
+                delay = self.error_policy.delay(attempt)
+                print(f"[Retry] Thread {thread_id} attempt {attempt} failed ({error['category']}); "
+                      f"retrying in {delay:.1f}s")
+                if not self.streams_stopped.wait(delay):
+                    self.results[thread_id] = {**base, "errors": self.results[thread_id]["errors"]}
+                    continue
+
+            self.results[thread_id].update({"status": "failed", "error_category": error["category"],
+                                            "error_message": error["message"], "attempts": attempt})
+            self.log_stream_result(thread_id)
+            if action == "abort" and not self.stop_reason:
+                print(f"[Abort] Thread {thread_id} failed with {error['category']}; stopping the run")
+                self.stop_streams(f"aborted:{error['category']}")
+            return
+
+    def add_bw_sample(self, thread_id, state, ts, bw_gbps, mpps):
+        self.results[thread_id].setdefault("samples", []).append(
+            {"ts": round(ts, 3), "bw_gbps": bw_gbps, "msg_rate_mpps": mpps})
+        state["detector"].add(bw_gbps)
+        if self.result_log:
+            self.result_log.sample(thread_id, ts=round(ts, 3), bw_gbps=bw_gbps, msg_rate_mpps=mpps)
+
+    def finalize_client_stream(self, thread_id, state):
+        """Attach steady-state statistics once a bw stream has finished."""
+        detector = state["detector"]
+        if self.latency == "bw" and detector.samples:
+            self.results[thread_id].update(detector.summary())
+        self.results[thread_id].setdefault("status", "ok")
+        self.log_stream_result(thread_id)
+
+    def finalize_stopped_stream(self, thread_id, state, status="stopped", reason=None):
+        """Summarize a stream we interrupted: perftest printed no summary row, so use the samples."""
+        if state["pending"] is not None:
+            self.add_bw_sample(thread_id, state, *state["pending"])
+            state["pending"] = None
+        samples = self.results[thread_id].get("samples", [])
+        if samples:
+            self.results[thread_id].update({
+                "bw_avg_gbps": round(mean([s["bw_gbps"] for s in samples]), 3),
+                "msg_rate_mpps": round(mean([s["msg_rate_mpps"] for s in samples]), 6),
+            })
+        self.results[thread_id]["stopped_early"] = reason or self.stop_reason
+        self.results[thread_id]["status"] = status
+        self.finalize_client_stream(thread_id, state)
+
+    def stop_streams(self, reason, grace=3.0):
+        """Interrupt every running stream: SIGINT, then SIGTERM and SIGKILL ``grace`` seconds apart."""
+        self.stop_reason = reason
+        self.streams_stopped.set()
+        escalate(list(self.procs.values()), grace=grace)
+
+    def print_bw_summary(self):
+        rows = [r for r in self.results.values() if "bw_avg_gbps" in r]
+        if not rows:
+            return
+        total = sum(r["bw_avg_gbps"] for r in rows)
+        print("\n[Summary] Client Bandwidth:")
+        print(f"- Reported total: {total:.2f} Gbps across {len(rows)} streams")
+        steady = [r for r in rows if "bw_ss_mean_gbps" in r]
+        if steady:
+            print(f"- Raw per-second total: {sum(r['bw_raw_avg_gbps'] for r in steady):.2f} Gbps")
+            print(f"- Steady-state total: {sum(r['bw_ss_mean_gbps'] for r in steady):.2f} Gbps")
+            for r in steady:
+                print(f"  [Thread {r['thread_id']}] steady {r['bw_ss_mean_gbps']:.2f} Gbps "
+                      f"(p5 {r['bw_ss_p5_gbps']:.2f} / p50 {r['bw_ss_p50_gbps']:.2f} / p95 {r['bw_ss_p95_gbps']:.2f}), "
+                      f"trimmed {r['ss_warmup_samples']}s warm-up, {r['ss_cooldown_samples']}s cool-down")
+        if self.adaptive_outcome:
+            o = self.adaptive_outcome
+            if o["reason"] == "ci_target":
+                print(f"- Adaptive stop after {o['elapsed_s']}s: aggregate {o['agg_mean_gbps']:.2f} Gbps "
+                      f"+/- {o['ci_rel'] * 100:.2f}% ({o['confidence'] * 100:.0f}% CI)")
+            else:
+                print(f"- Adaptive: CI target {o['ci_target'] * 100:.2f}% not reached before the "
+                      f"{self.duration}s ceiling")
+
+    def finish_link_model(self):
+        """Wire/PCIe ceiling for this message size and each stream's percent of its share of it."""
+        link = link_model.device_link(self.device)
+        ipv6 = ":" in ((self.gid_resolution or {}).get("ip") or "")
+        model = link_model.link_ceilings(self.size, link["speed_gbps"] or self.link_speed, link["mtu"] or 1500,
+                                         link["pcie"], self.test_type, ipv6=ipv6)
+        if "achievable_gbps" not in model:
+            return
+        efficiency = link_model.annotate_streams(list(self.results.values()), model["achievable_gbps"],
+                                                 stream_cap_gbps=self.rate_limit_gbps)
+        if efficiency is None:
+            return
+        efficiency["model"] = model
+        efficiency["link_speed_source"] = "sysfs" if link["speed_gbps"] else "--link-speed"
+        self.link_efficiency = efficiency
+        if self.result_log:
+            self.result_log.event("link_model", **efficiency)
+
+    def print_link_summary(self):
+        e = self.link_efficiency
+        if not e:
+            return
+        m = e["model"]
+        print(f"\n[Summary] Link model ({self.size} B messages):")
+        if "wire_gbps" in m:
+            source = "" if e["link_speed_source"] == "sysfs" else ", speed from --link-speed"
+            print(f"- Wire: {m['wire_gbps']:.2f} Gbps of {m['link_gbps']:g} ({m['wire_efficiency'] * 100:.1f}%; "
+                  f"IB MTU {m['roce_mtu']}, {m['packets_per_message']} packets/message{source})")
+        if "pcie_gbps" in m:
+            print(f"- PCIe Gen{m['pcie_gen'] or '?'} x{m['pcie_width']}: {m['pcie_gbps']:.2f} Gbps "
+                  f"({m['pcie_efficiency'] * 100:.1f}% at MPS {m['pcie_mps']})")
+        if "pcie_degraded" in m:
+            print(f"- PCIe link trained below its capability: {m['pcie_degraded']}")
+        print(f"- Achieved {e['total_gbps']:.2f} of {e['achievable_gbps']:.2f} Gbps achievable "
+              f"({e['pct_of_achievable']:.1f}%, {m['limit']}-bound)")
+        if e["slow_streams"]:
+            print(f"- Below {e['slow_ratio'] * 100:.0f}% of their {e['stream_share_gbps']:.2f} Gbps share: "
+                  f"threads {e['slow_streams']}")
+
+    def diagnosis_metrics(self):
+        """Everything the bottleneck classifier looks at, in the form recorded for replay."""
+        from hugepages import cpu_nodes, device_numa_node
+        nodes = cpu_nodes()
+        streams = []
+        for thread_id, r in self.results.items():
+            if "bw_avg_gbps" not in r or r.get("status") == "failed":
+                continue
+            core = self.stream_cores.get(thread_id)
+            r.update({"core": core, "numa_node": nodes.get(core),
+                      "cpu_util": self.stream_cpu.get(thread_id, {}).get("cpu_util")})
+            streams.append({"thread_id": thread_id, "bw_gbps": r.get("bw_ss_mean_gbps", r["bw_avg_gbps"]),
+                            "msg_rate_mpps": r.get("msg_rate_mpps"), **{k: r[k] for k in PLACEMENT_FIELDS},
+                            **{k: r[k] for k in LINK_FIELDS if k in r}})
+        return {"device": self.device, "test_type": self.test_type, "size": self.size, "threads": self.threads,
+                "qdepth": self.qdepth, "duration": self.duration, "rate_limit_gbps": self.rate_limit_gbps,
+                "nic_numa_node": device_numa_node(self.device), "streams": streams,
+                "link": self.link_efficiency, "congestion": self.run_counters}
+
+    def diagnose(self):
+        """Classify what limited this bw run; the metrics are kept so the call can be replayed."""
+        import bottleneck
+        metrics = self.diagnosis_metrics()
+        if not metrics["streams"]:
+            return
+        self.diagnosis = {**bottleneck.classify(metrics), "metrics": metrics}
+        if self.result_log:
+            self.result_log.event("diagnosis", **self.diagnosis)
+
+    def print_diagnosis(self):
+        if self.diagnosis:
+            import bottleneck
+            bottleneck.print_diagnosis(self.diagnosis)
+
+    def print_failures(self):
+        failed = [r for r in self.results.values() if r.get("status") == "failed"]
+        retried = [r for r in self.results.values() if r.get("errors") and r.get("status") != "failed"]
+        if failed:
+            print(f"\n[Summary] {len(failed)} of {len(self.results)} streams failed:")
+            for r in failed:
+                print(f"  [Thread {r['thread_id']}] {r['error_category']} after {r['attempts']} attempt(s): "
+                      f"{r['error_message']}")
+        for r in retried:
+            print(f"- Thread {r['thread_id']} recovered after {len(r['errors'])} failed attempt(s)")
+        timed_out = [r for r in self.results.values() if r.get("status") == "timed_out"]
+        if timed_out:
+            print(f"\n[Summary] {len(timed_out)} of {len(self.results)} streams timed out:")
+            for r in timed_out:
+                print(f"  [Thread {r['thread_id']}] {r['timeout_reason']}; kept {len(r.get('samples', []))} samples"
+                      + (f", avg {r['bw_avg_gbps']:.2f} Gbps" if "bw_avg_gbps" in r else ""))
+        if self.stop_reason and self.stop_reason.startswith("aborted:"):
+            print(f"- Run aborted ({self.stop_reason.split(':', 1)[1]})")
+
     def is_port_in_use(self, port):
         """Check if TCP port is occupied on localhost."""
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             return s.connect_ex(('localhost', port)) == 0
-    def run(self):
+    def perftest_binary(self):
         if self.latency != "bw":
-            binary = {
+            return {
                 "write": "ib_write_lat",
                 "read": "ib_read_lat",
                 "send": "ib_send_lat"
             }.get(self.test_type, "ib_write_lat")
-        else:
-            binary = {
-                "write": "ib_write_bw",
-                "read": "ib_read_bw",
-                "send": "ib_send_bw"
-            }.get(self.test_type, "ib_write_bw")
+        return {
+            "write": "ib_write_bw",
+            "read": "ib_read_bw",
+            "send": "ib_send_bw"
+        }.get(self.test_type, "ib_write_bw")
+
+    def start_persistent_server(self):
+        """Launch every persistent listener and return; stop them with stop_persistent_server()."""
+        binary = self.perftest_binary()
+        self.check_perftest_flags(binary)
+        self.run_started = time.time()
+        self.monitor_stop.clear()
+        self.open_result_log("server", f"{self.base_port}_{self.threads}")
+        self.start_port_counters()
+        self.start_hugepage_sampler()
+        for i in range(self.threads):
+            port = self.base_port + i
+            core = self.cpu_cores[i % len(self.cpu_cores)]
+            self.launch_persistent_server_thread(core, port, binary)
+
+    def stop_persistent_server(self, grace=3.0):
+        self.monitor_stop.set()
+        self.stop_streams("server_stop", grace=grace)
+        self.finish_port_counters()
+        self.finish_hugepage_sampler()
+        self.print_priority_summary()
+        self.print_hugepage_summary()
+        self.log_results("server", f"{self.base_port}_{self.threads}")
+
+    def run(self):
+        binary = self.perftest_binary()
+        self.check_perftest_flags(binary)
+        # Wall-clock start of the run for the result DB; store_results runs after the streams finish
+        self.run_started = time.time()
 
         if self.role == "client":
+            self.open_result_log("client", self.client_id)
+            self.start_port_counters()
+            self.start_hugepage_sampler()
+            sampler = None
+            if self.timeline:
+                from timeline import TimelineSampler
+                sampler = TimelineSampler(self, interval=self.timeline_interval)
+                sampler.start()
             threads = []
-            for i in range(self.threads):
+            for i in (self.launch_order or range(self.threads)):
                 port = self.base_port + (self.client_id * self.threads) + i
                 core = self.cpu_cores[i % len(self.cpu_cores)]
-                args = self.build_common_args(binary)
+                qos = self.stream_qos(port)
+                args = self.build_common_args(binary, qos)
+                self.stream_cores[i] = core
 
+                # argv, never a shell string: server_ip and device can come from a remote agent request
                 if self.latency != "bw":
-                    cmd = (
-                        f"taskset -c {core} {binary} -d {self.device} -F -s {self.size} "
-                        f"{args} --port {port} {self.server_ip}"
-                    )
+                    cmd = [
+                        "taskset", "-c", str(core), binary, "-d", self.device, "-F", "-s", str(self.size),
+                        *args.split(), "--port", str(port), self.server_ip
+                    ]
                 else:
-                    cmd = (
-                        f"taskset -c {core} {binary} -d {self.device} -i 1 -F -s {self.size} "
-                        f"-q {self.qdepth} {args} --duration {self.duration} --port {port} {self.server_ip}"
-                    )
-
-                print(f"[Client {i}] Launching: {cmd}")
+                    cmd = [
+                        "taskset", "-c", str(core), binary, "-d", self.device, "-i", "1", "-F", "-s", str(self.size),
+                        "-q", str(self.qdepth), *args.split(), "--duration", str(self.duration), "--port", str(port),
+                        self.server_ip
+                    ]
 
-                def thread_runner(cmd=cmd, thread_id=i):
-                    proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                    stdout, stderr = proc.communicate()
+                print(f"[Client {i}] Launching: {' '.join(cmd)}")
 
-                    if proc.returncode != 0:
-                        print(f"[ERROR] Thread {thread_id} failed with return code {proc.returncode}")
-                        print(f"[STDERR] {stderr.strip()}")
-                        return
-
-                    header_seen = False
-                    for line in stdout.splitlines():
-                        line = line.strip()
-                        if not line:
-                            continue
-
-                        try:
-                            self.results.setdefault(thread_id, {"thread_id": thread_id})
-
-                            if "QPN" in line and "RKey" in line:
-                                match_qpn = re.search(r"QPN\s+(0x[0-9a-fA-F]+)", line)
-                                match_rkey = re.search(r"RKey\s+(0x[0-9a-fA-F]+)", line)
-                                match_vaddr = re.search(r"VAddr\s+(0x[0-9a-fA-F]+)", line)
-                                if match_qpn and match_rkey and match_vaddr:
-                                    self.results[thread_id].setdefault("connections", []).append({
-                                        "qpn": match_qpn.group(1),
-                                        "rkey": match_rkey.group(1),
-                                        "vaddr": match_vaddr.group(1)
-                                    })
-
-                            elif line.startswith("GID:"):
-                                gid = line.split("GID:")[1].strip()
-                                self.results[thread_id]["gid"] = gid
-
-                            elif line.startswith("-") and len(set(line)) == 1:
-                                header_seen = True
-                                continue
-
-                            elif self.latency != "bw" and header_seen and re.match(r"^\d+\s+\d+", line):
-                                parts = line.split()
-                                if len(parts) >= 9:
-                                    self.results[thread_id].update({
-                                        "payload_size": int(parts[0]),
-                                        "iterations": int(parts[1]),
-                                        "t_min_usec": float(parts[2]),
-                                        "t_max_usec": float(parts[3]),
-                                        "t_typical_usec": float(parts[4]),
-                                        "t_avg_usec": float(parts[5]),
-                                        "t_stdev_usec": float(parts[6]),
-                                        "t_99_percentile_usec": float(parts[7]),
-                                        "t_999_percentile_usec": float(parts[8]),
-                                    })
-                                    print(f"[Thread {thread_id}] Avg Latency = {parts[5]} usec")
-
-                            elif self.latency == "bw" and len(line.split()) >= 5 and line.split()[0].isdigit():
-                                parts = line.split()
-                                bw_gbps = float(parts[3])
-                                mpps = float(parts[4])
-                                self.results[thread_id].update({
-                                    "bw_avg_gbps": bw_gbps,
-                                    "msg_rate_mpps": mpps
-                                })
-                                print(f"[Thread {thread_id}] BW = {bw_gbps:.2f} Gbps, MsgRate = {mpps:.3f} Mpps")
-
-                        except Exception as e:
-                            print(f"[WARN] Parsing error on thread {thread_id}: {e}")
-                            continue
-
-                t = threading.Thread(target=thread_runner)
+                t = threading.Thread(target=self.run_client_stream, args=(i, cmd, qos))
                 t.start()
                 threads.append(t)
 
-            for t in threads:
-                t.join()
+            cpu_sampler = None
+            if self.latency == "bw":
+                from bottleneck import CpuSampler
+                cpu_sampler = CpuSampler(self)
+                cpu_sampler.start()
 
-            if self.latency != "bw":
+            watchdog = None
+            if self.watchdog:
+                watchdog = StreamWatchdog(self, setup_grace=self.setup_grace, stall_timeout=self.stall_timeout)
+                watchdog.start()
+
+            monitor = None
+            if self.adaptive and self.latency == "bw":
+                if not self.check_binary_supports("--report_per_second", binary):
+                    print(f"[Adaptive] {binary} has no per-second reporting; running to the {self.duration}s ceiling")
+                else:
+                    from adaptive_duration import AdaptiveDurationMonitor
+                    monitor = AdaptiveDurationMonitor(self, ci_target=self.ci_target, min_duration=self.min_duration)
+                    monitor.start()
+
+            try:
+                for t in threads:
+                    t.join()
+            except KeyboardInterrupt:
+                print("\n[!] Interrupted. Stopping streams and dumping logs...")
+                self.stop_streams("interrupted")
+                for t in threads:
+                    t.join()
+
+            if watchdog:
+                watchdog.stop()
+            if cpu_sampler:
+                self.stream_cpu = cpu_sampler.stop()
+            if monitor:
+                monitor.stop()
+                self.adaptive_outcome = monitor.outcome
+                if self.result_log:
+                    outcome = dict(monitor.outcome)
+                    self.result_log.event("adaptive_stop", stop_reason=outcome.pop("reason"), **outcome)
+
+            self.finish_port_counters()
+            self.finish_hugepage_sampler()
+            if sampler:
+                from timeline import analyze as analyze_timeline, print_analysis, write_timeline
+                columns = sampler.stop()
+                analysis = analyze_timeline(columns)
+                print_analysis(analysis)
+                write_timeline(columns, analysis, f"client_{self.client_id}")
+
+            if self.latency == "bw":
+                self.finish_link_model()
+                self.diagnose()
+                self.print_bw_summary()
+                self.print_link_summary()
+            else:
                 all_latencies = [r["t_avg_usec"] for r in self.results.values() if "t_avg_usec" in r]
                 if all_latencies:
                     avg_latency = sum(all_latencies) / len(all_latencies)
@@ -276,33 +1075,44 @@ class RDMAPerf:
                     print(f"- Avg across all threads: {avg_latency:.2f} usec")
                     print(f"- Best thread {best_thread}: {self.results[best_thread]['t_avg_usec']:.2f} usec")
                     print(f"- Worst thread {worst_thread}: {self.results[worst_thread]['t_avg_usec']:.2f} usec")
+            self.print_priority_summary()
+            self.print_hugepage_summary()
+            self.print_failures()
+            self.print_diagnosis()
 
             self.log_results("client", self.client_id)
 
         elif self.role == "server" and not self.persistent_server:
             print("[One-shot] Starting server...")
+            self.open_result_log("server", f"{self.base_port}_{self.threads}")
+            self.start_port_counters()
+            self.start_hugepage_sampler()
             threads = []
 
             for i in range(self.threads):
                 port = self.base_port + i
                 core = self.cpu_cores[i % len(self.cpu_cores)]
-                args = self.build_common_args(binary)
+                args = self.build_common_args(binary, self.stream_qos(port))
 
                 if self.latency != "bw":
-                    cmd = (
-                        f"taskset -c {core} {binary} -d {self.device} -F -s {self.size} "
-                        f"{args} --port {port}"
-                    )
+                    cmd = [
+                        "taskset", "-c", str(core), binary, "-d", self.device, "-F", "-s", str(self.size),
+                        *args.split(), "--port", str(port)
+                    ]
                 else:
-                    cmd = (
-                        f"taskset -c {core} {binary} -d {self.device} -i 1 -F -s {self.size} "
-                        f"-q {self.qdepth} {args} --port {port}"
-                    )
+                    cmd = [
+                        "taskset", "-c", str(core), binary, "-d", self.device, "-i", "1", "-F", "-s", str(self.size),
+                        "-q", str(self.qdepth), *args.split(), "--port", str(port)
+                    ]
 
-                print(f"[Server {i}] Launching: {cmd}")
+                print(f"[Server {i}] Launching: {' '.join(cmd)}")
 
                 def thread_runner(cmd=cmd, port=port):
-                    proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                    try:
+                        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                    except OSError as e:
+                        print(f"[Server ERROR] Port {port}: cannot start {cmd[0]}: {e.strerror}")
+                        return
                     if self.latency != "bw":
                         stdout, stderr = proc.communicate()
                         if proc.returncode != 0:
@@ -310,6 +1120,7 @@ class RDMAPerf:
                             print(stderr)
                         else:
                             print(f"[Server INFO] Port {port} latency test completed")
+                            self.monitor_lat_output(port, stdout.splitlines())
                     else:
                         self.monitor_bw_output(port, proc.stdout)
                         proc.wait()
@@ -325,6 +1136,10 @@ class RDMAPerf:
             except KeyboardInterrupt:
                 print("\n[!] Interrupted. Dumping logs...")
 
+            self.finish_port_counters()
+            self.finish_hugepage_sampler()
+            self.print_priority_summary()
+            self.print_hugepage_summary()
             self.log_results("server", f"{self.base_port}_{self.threads}")
 
         elif self.role == "server" and self.persistent_server:
@@ -335,18 +1150,17 @@ class RDMAPerf:
                         f"[Prometheus] Port {self.prometheus_port} already in use. Skipping Prometheus exporter start.")
                 else:
                     print(f"[Prometheus] Starting metrics server on port {self.prometheus_port}")
+                    from prometheus_exporter import start_prometheus_exporter
                     start_prometheus_exporter(self.prometheus_port, registry=self.registry)
 
-            for i in range(self.threads):
-                port = self.base_port + i
-                core = self.cpu_cores[i % len(self.cpu_cores)]
-                self.launch_persistent_server_thread(core, port, binary)
+            self.start_persistent_server()
 
             try:
                 threading.Event().wait()
             except KeyboardInterrupt:
-                print("\n[!] Interrupted. Dumping logs...")
-                self.log_results("server", f"{self.base_port}_{self.threads}")
+                print("\n[!] Interrupted. Stopping listeners and dumping logs...")
+                signal.signal(signal.SIGINT, signal.SIG_IGN)  # one clean shutdown; ignore repeats
+                self.stop_persistent_server()
 
     '''def log_results(self, role, id_val):
         if not self.log_csv and not self.log_json:
@@ -393,19 +1207,53 @@ class RDMAPerf:
                 json.dump(list(self.results.values()), f, indent=2)'''
 
     def log_results(self, role, id_val):
+        # Legacy CSV/JSON share the stream log's timestamp so importers can pair them
+        ts = self.run_ts or datetime.now().strftime("%Y%m%d_%H%M%S")
+        source = f"live:{role}_{id_val}_{ts}"
+        if self.result_log:
+            source = self.result_log.finalize()
+            self.result_log = None
+        elif self.log_json:
+            source = f"logs/{role}_{id_val}_{ts}.json"
+        self.store_results(source)
         if not self.log_csv and not self.log_json:
             return
 
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-
         bw_summary = []
+        if self.latency != "bw":
+            fieldnames = ["thread_id", *LAT_ROW_FIELDS, "connections_served", "gid_index", *QOS_FIELDS,
+                          *STATUS_FIELDS]
+        else:
+            fieldnames = ["thread_id", "bw_avg_gbps", "msg_rate_mpps", *BW_STEADY_FIELDS, *LINK_FIELDS,
+                          *PLACEMENT_FIELDS, "gid_index", *QOS_FIELDS, *STATUS_FIELDS]
+
+        # Persistent ports that never completed a run still report their respawn history
+        for port in self.server_thread_log:
+            self.results.setdefault(port, {"thread_id": port})
 
         for thread_id, data in self.results.items():
-            summary_entry = {
-                "thread_id": thread_id,
-                "bw_avg_gbps": data.get("bw_avg_gbps", 0.0),
-                "msg_rate_mpps": data.get("msg_rate_mpps", 0.0)
-            }
+            if self.latency != "bw":
+                summary_entry = {k: data.get(k) for k in fieldnames}
+                summary_entry["thread_id"] = thread_id
+                if "lat_histogram" in data:
+                    summary_entry["lat_histogram"] = data["lat_histogram"]
+            else:
+                failed = data.get("status") == "failed"
+                summary_entry = {
+                    "thread_id": thread_id,
+                    "bw_avg_gbps": data.get("bw_avg_gbps", None if failed else 0.0),
+                    "msg_rate_mpps": data.get("msg_rate_mpps", None if failed else 0.0)
+                }
+                summary_entry.update({k: data[k] for k in BW_STEADY_FIELDS + LINK_FIELDS + PLACEMENT_FIELDS
+                                      if k in data})
+                summary_entry.update({k: data[k] for k in QOS_FIELDS + STATUS_FIELDS if k in data})
+            if "errors" in data:
+                summary_entry["errors"] = data["errors"]
+            summary_entry["gid_index"] = self.gid_index
+            if self.gid_resolution:
+                summary_entry["gids_rejected"] = self.gid_resolution["rejected"]
+            if thread_id in self.server_thread_log:
+                summary_entry["respawns"] = self.server_thread_log[thread_id]["respawns"]
             bw_summary.append(summary_entry)
 
             # Dump QPN/RKey/VAddr separately if connections exist
@@ -419,12 +1267,23 @@ class RDMAPerf:
             json_file = f"logs/{role}_{id_val}_{ts}.json"
             with open(json_file, "w") as f:
                 json.dump(bw_summary, f, indent=2)
+            if self.priority_counters:
+                with open(f"logs/{role}_{id_val}_priorities_{ts}.json", "w") as f:
+                    json.dump(self.priority_counters, f, indent=2)
+            if self.link_efficiency:
+                with open(f"logs/{role}_{id_val}_link_model_{ts}.json", "w") as f:
+                    json.dump(self.link_efficiency, f, indent=2)
+            if self.diagnosis:
+                with open(f"logs/{role}_{id_val}_diagnosis_{ts}.json", "w") as f:
+                    json.dump(self.diagnosis, f, indent=2)
+            if self.hugepage_usage:
+                with open(f"logs/{role}_{id_val}_hugepages_{ts}.json", "w") as f:
+                    json.dump(self.hugepage_usage, f, indent=2)
 
         if self.log_csv:
             csv_file = f"logs/{role}_{id_val}_{ts}.csv"
-            fieldnames = ["thread_id", "bw_avg_gbps", "msg_rate_mpps"]
             with open(csv_file, "w", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
                 writer.writeheader()
                 for row in bw_summary:
                     writer.writerow(row)
@@ -0,0 +1,230 @@
+# rdma_stats.py
+import math
+import random
+from collections import deque
+
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+def stdev(values):
+    """Sample standard deviation (0.0 for fewer than two values)."""
+    if len(values) < 2:
+        return 0.0
+    m = mean(values)
+    return math.sqrt(sum((v - m) ** 2 for v in values) / (len(values) - 1))
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile, pct in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100.0
+    lo = int(math.floor(rank))
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (rank - lo)
+
+
+class SteadyStateDetector:
+    """Online warm-up detector over per-second bandwidth samples.
+
+    Samples are fed one at a time. Steady state starts at the first rolling window whose
+    coefficient of variation is below ``cv_threshold``; until then samples count as warm-up.
+    Cool-down (the tail of a run falling off as streams stop) is trimmed in ``summary()``,
+    once the whole series is known.
+    """
+
+    def __init__(self, window=5, cv_threshold=0.05, trim_tolerance=0.10):
+        self.window = window
+        self.cv_threshold = cv_threshold
+        self.trim_tolerance = trim_tolerance
+        self.samples = []
+        self.steady_start = None
+        self._win = deque(maxlen=window)
+        self._win_sum = 0.0
+        self._win_sq = 0.0
+
+    def add(self, value):
+        if len(self._win) == self.window:
+            old = self._win[0]
+            self._win_sum -= old
+            self._win_sq -= old * old
+        self._win.append(value)
+        self._win_sum += value
+        self._win_sq += value * value
+        self.samples.append(value)
+
+        if self.steady_start is None and len(self._win) == self.window:
+            m = self._win_sum / self.window
+            var = max(self._win_sq / self.window - m * m, 0.0)
+            if m > 0 and math.sqrt(var) / m <= self.cv_threshold:
+                self.steady_start = len(self.samples) - self.window
+        return self.is_steady()
+
+    def is_steady(self):
+        return self.steady_start is not None
+
+    def steady_window(self):
+        """Return (start, end) slice bounds of the steady-state region."""
+        if self.steady_start is None:
+            # Never settled: keep everything except the first (ramp-up) sample
+            start = 1 if len(self.samples) > 2 else 0
+        else:
+            start = self.steady_start
+        end = len(self.samples)
+        region = self.samples[start:end]
+        if region:
+            # Ramp edges inside the first steady window and the run-down tail are trimmed
+            # against the same floor below the steady median.
+            floor = percentile(region, 50) * (1.0 - self.trim_tolerance)
+            while end - start > 1 and self.samples[start] < floor:
+                start += 1
+            while end - start > 1 and self.samples[end - 1] < floor:
+                end -= 1
+        return start, end
+
+    def summary(self):
+        if not self.samples:
+            return {}
+        start, end = self.steady_window()
+        steady = self.samples[start:end]
+        return {
+            "bw_raw_avg_gbps": round(mean(self.samples), 3),
+            "bw_ss_mean_gbps": round(mean(steady), 3),
+            "bw_ss_p5_gbps": round(percentile(steady, 5), 3),
+            "bw_ss_p50_gbps": round(percentile(steady, 50), 3),
+            "bw_ss_p95_gbps": round(percentile(steady, 95), 3),
+            "ss_found": self.steady_start is not None,
+            "ss_warmup_samples": start,
+            "ss_cooldown_samples": len(self.samples) - end,
+        }
+
+
+def _betacf(a, b, x, max_iter=200, eps=3e-12):
+    """Continued fraction for the regularized incomplete beta function (Numerical Recipes)."""
+    qab, qap, qam = a + b, a + 1.0, a - 1.0
+    c, d = 1.0, 1.0 - qab * x / qap
+    d = 1.0 / (d if abs(d) > 1e-300 else 1e-300)
+    h = d
+    for m in range(1, max_iter + 1):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > 1e-300 else 1e-300)
+        c = 1.0 + aa / c if abs(1.0 + aa / c) > 1e-300 else 1e-300
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > 1e-300 else 1e-300)
+        c = 1.0 + aa / c if abs(1.0 + aa / c) > 1e-300 else 1e-300
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < eps:
+            break
+    return h
+
+
+def betainc(a, b, x):
+    """Regularized incomplete beta function I_x(a, b)."""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    ln_front = math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1.0 - x)
+    if x < (a + 1.0) / (a + b + 2.0):
+        return math.exp(ln_front) * _betacf(a, b, x) / a
+    return 1.0 - math.exp(ln_front) * _betacf(b, a, 1.0 - x) / b
+
+
+def student_t_cdf(t, df):
+    x = df / (df + t * t)
+    tail = 0.5 * betainc(df / 2.0, 0.5, x)
+    return 1.0 - tail if t >= 0 else tail
+
+
+def student_t_ppf(p, df):
+    """Inverse Student-t CDF by bisection; accurate enough for confidence intervals."""
+    lo, hi = -1000.0, 1000.0
+    for _ in range(200):
+        mid = (lo + hi) / 2.0
+        if student_t_cdf(mid, df) < p:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2.0
+
+
+def mean_ci(values, confidence=0.95):
+    """Return (mean, half_width) of the t-based confidence interval of the mean."""
+    n = len(values)
+    m = mean(values)
+    if n < 2:
+        return m, float("inf")
+    t = student_t_ppf(0.5 + confidence / 2.0, n - 1)
+    return m, t * stdev(values) / math.sqrt(n)
+
+
+def bootstrap_ci(values, stat=mean, confidence=0.95, n_boot=2000, seed=None):
+    """Percentile bootstrap confidence interval of ``stat``; returns (low, high)."""
+    if not values:
+        return 0.0, 0.0
+    if len(values) == 1:
+        return values[0], values[0]
+    rng = random.Random(seed)
+    n = len(values)
+    boots = [stat([values[rng.randrange(n)] for _ in range(n)]) for _ in range(n_boot)]
+    alpha = (1.0 - confidence) / 2.0 * 100
+    return percentile(boots, alpha), percentile(boots, 100 - alpha)
+
+
+def welch_t_test(a, b):
+    """Welch's unequal-variance t-test of mean(a) - mean(b); returns (t, df)."""
+    na, nb = len(a), len(b)
+    va, vb = stdev(a) ** 2 / na, stdev(b) ** 2 / nb
+    if va + vb == 0:
+        diff = mean(a) - mean(b)
+        return (0.0 if diff == 0 else math.copysign(float("inf"), diff)), float(na + nb - 2)
+    t = (mean(a) - mean(b)) / math.sqrt(va + vb)
+    df = (va + vb) ** 2 / ((va ** 2 / (na - 1) if na > 1 else 0) + (vb ** 2 / (nb - 1) if nb > 1 else 0) or 1e-300)
+    return t, df
+
+
+def new_value_t_test(value, baseline):
+    """t statistic of one new observation against a baseline sample (prediction interval); returns (t, df)."""
+    n = len(baseline)
+    s = stdev(baseline)
+    diff = value - mean(baseline)
+    if s == 0:
+        return (0.0 if diff == 0 else math.copysign(float("inf"), diff)), float(max(n - 1, 1))
+    return diff / (s * math.sqrt(1.0 + 1.0 / n)), float(n - 1)
+
+
+def one_sided_p(t, df, lower=True):
+    """P(T <= t) when ``lower`` (new mean is smaller), else P(T >= t)."""
+    if math.isinf(t):
+        return 0.0 if (t < 0) == lower else 1.0
+    cdf = student_t_cdf(t, df)
+    return cdf if lower else 1.0 - cdf
+
+
+def pearson(x, y):
+    """Pearson correlation of two equal-length series; None when either is constant or too short."""
+    if len(x) < 3 or len(x) != len(y):
+        return None
+    mx, my = mean(x), mean(y)
+    sxy = sum((a - mx) * (b - my) for a, b in zip(x, y))
+    sxx = sum((a - mx) ** 2 for a in x)
+    syy = sum((b - my) ** 2 for b in y)
+    if sxx == 0 or syy == 0:
+        return None
+    return sxy / (sxx * syy) ** 0.5
+
+
+def lagged_correlation(lead, follow, lag):
+    """Correlation of ``lead`` at time t with ``follow`` at t + lag, skipping None pairs."""
+    pairs = [(a, b) for a, b in zip(lead[:len(lead) - lag], follow[lag:]) if a is not None and b is not None]
+    return pearson([a for a, _ in pairs], [b for _, b in pairs])
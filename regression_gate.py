@@ -0,0 +1,199 @@
+# regression_gate.py
+import argparse
+import json
+import sys
+
+import result_db
+from rdma_stats import mean, welch_t_test, new_value_t_test, one_sided_p
+
+EXIT_PASS = 0
+EXIT_REGRESSION = 1
+EXIT_NO_BASELINE = 2
+
+MATCH_KEYS = ["test_type", "latency", "size", "qdepth", "threads"]
+
+
+def device_model(env, config):
+    """NIC model used to match baselines: HCA type from sysfs, else the device name."""
+    model = (env or {}).get("hca_type")
+    if model and model != "N/A":
+        return model
+    return (config or {}).get("device")
+
+
+def pick_metric(latency, streams, requested=None):
+    if requested:
+        return requested
+    if latency == "lat":
+        return "t_avg_usec"
+    if streams and all("bw_ss_mean_gbps" in s for s in streams):
+        return "bw_ss_mean_gbps"
+    return "bw_avg_gbps"
+
+
+def run_values(streams, metric):
+    return {str(s.get("thread_id")): float(s[metric]) for s in streams
+            if isinstance(s.get(metric), (int, float))}
+
+
+def aggregate(values, latency):
+    vals = list(values.values())
+    if not vals:
+        return None
+    return mean(vals) if latency == "lat" else sum(vals)
+
+
+def compare(new, base, threshold_pct, alpha, lower_is_worse):
+    """Compare new observations against a baseline sample; regression = worse by > threshold and significant."""
+    if not new or not base:
+        return None
+    new_mean, base_mean = mean(new), mean(base)
+    change_pct = (new_mean - base_mean) / base_mean * 100 if base_mean else 0.0
+    if len(new) >= 2 and len(base) >= 2:
+        t, df = welch_t_test(new, base)
+        test = "welch"
+    elif len(base) >= 2:
+        t, df = new_value_t_test(new_mean, base)
+        test = "prediction"
+    else:
+        t, df, test = None, None, "threshold-only"
+    p = one_sided_p(t, df, lower=lower_is_worse) if t is not None else None
+    worse = -change_pct if lower_is_worse else change_pct
+    # A single baseline run has no variance to test against: the threshold alone decides
+    significant = p < alpha if p is not None else None
+    return {
+        "new_mean": round(new_mean, 4), "baseline_mean": round(base_mean, 4),
+        "change_pct": round(change_pct, 2), "test": test,
+        "p_value": round(p, 5) if p is not None else None,
+        "n_new": len(new), "n_baseline": len(base),
+        "significant": significant,
+        "regression": worse > threshold_pct and significant is not False,
+    }
+
+
+def missing_match_keys(config, env):
+    """Match keys (and the device model) a run doesn't record; baselines can't be matched without them."""
+    missing = [key for key in MATCH_KEYS if config.get(key) is None]
+    if device_model(env, config) is None:
+        missing.append("device")
+    return missing
+
+
+def find_baseline_runs(conn, config, env, exclude_sources, limit):
+    missing = missing_match_keys(config, env)
+    if missing:
+        raise ValueError(f"cannot match baselines without {', '.join(missing)}")
+    clauses, params = [], []
+    for key in MATCH_KEYS:
+        # Runs imported before latency was always recorded are bandwidth runs
+        clauses.append("COALESCE(latency, 'bw') = ?" if key == "latency" else f"{key} = ?")
+        params.append(config[key])
+    where = " AND ".join(clauses)
+    rows = conn.execute(f"SELECT * FROM runs WHERE {where} ORDER BY started DESC", params)
+    model = device_model(env, config)
+    matched = []
+    for row in rows:
+        row = dict(row)
+        if row["source"] in exclude_sources:
+            continue
+        if device_model(json.loads(row["env_json"] or "{}"), json.loads(row["config_json"] or "{}")) != model:
+            continue
+        row["streams"] = result_db.load_streams(conn, row["id"])
+        matched.append(row)
+        if len(matched) >= limit:
+            break
+    return matched
+
+
+def run_gate(new_runs, baseline_runs, threshold_pct, alpha, metric=None):
+    config = new_runs[0]["config"]
+    latency = config.get("latency") or "bw"
+    metric = pick_metric(latency, new_runs[0]["streams"], metric)
+    lower_is_worse = latency != "lat"
+
+    new_per_run = [run_values(r["streams"], metric) for r in new_runs]
+    base_per_run = [run_values(r["streams"], metric) for r in baseline_runs]
+
+    report = {"metric": metric, "threshold_pct": threshold_pct, "alpha": alpha,
+              "baseline_sources": [r["source"] for r in baseline_runs], "streams": {}}
+    report["aggregate"] = compare(
+        [a for a in (aggregate(v, latency) for v in new_per_run) if a is not None],
+        [a for a in (aggregate(v, latency) for v in base_per_run) if a is not None],
+        threshold_pct, alpha, lower_is_worse)
+    for tid in sorted({t for v in new_per_run for t in v}, key=lambda x: (len(x), x)):
+        report["streams"][tid] = compare([v[tid] for v in new_per_run if tid in v],
+                                         [v[tid] for v in base_per_run if tid in v],
+                                         threshold_pct, alpha, lower_is_worse)
+    checks = [report["aggregate"], *report["streams"].values()]
+    report["regression"] = any(c and c["regression"] for c in checks)
+    return report
+
+
+def print_report(report):
+    print(f"[Regression Gate] metric {report['metric']}, threshold {report['threshold_pct']}%, "
+          f"alpha {report['alpha']}, {len(report['baseline_sources'])} baseline runs")
+    header = f"{'Scope':<12} {'New':>10} {'Baseline':>10} {'Change%':>8} {'p':>8} {'Test':<14} Verdict"
+    print(header)
+    print("-" * len(header))
+    rows = [("aggregate", report["aggregate"])] + [(f"thread {t}", c) for t, c in report["streams"].items()]
+    for scope, c in rows:
+        if not c:
+            print(f"{scope:<12} {'no baseline':>10}")
+            continue
+        p = f"{c['p_value']:.4f}" if c["p_value"] is not None else "N/A"
+        verdict = "REGRESSION" if c["regression"] else "ok"
+        print(f"{scope:<12} {c['new_mean']:>10.2f} {c['baseline_mean']:>10.2f} {c['change_pct']:>8.2f} "
+              f"{p:>8} {c['test']:<14} {verdict}")
+    if any(c and c["test"] == "threshold-only" for _, c in rows):
+        print("[Regression Gate] Single baseline run: verdicts use the threshold only (no significance test)")
+    print(f"[Regression Gate] {'FAIL' if report['regression'] else 'PASS'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare a run against stored baselines and fail on regressions")
+    parser.add_argument("results", nargs="+",
+                        help="New run result files (log_results CSV/JSON, stream-log summary or trials file)")
+    parser.add_argument("--db", default=result_db.DEFAULT_DB, help="Result warehouse holding the baselines")
+    parser.add_argument("--baseline", nargs="*", help="Explicit baseline result files instead of the warehouse")
+    parser.add_argument("--baseline-runs", type=int, default=10, help="Most recent matching runs to use")
+    parser.add_argument("--threshold", type=float, default=5.0, help="Regression threshold in percent")
+    parser.add_argument("--alpha", type=float, default=0.05, help="Significance level (one-sided)")
+    parser.add_argument("--metric", help="Per-stream field to compare (default: steady-state BW or t_avg_usec)")
+    # Legacy CSV/JSON logs carry no configuration; fill in what they can't tell us
+    for key, kind in (("device", str), ("test-type", str), ("latency", str), ("size", int),
+                      ("qdepth", int), ("threads", int)):
+        parser.add_argument(f"--{key}", type=kind, help=f"Override {key} of the new run for baseline matching")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    new_runs = [run for path in args.results for run in result_db.parse_result_file(path)]
+    if not new_runs:
+        print("[Regression Gate] No results found in the given files")
+        sys.exit(EXIT_NO_BASELINE)
+    overrides = {"device": args.device, "test_type": args.test_type, "latency": args.latency,
+                 "size": args.size, "qdepth": args.qdepth, "threads": args.threads}
+    for run in new_runs:
+        run["config"].update({k: v for k, v in overrides.items() if v is not None})
+        run["config"].setdefault("latency", "bw")
+
+    if args.baseline:
+        baseline_runs = [run for path in args.baseline for run in result_db.parse_result_file(path)]
+    else:
+        missing = missing_match_keys(new_runs[0]["config"], new_runs[0]["env"])
+        if missing:
+            print(f"[Regression Gate] Cannot match a baseline: the run does not record "
+                  f"{', '.join(missing)}; pass {' '.join('--' + k.replace('_', '-') for k in missing)}")
+            sys.exit(EXIT_NO_BASELINE)
+        conn = result_db.connect(args.db)
+        baseline_runs = find_baseline_runs(conn, new_runs[0]["config"], new_runs[0]["env"],
+                                           {r["source"] for r in new_runs}, args.baseline_runs)
+    if not baseline_runs:
+        print(f"[Regression Gate] No matching baseline for {new_runs[0]['config']}")
+        sys.exit(EXIT_NO_BASELINE)
+
+    report = run_gate(new_runs, baseline_runs, args.threshold, args.alpha, args.metric)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    sys.exit(EXIT_REGRESSION if report["regression"] else EXIT_PASS)
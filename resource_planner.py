@@ -0,0 +1,257 @@
+# resource_planner.py
+import argparse
+import os
+import resource
+import subprocess
+
+import hugepages as hp
+
+# perftest defaults the estimate is built on (perftest_resources.c)
+CYCLE_BUFFER = 4096
+TX_DEPTH = 128
+RX_DEPTH = 512
+WQE_BYTES = 128
+CQE_BYTES = 64
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+HUGEPAGE_SIZE = 2 * 1024 * 1024
+# Leave this share of MemAvailable to the rest of the host
+MEM_HEADROOM = 0.2
+DEVICE_CAPS = ["max_qp", "max_qp_wr", "max_cq", "max_cqe", "max_mr", "max_mr_size", "max_pd"]
+
+
+def _align(n, to):
+    return (n + to - 1) // to * to
+
+
+def fmt_bytes(n):
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if abs(n) < 1024 or unit == "TiB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024.0
+
+
+def read_meminfo(path="/proc/meminfo"):
+    """/proc/meminfo as bytes (HugePages_* stay page counts)."""
+    info = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                parts = rest.split()
+                if not parts:
+                    continue
+                value = int(parts[0])
+                info[name] = value * 1024 if len(parts) > 1 and parts[1] == "kB" else value
+    except OSError:
+        pass
+    return info
+
+
+def memlock_limit():
+    """Per-process RLIMIT_MEMLOCK soft limit in bytes (None = unlimited) and whether this user is exempt
+    (root has CAP_IPC_LOCK, which ibv_reg_mr honours)."""
+    soft, _ = resource.getrlimit(resource.RLIMIT_MEMLOCK)
+    return (None if soft == resource.RLIM_INFINITY else soft), os.geteuid() == 0
+
+
+def read_device_caps(rdma_dev):
+    """max_qp / max_cq / max_mr ... from ``ibv_devinfo -v``; empty when the tool or device is unavailable."""
+    try:
+        out = subprocess.check_output(["ibv_devinfo", "-v", "-d", rdma_dev], stderr=subprocess.DEVNULL, text=True)
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+    caps = {}
+    for line in out.splitlines():
+        name, sep, value = line.strip().partition(":")
+        if sep and name.strip() in DEVICE_CAPS and name.strip() not in caps:
+            try:
+                caps[name.strip()] = int(value.split()[0], 0)
+            except (ValueError, IndexError):
+                continue
+    return caps
+
+
+def stream_resources(size, qps, test_type="write", latency="bw", hugepages=False):
+    """Registered memory, queue memory and verbs objects one perftest process needs.
+
+    perftest registers 2 x max(size, CYCLE_BUFFER) per QP as a single MR (page aligned, or hugepage
+    aligned with --use_hugepages), one send CQ sized tx_depth x QPs, and for send tests a receive
+    queue and CQ of rx_depth per QP.
+    """
+    if latency != "bw":
+        qps, tx_depth = 1, 1
+    else:
+        tx_depth = TX_DEPTH
+    rx_depth = RX_DEPTH if test_type == "send" else 0
+    mr_bytes = _align(2 * max(size, CYCLE_BUFFER) * qps, HUGEPAGE_SIZE if hugepages else PAGE_SIZE)
+    cq_entries = tx_depth * qps + rx_depth * qps
+    queue_bytes = qps * (tx_depth + rx_depth) * WQE_BYTES + cq_entries * CQE_BYTES
+    return {"qps": qps, "cqs": 2 if rx_depth else 1, "mrs": 1, "qp_wr": max(tx_depth, rx_depth),
+            "cqe": max(tx_depth, rx_depth) * qps, "mr_bytes": mr_bytes, "queue_bytes": queue_bytes,
+            "locked_bytes": mr_bytes + queue_bytes}
+
+
+class ResourcePlanner:
+    """Check a size x qdepth x threads plan against memlock, memory, hugepages and device caps, and
+    find the largest plan that fits. ``qdepth`` is the perftest ``-q`` QP count per stream."""
+
+    def __init__(self, device, size, qdepth, threads, test_type="write", latency="bw", hugepages=False,
+                 meminfo=None, memlock=None, caps=None, cores=None, nic_node=None):
+        self.device = device
+        self.size = size
+        self.qdepth = qdepth
+        self.threads = threads
+        self.test_type = test_type
+        self.latency = latency
+        self.hugepages = hugepages
+        self.meminfo = meminfo if meminfo is not None else read_meminfo()
+        self.memlock, self.memlock_exempt = memlock if memlock is not None else memlock_limit()
+        self.caps = caps if caps is not None else read_device_caps(device) if device else {}
+        # CPU each stream is pinned to (stream i -> cores[i % len]); decides which NUMA pool its hugepages come from
+        self.cores = cores or sorted(os.sched_getaffinity(0))
+        self.nic_node = nic_node if nic_node is not None or not device else hp.device_numa_node(device)
+
+    @classmethod
+    def from_perf(cls, perf, **kwargs):
+        return cls(perf.device, perf.size, perf.qdepth, perf.threads, perf.test_type, perf.latency,
+                   hugepages=perf.use_hugepages, cores=perf.cpu_cores, **kwargs)
+
+    def hugepage_pools(self, mr_bytes, threads):
+        cores = [self.cores[i % len(self.cores)] for i in range(threads)]
+        page_kb = self.meminfo.get("Hugepagesize", hp.DEFAULT_PAGE_KB * 1024) // 1024
+        return hp.check_pools(mr_bytes, cores, page_kb=page_kb, nic_node=self.nic_node)
+
+    def checks(self, size=None, qdepth=None, threads=None):
+        """[{"check", "need", "have", "ok"}] for one plan (defaults to the configured one)."""
+        size = size or self.size
+        qdepth = qdepth or self.qdepth
+        threads = threads or self.threads
+        per = stream_resources(size, qdepth, self.test_type, self.latency, self.hugepages)
+        total_locked = per["locked_bytes"] * threads
+        out = []
+
+        def add(name, need, have, unit="count"):
+            out.append({"check": name, "need": need, "have": have, "unit": unit,
+                        "ok": have is None or need <= have})
+
+        if not self.memlock_exempt:
+            add("memlock per stream", per["locked_bytes"], self.memlock, "bytes")
+        if self.hugepages:
+            # Buffers come from the hugepage pool, which MemAvailable does not include
+            total_locked -= per["mr_bytes"] * threads
+            pools = self.hugepage_pools(per["mr_bytes"], threads)
+            if pools["nodes"]:
+                add("hugepages (all nodes)", pools["need_pages"], pools["free_pages"], "pages")
+            else:
+                free = self.meminfo.get("HugePages_Free", 0) * self.meminfo.get("Hugepagesize", HUGEPAGE_SIZE)
+                add("hugepages (all streams)", per["mr_bytes"] * threads, free, "bytes")
+        available = self.meminfo.get("MemAvailable")
+        if available is not None:
+            add("memory (all streams)", total_locked, int(available * (1 - MEM_HEADROOM)), "bytes")
+        caps = self.caps
+        add("device max_qp", per["qps"] * threads, caps.get("max_qp"))
+        add("device max_cq", per["cqs"] * threads, caps.get("max_cq"))
+        add("device max_mr", per["mrs"] * threads, caps.get("max_mr"))
+        add("device max_qp_wr", per["qp_wr"], caps.get("max_qp_wr"))
+        add("device max_cqe", per["cqe"], caps.get("max_cqe"))
+        add("device max_mr_size", per["mr_bytes"], caps.get("max_mr_size"), "bytes")
+        return out
+
+    def feasible(self, size=None, qdepth=None, threads=None):
+        return all(c["ok"] for c in self.checks(size, qdepth, threads))
+
+    def largest_feasible(self):
+        """Largest (qdepth, threads) at the configured size: for each thread count, the biggest
+        power-of-two QP count that fits; the plan with the most QPs in flight wins (ties: more threads)."""
+        best = None
+        for threads in range(self.threads, 0, -1):
+            qdepth = self.qdepth
+            while qdepth >= 1 and not self.feasible(qdepth=qdepth, threads=threads):
+                qdepth //= 2
+            if qdepth < 1:
+                continue
+            if best is None or qdepth * threads > best[0] * best[1]:
+                best = (qdepth, threads)
+            if qdepth == self.qdepth:
+                break
+        return best
+
+    def report(self):
+        per = stream_resources(self.size, self.qdepth, self.test_type, self.latency, self.hugepages)
+        checks = self.checks()
+        ok = all(c["ok"] for c in checks)
+        return {"device": self.device, "size": self.size, "qdepth": self.qdepth, "threads": self.threads,
+                "per_stream": per, "total_locked_bytes": per["locked_bytes"] * self.threads,
+                "memlock": self.memlock, "memlock_exempt": self.memlock_exempt, "caps": self.caps,
+                "checks": checks, "ok": ok, "suggestion": None if ok else self.largest_feasible(),
+                "hugepages": self.hugepage_pools(per["mr_bytes"], self.threads) if self.hugepages else None}
+
+
+def print_plan(report):
+    per = report["per_stream"]
+    print(f"\n[Planner] {report['threads']} streams x {report['qdepth']} QPs x {report['size']} B on {report['device']}")
+    print(f"- Per stream: {fmt_bytes(per['mr_bytes'])} registered + {fmt_bytes(per['queue_bytes'])} queues, "
+          f"{per['qps']} QPs, {per['cqs']} CQs; total locked {fmt_bytes(report['total_locked_bytes'])}")
+    for c in report["checks"]:
+        if c["have"] is None:
+            continue
+        show = fmt_bytes if c["unit"] == "bytes" else str
+        print(f"  {'ok  ' if c['ok'] else 'FAIL'} {c['check']:<24} need {show(c['need']):>12}  have {show(c['have']):>12}")
+    pools = report.get("hugepages")
+    if pools and pools["nodes"]:
+        print(f"- Hugepages ({pools['page_kb']} kB): {pools['pages_per_stream']} per stream")
+        for n in pools["nodes"]:
+            print(f"  {'ok  ' if n['ok'] else 'LOW '} node {n['node']}{' (NIC)' if n['nic_local'] else '':<6}"
+                  f"   need {n['need_pages']:>7}  free {n['free_pages']:>7} of {n['nr_pages']}")
+        if pools["remote"] and pools["ok"]:
+            print(f"- Node(s) {pools['remote']} are short; their streams will get hugepages from another node")
+    if report["memlock_exempt"]:
+        print("- memlock: running as root (CAP_IPC_LOCK), limit not enforced")
+    if not report["caps"]:
+        print("- Device caps unavailable (ibv_devinfo missing?); QP/CQ/MR limits not checked")
+    if report["suggestion"]:
+        qdepth, threads = report["suggestion"]
+        print(f"- Largest feasible plan at this size: --threads {threads} --qdepth {qdepth}")
+    elif not report["ok"]:
+        print("- No feasible plan at this size; reduce --size or raise the limits above")
+
+
+def preflight(perf, mode="refuse"):
+    """Check the run before launch. ``refuse`` -> False if it does not fit, ``shrink`` -> apply the
+    largest feasible plan to ``perf``, ``warn`` -> report only. Returns True to go ahead."""
+    if mode == "off":
+        return True
+    report = ResourcePlanner.from_perf(perf).report()
+    if report["ok"]:
+        if report["hugepages"] and report["hugepages"]["remote"]:
+            print_plan(report)
+        return True
+    print_plan(report)
+    if mode == "warn":
+        print("[Planner] Plan exceeds the limits above; launching anyway (--preflight warn)")
+        return True
+    if mode == "shrink" and report["suggestion"]:
+        perf.qdepth, perf.threads = report["suggestion"]
+        print(f"[Planner] Shrunk plan to --threads {perf.threads} --qdepth {perf.qdepth}; "
+              f"start the peer with the same values")
+        return True
+    print("[Planner] Refusing to launch (use --preflight shrink to apply the suggestion, or off to skip)")
+    return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate registered memory and verbs objects for a perftest plan")
+    parser.add_argument("--device", help="RDMA device for ibv_devinfo caps")
+    parser.add_argument("--size", type=int, default=65536)
+    parser.add_argument("--qdepth", type=int, default=512, help="QPs per stream (perftest -q)")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--test-type", choices=["write", "read", "send"], default="write")
+    parser.add_argument("--latency", choices=["bw", "lat"], default="bw")
+    parser.add_argument("--hugepages", action="store_true", help="Plan for perftest --use_hugepages buffers")
+    args = parser.parse_args()
+
+    planner = ResourcePlanner(args.device, args.size, args.qdepth, args.threads, args.test_type, args.latency,
+                              hugepages=args.hugepages)
+    report = planner.report()
+    print_plan(report)
+    raise SystemExit(0 if report["ok"] else 1)
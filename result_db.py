@@ -0,0 +1,283 @@
+# result_db.py
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+DEFAULT_DB = "logs/rdma_results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL UNIQUE,
+    started REAL,
+    role TEXT,
+    client_id TEXT,
+    device TEXT,
+    test_type TEXT,
+    latency TEXT,
+    size INTEGER,
+    qdepth INTEGER,
+    threads INTEGER,
+    duration INTEGER,
+    server_ip TEXT,
+    base_port INTEGER,
+    trial INTEGER,
+    n_streams INTEGER,
+    agg_bw_gbps REAL,
+    mean_lat_usec REAL,
+    config_json TEXT,
+    env_json TEXT,
+    ingested REAL
+);
+CREATE TABLE IF NOT EXISTS streams (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    thread_id TEXT,
+    bw_avg_gbps REAL,
+    msg_rate_mpps REAL,
+    bw_ss_mean_gbps REAL,
+    t_avg_usec REAL,
+    t_99_percentile_usec REAL,
+    result_json TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_device ON runs(device);
+CREATE INDEX IF NOT EXISTS idx_runs_test_type ON runs(test_type);
+CREATE INDEX IF NOT EXISTS idx_runs_size ON runs(size);
+CREATE INDEX IF NOT EXISTS idx_runs_qdepth ON runs(qdepth);
+CREATE INDEX IF NOT EXISTS idx_runs_started ON runs(started);
+CREATE INDEX IF NOT EXISTS idx_runs_lookup ON runs(device, test_type, size, qdepth, started);
+CREATE INDEX IF NOT EXISTS idx_streams_run ON streams(run_id);
+"""
+
+CONFIG_COLUMNS = ["role", "client_id", "device", "test_type", "latency", "size", "qdepth", "threads",
+                  "duration", "server_ip", "base_port"]
+STREAM_COLUMNS = ["bw_avg_gbps", "msg_rate_mpps", "bw_ss_mean_gbps", "t_avg_usec", "t_99_percentile_usec"]
+
+LEGACY_NAME = re.compile(r"^(client|server)_(.+)_(\d{8}_\d{6})\.(json|csv)$")
+
+
+def connect(db_path=DEFAULT_DB):
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _to_number(value):
+    if isinstance(value, str):
+        try:
+            return float(value) if "." in value else int(value)
+        except ValueError:
+            return value
+    return value
+
+
+def make_run(source, config, streams, env=None, started=None, trial=None):
+    return {"source": source, "config": config or {}, "env": env or {}, "started": started,
+            "trial": trial, "streams": streams}
+
+
+def parse_legacy(path, match):
+    """``logs/<role>_<id>_<YYYYMMDD_HHMMSS>.json|csv`` written by RDMAPerf.log_results (no config inside)."""
+    role, id_val, ts, ext = match.groups()
+    started = datetime.strptime(ts, "%Y%m%d_%H%M%S").timestamp()
+    config = {"role": role}
+    if role == "client":
+        config["client_id"] = id_val
+    else:
+        parts = id_val.split("_")
+        if len(parts) == 2 and all(p.isdigit() for p in parts):
+            config["base_port"], config["threads"] = int(parts[0]), int(parts[1])
+    if ext == "json":
+        with open(path) as f:
+            rows = json.load(f)
+    else:
+        with open(path, newline="") as f:
+            rows = [{k: _to_number(v) for k, v in r.items() if v != ""} for r in csv.DictReader(f)]
+    if not isinstance(rows, list):
+        return []
+    config["latency"] = "lat" if any("t_avg_usec" in r for r in rows) else "bw"
+    return [make_run(path, config, rows, started=started)]
+
+
+def parse_result_file(path):
+    """Turn one result file into run records; unknown files yield nothing."""
+    name = os.path.basename(path)
+    try:
+        if name.endswith("_summary.json"):
+            with open(path) as f:
+                summary = json.load(f)
+            run = dict(summary.get("run", {}))
+            env = run.pop("env", {})
+            started = run.pop("ts", None)
+            return [make_run(path, run, summary.get("results", []), env=env, started=started)]
+
+        if name.startswith("trials_") and name.endswith(".json"):
+            with open(path) as f:
+                data = json.load(f)
+            return [make_run(f"{path}#trial{t['trial']}", data.get("config"), t.get("results", []),
+                             env=data.get("env"), started=t.get("started"), trial=t["trial"])
+                    for t in data.get("trials", []) if t.get("valid", True)]
+
+        match = LEGACY_NAME.match(name)
+        if match and "_qpn_thread" not in name:
+            # The JSON and CSV of one run carry the same rows; prefer the JSON, and prefer the
+            # stream-log summary (which has the full config) over both
+            stem = path.rsplit(".", 1)[0]
+            if os.path.exists(stem + "_summary.json"):
+                return []
+            if match.group(4) == "csv" and os.path.exists(stem + ".json"):
+                return []
+            return parse_legacy(path, match)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[Result DB] Skipping {path}: {e}")
+    return []
+
+
+def ingest_run(conn, run):
+    """Insert one run and its streams; returns the new run id, or None if the source was already ingested."""
+    config = run["config"]
+    streams = [s for s in run["streams"] if isinstance(s, dict)]
+    bws = [s["bw_avg_gbps"] for s in streams if isinstance(s.get("bw_avg_gbps"), (int, float))]
+    lats = [s["t_avg_usec"] for s in streams if isinstance(s.get("t_avg_usec"), (int, float))]
+    values = {c: config.get(c) for c in CONFIG_COLUMNS}
+    if values["client_id"] is not None:
+        values["client_id"] = str(values["client_id"])
+    cur = conn.execute(
+        f"INSERT OR IGNORE INTO runs (source, started, trial, n_streams, agg_bw_gbps, mean_lat_usec, "
+        f"config_json, env_json, ingested, {', '.join(CONFIG_COLUMNS)}) "
+        f"VALUES ({', '.join('?' * (9 + len(CONFIG_COLUMNS)))})",
+        [run["source"], run["started"], run["trial"], len(streams),
+         round(sum(bws), 3) if bws else None, round(sum(lats) / len(lats), 3) if lats else None,
+         json.dumps(config), json.dumps(run["env"]), time.time(), *values.values()])
+    if cur.rowcount == 0:
+        return None
+    run_id = cur.lastrowid
+    conn.executemany(
+        f"INSERT INTO streams (run_id, thread_id, {', '.join(STREAM_COLUMNS)}, result_json) "
+        f"VALUES (?, ?, {', '.join('?' * len(STREAM_COLUMNS))}, ?)",
+        [[run_id, str(s.get("thread_id")), *[s.get(c) for c in STREAM_COLUMNS], json.dumps(s)] for s in streams])
+    return run_id
+
+
+def find_result_files(root):
+    paths = []
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            if name.endswith((".json", ".csv")):
+                paths.append(os.path.normpath(os.path.join(dirpath, name)))
+    return sorted(paths)
+
+
+def bulk_import(db_path, root, workers=None):
+    """Parse every result file under ``root`` in parallel and ingest in a single transaction."""
+    conn = connect(db_path)
+    known = {r[0] for r in conn.execute("SELECT source FROM runs")}
+    paths = [p for p in find_result_files(root) if p not in known]
+    added = 0
+    started = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parsed = pool.map(parse_result_file, paths, chunksize=64)
+        with conn:
+            for runs in parsed:
+                for run in runs:
+                    if ingest_run(conn, run) is not None:
+                        added += 1
+    conn.close()
+    print(f"[Result DB] Imported {added} runs from {len(paths)} files under {root} "
+          f"in {time.monotonic() - started:.1f}s -> {db_path}")
+    return added
+
+
+def parse_since(text):
+    """'30d', '12h', '45m' or an ISO date -> epoch seconds."""
+    match = re.match(r"^(\d+)([dhm])$", text)
+    if match:
+        scale = {"d": 86400, "h": 3600, "m": 60}[match.group(2)]
+        return time.time() - int(match.group(1)) * scale
+    return datetime.fromisoformat(text).timestamp()
+
+
+def query_runs(conn, device=None, test_type=None, size=None, qdepth=None, threads=None, latency=None,
+               since=None, order="latest", limit=20):
+    clauses, params = [], []
+    for column, value in (("device", device), ("test_type", test_type), ("size", size),
+                          ("qdepth", qdepth), ("threads", threads), ("latency", latency)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if since is not None:
+        clauses.append("started >= ?")
+        params.append(since)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    order_by = {
+        "latest": "started DESC",
+        "best-bw": "agg_bw_gbps IS NULL, agg_bw_gbps DESC",
+        "best-lat": "mean_lat_usec IS NULL, mean_lat_usec ASC",
+    }[order]
+    rows = conn.execute(f"SELECT * FROM runs {where} ORDER BY {order_by} LIMIT ?", [*params, limit])
+    return [dict(r) for r in rows]
+
+
+def load_streams(conn, run_id):
+    rows = conn.execute("SELECT result_json FROM streams WHERE run_id = ? ORDER BY rowid", [run_id])
+    return [json.loads(r[0]) for r in rows]
+
+
+def print_runs(runs):
+    header = (f"{'ID':>6} {'Started':<19} {'Device':<14} {'Type':<6} {'Size':>8} {'QD':>6} {'Thr':>4} "
+              f"{'Agg BW':>9} {'Lat avg':>8}  Source")
+    print(header)
+    print("-" * len(header))
+    for r in runs:
+        started = datetime.fromtimestamp(r["started"]).strftime("%Y-%m-%d %H:%M:%S") if r["started"] else "N/A"
+        bw = f"{r['agg_bw_gbps']:.2f}" if r["agg_bw_gbps"] is not None else "N/A"
+        lat = f"{r['mean_lat_usec']:.2f}" if r["mean_lat_usec"] is not None else "N/A"
+        print(f"{r['id']:>6} {started:<19} {str(r['device'] or 'N/A'):<14} {str(r['test_type'] or 'N/A'):<6} "
+              f"{str(r['size'] or 'N/A'):>8} {str(r['qdepth'] or 'N/A'):>6} {str(r['threads'] or 'N/A'):>4} "
+              f"{bw:>9} {lat:>8}  {r['source']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite warehouse for RDMA benchmark results")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite database path")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="Bulk-import result files (default: logs/)")
+    p_import.add_argument("root", nargs="?", default="logs")
+    p_import.add_argument("--workers", type=int, help="Parser processes (default: CPU count)")
+
+    p_query = sub.add_parser("query", help="Query stored runs")
+    p_query.add_argument("--device")
+    p_query.add_argument("--test-type", choices=["write", "read", "send"])
+    p_query.add_argument("--latency", choices=["bw", "lat"])
+    p_query.add_argument("--size", type=int)
+    p_query.add_argument("--qdepth", type=int)
+    p_query.add_argument("--threads", type=int)
+    p_query.add_argument("--since", help="e.g. 30d, 12h or 2025-04-01")
+    p_query.add_argument("--order", choices=["latest", "best-bw", "best-lat"], default="latest")
+    p_query.add_argument("--limit", type=int, default=20)
+
+    p_show = sub.add_parser("show", help="Show per-stream results of one run")
+    p_show.add_argument("run_id", type=int)
+
+    args = parser.parse_args()
+
+    if args.command == "import":
+        bulk_import(args.db, args.root, args.workers)
+    elif args.command == "query":
+        conn = connect(args.db)
+        print_runs(query_runs(conn, device=args.device, test_type=args.test_type, size=args.size,
+                              qdepth=args.qdepth, threads=args.threads, latency=args.latency,
+                              since=parse_since(args.since) if args.since else None,
+                              order=args.order, limit=args.limit))
+    elif args.command == "show":
+        conn = connect(args.db)
+        print(json.dumps(load_streams(conn, args.run_id), indent=2))
@@ -0,0 +1,181 @@
+# result_log.py
+import atexit
+import csv
+import io
+import json
+import os
+import threading
+import time
+
+# Columns of the CSV flavour; JSON-lines records keep every field
+LOG_CSV_FIELDS = ["type", "ts", "thread_id", "bw_gbps", "msg_rate_mpps", "bw_avg_gbps", "bw_ss_mean_gbps",
+                  "t_avg_usec", "t_99_percentile_usec", "reason", "detail"]
+
+
+class ResultLogWriter:
+    """Append-only, crash-safe record log for one run.
+
+    Records (``run``, ``sample``, ``result``, ``event``) are buffered in memory and flushed
+    to disk (with fsync) every ``flush_interval`` seconds by a background timer, so a killed
+    process loses at most one interval. Segments rotate once they exceed ``rotate_bytes``
+    or ``rotate_seconds``; ``finalize()`` derives a summary file from all segments.
+    """
+
+    def __init__(self, base_path, fmt="jsonl", flush_interval=2.0, rotate_bytes=64 * 1024 * 1024,
+                 rotate_seconds=None):
+        self.base_path = base_path
+        self.fmt = fmt
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.segments = []
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._file = None
+        self._csv = None
+        self._opened_at = None
+        self._closed = False
+        self._stop = threading.Event()
+        self._open_segment()
+        self._timer = threading.Thread(target=self._flush_loop, daemon=True)
+        self._timer.start()
+        atexit.register(self.close)
+
+    def _open_segment(self):
+        path = f"{self.base_path}.{len(self.segments):03d}.{self.fmt}"
+        self._file = open(path, "a", newline="")
+        self._opened_at = time.monotonic()
+        self.segments.append(path)
+        if self.fmt == "csv":
+            self._csv = csv.DictWriter(self._file, fieldnames=LOG_CSV_FIELDS, extrasaction="ignore")
+            self._csv.writeheader()
+
+    def _should_rotate(self):
+        if self.rotate_bytes and self._file.tell() >= self.rotate_bytes:
+            return True
+        return bool(self.rotate_seconds) and time.monotonic() - self._opened_at >= self.rotate_seconds
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def write(self, record_type, **fields):
+        record = {"type": record_type, "ts": round(time.time(), 3), **fields}
+        with self._lock:
+            if not self._closed:
+                self._buffer.append(record)
+
+    def run(self, **config):
+        self.write("run", **config)
+
+    def sample(self, thread_id, **fields):
+        self.write("sample", thread_id=thread_id, **fields)
+
+    def result(self, thread_id, **fields):
+        self.write("result", thread_id=thread_id, **fields)
+
+    def event(self, reason, **fields):
+        self.write("event", reason=reason, **fields)
+
+    def flush(self):
+        with self._lock:
+            if self._closed or not self._buffer:
+                return
+            records, self._buffer = self._buffer, []
+            for record in records:
+                if self.fmt == "csv":
+                    row = dict(record)
+                    extra = {k: v for k, v in record.items() if k not in LOG_CSV_FIELDS}
+                    if extra:
+                        row["detail"] = json.dumps(extra)
+                    self._csv.writerow(row)
+                else:
+                    self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            if self._should_rotate():
+                self._file.close()
+                self._open_segment()
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._file.close()
+
+    def read_records(self):
+        return read_segments(self.segments, self.fmt)
+
+    def finalize(self):
+        """Close the log and write ``<base>_summary.json`` derived from everything that was logged."""
+        self.close()
+        summary = summarize_records(self.read_records())
+        summary["segments"] = self.segments
+        path = f"{self.base_path}_summary.json"
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"[Result Log] Summary written to {path}")
+        return path
+
+
+def read_segments(segments, fmt="jsonl"):
+    """Read records back from log segments; tolerates a torn last line of a live or killed log."""
+    records = []
+    for path in segments:
+        if not os.path.exists(path):
+            continue
+        with open(path, newline="") as f:
+            if fmt == "csv":
+                text = f.read()
+                # A row without its line terminator is still being written (or was cut off): drop it
+                if text and not text.endswith("\n"):
+                    text = text[:text.rfind("\n") + 1]
+                try:
+                    for row in csv.DictReader(io.StringIO(text, newline="")):
+                        if None in row or None in row.values():
+                            break
+                        detail = row.pop("detail", "")
+                        row = {k: _coerce(v) for k, v in row.items() if v != ""}
+                        if detail:
+                            row.update(json.loads(detail))
+                        records.append(row)
+                except (ValueError, csv.Error):
+                    pass
+            else:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+    return records
+
+
+def _coerce(value):
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def summarize_records(records):
+    """Fold a record stream into run config, last result per thread, sample counts and events."""
+    summary = {"run": {}, "results": {}, "sample_counts": {}, "events": []}
+    for record in records:
+        kind = record.get("type")
+        if kind == "run":
+            summary["run"].update({k: v for k, v in record.items() if k != "type"})
+        elif kind == "result":
+            summary["results"][str(record.get("thread_id"))] = record
+        elif kind == "sample":
+            tid = str(record.get("thread_id"))
+            summary["sample_counts"][tid] = summary["sample_counts"].get(tid, 0) + 1
+        elif kind == "event":
+            summary["events"].append(record)
+    summary["results"] = list(summary["results"].values())
+    return summary
@@ -1,10 +1,13 @@
 #run_rdma_test.py#
 import argparse
+import signal
 import subprocess
 import threading
 import time
 import os
-from rdma_perf_tool import RDMAPerf
+from rdma_perf_tool import RDMAPerf, parse_priorities
+from perftest_errors import ACTIONS, ErrorPolicy, parse_action_map
+from load_sweep import LoadSweep, parse_load_steps
 
 
 def cleanup_stale_rdma_bw():
@@ -41,6 +44,26 @@ def auto_select_active_mellanox_interface():
                             return iface
     return None
 
+def gid_index_arg(value):
+    if value in ("auto", "none"):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected an index, 'auto' or 'none', got {value!r}")
+
+def priorities_arg(value):
+    try:
+        return parse_priorities(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def action_map_arg(value):
+    try:
+        return parse_action_map(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
 def cnp_watch(interface, interval=5, stop_event=None):
     print(f"[CNP Watch] Monitoring CNP counters on {interface} every {interval}s...")
     debugfs_cc_dir = "/sys/kernel/debug/mlx5"
@@ -85,6 +108,13 @@ if __name__ == "__main__":
     parser.add_argument("--per-thread-gbps", type=float, default=50.0, help="Expected Gbps per thread")
     parser.add_argument("--log-csv", action="store_true", help="Enable CSV logging")
     parser.add_argument("--log-json", action="store_true", help="Enable JSON logging")
+    parser.add_argument("--stream-log", choices=["jsonl", "csv"],
+                        help="Append every sample/result to a crash-safe log as it is produced")
+    parser.add_argument("--log-flush-interval", type=float, default=2.0, help="Stream log flush period in seconds")
+    parser.add_argument("--log-rotate-mb", type=float, default=64, help="Rotate the stream log after this many MB")
+    parser.add_argument("--log-rotate-minutes", type=float, help="Rotate the stream log after this many minutes")
+    parser.add_argument("--results-db", help="Also store every run in this SQLite result warehouse "
+                                             "(see result_db.py, e.g. logs/rdma_results.db)")
     parser.add_argument("--monitor-cnp", action="store_true", help="Enable live CNP monitoring")
     parser.add_argument("--multi-port-server", action="store_true", help="Enable persistent multi-port server")
     parser.add_argument("--base-port", type=int, default=18515, help="Base TCP port for RDMA sessions")
@@ -92,15 +122,74 @@ if __name__ == "__main__":
     parser.add_argument("--threads", type=int, default=0, help="Override number of threads")
     parser.add_argument("--test-type", choices=["write", "read", "send"], default="write")
     parser.add_argument("--kill", action="store_true", help="Kill all existing ib_*_bw RDMA processes before run")
+    parser.add_argument("--infinite-run", action="store_true",
+                        help="Persistent server: keep listeners alive with perftest --run_infinitely where supported")
     parser.add_argument("--enable-prometheus", action="store_true", help="Enable Prometheus server for persistent mode")
     parser.add_argument("--prometheus-port", type=int, default=9100, help="Port to expose Prometheus metrics")
     parser.add_argument("--report-gbits", action="store_true",
                         help="Enable Gbps reporting (adds --report_gbits to ib_*_bw)")
     parser.add_argument("--latency", choices=["bw", "lat"], default="bw",
                         help="Set to 'lat' to run latency test using ib_*_lat tools")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Client bw runs: stop once the aggregate BW confidence interval is within --ci-target; "
+                             "--duration becomes the hard ceiling")
+    parser.add_argument("--ci-target", type=float, default=0.01,
+                        help="Relative CI half-width of the mean aggregate BW to stop at (default: 0.01 = 1%%)")
+    parser.add_argument("--min-duration", type=int, default=5, help="Adaptive mode: minimum run time in seconds")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Client only: run the same configuration K times and report mean/stdev/bootstrap CI")
+    parser.add_argument("--shuffle", action="store_true", help="Randomize stream launch order in every trial")
+    parser.add_argument("--trial-gap", type=float, default=2.0, help="Seconds to wait between trials")
+    parser.add_argument("--seed", type=int, help="Seed for --shuffle and the bootstrap")
+    parser.add_argument("--iterations", type=int, help="Iterations per latency test (-n for ib_*_lat)")
+    parser.add_argument("--load-sweep", action="store_true",
+                        help="Client only: sweep rate-limited offered load and probe latency at each step")
+    parser.add_argument("--load-steps", default="10,20,30,40,50,60,70,80,90,100",
+                        help="Comma-separated offered load steps in percent of --link-speed")
+    parser.add_argument("--rate-limit-type", choices=["SW", "HW", "PP"], default="SW",
+                        help="perftest rate limiter used by the load sweep")
+    parser.add_argument("--probe-port", type=int, help="Latency server port for the load sweep probe "
+                                                       "(default: base-port + 1000)")
+    parser.add_argument("--probe-size", type=int, help="Latency probe message size (default: --size)")
+    parser.add_argument("--timeline", action="store_true",
+                        help="Client bw runs: sample stream BW and CNP/ECN/PFC counters on one clock and flag "
+                             "BW drops preceded by CNP bursts")
+    parser.add_argument("--timeline-interval", type=float, default=1.0, help="Timeline sampling period in seconds")
+    parser.add_argument("--gid-index", type=gid_index_arg, default="auto",
+                        help="GID index passed to perftest as -x: 'auto' picks the RoCE v2 GID in --server-ip's "
+                             "subnet, 'none' leaves perftest's default")
+    parser.add_argument("--priorities", type=priorities_arg,
+                        help="Comma-separated PRIO[:DSCP] list assigned to streams round-robin, e.g. 3,0 or 3:26,0; "
+                             "sets perftest --tclass/--sl per stream and reports BW and PFC pause per priority "
+                             "(DSCP defaults to PRIO x 8)")
+    parser.add_argument("--on-error", choices=ACTIONS, default="continue",
+                        help="Client: when a stream fails, keep the others running (continue), retry it with backoff "
+                             "(retry; retryable errors only) or stop the run (abort)")
+    parser.add_argument("--on-error-category", type=action_map_arg, default={},
+                        help="Per-category overrides, e.g. connect_failed=retry,mr_reg_failed=abort")
+    parser.add_argument("--max-retries", type=int, default=3, help="Retries per stream for --on-error retry")
+    parser.add_argument("--retry-backoff", type=float, default=1.0,
+                        help="First retry delay in seconds; doubles per attempt (max 30s)")
+    parser.add_argument("--setup-grace", type=float, default=15.0,
+                        help="Client watchdog: seconds a stream may take to print anything; also added to --duration "
+                             "as its maximum lifetime")
+    parser.add_argument("--stall-timeout", type=float, default=10.0,
+                        help="Client watchdog: seconds without a per-second bw row before a stream counts as hung")
+    parser.add_argument("--no-watchdog", action="store_true", help="Disable the per-stream hang watchdog")
+    parser.add_argument("--use-hugepages", action="store_true",
+                        help="Back every stream's buffers with hugepages (perftest --use_hugepages); checks the "
+                             "per-NUMA-node pool before launch and reports consumption")
+    parser.add_argument("--preflight", choices=["refuse", "shrink", "warn", "off"], default="refuse",
+                        help="Check registered memory, memlock and device QP/CQ/MR caps before launch: refuse an "
+                             "infeasible plan, shrink it to the largest feasible --threads/--qdepth, or only warn")
+    parser.add_argument("--sweep-label", help="Free-form label stored in the sweep CSV (e.g. DCQCN profile)")
 
 
     args = parser.parse_args()
+    if args.load_sweep and args.role != "client":
+        parser.error("--load-sweep is a client-side mode")
+    if args.repeat > 1 and args.role != "client":
+        parser.error("--repeat is a client-side mode")
 
     if args.threads > 0:
        threads = args.threads
@@ -118,6 +207,12 @@ if __name__ == "__main__":
             print(f"[WARN] Detected AMD Pollara NIC √ëoverriding size={args.size} bytes to 4096 bytes")
             args.size = 4096
 
+    # Treat SIGTERM (job schedulers, systemd) like Ctrl-C so runs stop cleanly and dump their logs
+    def _sigterm_to_interrupt(signum, frame):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)  # one clean shutdown; ignore repeats
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, _sigterm_to_interrupt)
+
     if args.kill:
         cleanup_stale_rdma_bw()
     perf = RDMAPerf(
@@ -137,21 +232,55 @@ if __name__ == "__main__":
         enable_prometheus=args.enable_prometheus,
         prometheus_port=args.prometheus_port,
         use_report_gbits=args.report_gbits,
-        latency=args.latency
-
+        latency="bw" if args.load_sweep else args.latency,
+        rate_limit_type=args.rate_limit_type,
+        iterations=args.iterations,
+        infinite_run=args.infinite_run,
+        adaptive=args.adaptive,
+        ci_target=args.ci_target,
+        min_duration=args.min_duration,
+        stream_log=args.stream_log,
+        log_flush_interval=args.log_flush_interval,
+        log_rotate_mb=args.log_rotate_mb,
+        log_rotate_minutes=args.log_rotate_minutes,
+        results_db=args.results_db,
+        timeline=args.timeline,
+        timeline_interval=args.timeline_interval,
+        gid_index=None if args.gid_index == "none" else args.gid_index,
+        priorities=args.priorities,
+        error_policy=ErrorPolicy(args.on_error, args.on_error_category, max_retries=args.max_retries,
+                                 backoff_base=args.retry_backoff),
+        watchdog=not args.no_watchdog,
+        setup_grace=args.setup_grace,
+        stall_timeout=args.stall_timeout,
+        use_hugepages=args.use_hugepages,
+        link_speed=args.link_speed
     )
 
+    if args.preflight != "off":
+        from resource_planner import preflight
+        if not preflight(perf, args.preflight):
+            raise SystemExit(1)
+
     if args.monitor_cnp:
-        if not perf.interface or perf.interface == "unknown":
+        if not perf.interface:
             perf.interface = auto_select_active_mellanox_interface()
-        if not perf.interface or perf.interface == "unknown":
+        if not perf.interface:
             print("[CNP Watch] No active interface found for CNP monitoring")
         else:
             cnp_stop_event = threading.Event()
             cnp_thread = threading.Thread(target=cnp_watch, args=(perf.interface, 5, cnp_stop_event))
             cnp_thread.start()
 
-    perf.run()
+    if args.load_sweep:
+        sweep = LoadSweep(perf, link_speed=args.link_speed, steps=parse_load_steps(args.load_steps),
+                          probe_port=args.probe_port, probe_size=args.probe_size, label=args.sweep_label)
+        sweep.run()
+    elif args.repeat > 1:
+        from trial_runner import TrialRunner
+        TrialRunner(perf, args.repeat, shuffle=args.shuffle, gap=args.trial_gap, seed=args.seed).run()
+    else:
+        perf.run()
 
     if args.monitor_cnp and perf.interface:
         cnp_stop_event.set()
@@ -0,0 +1,106 @@
+# stream_watchdog.py
+import os
+import signal
+import threading
+import time
+
+# Escalation order for a stream's process group; each step waits ``grace`` seconds for an exit
+ESCALATION = (signal.SIGINT, signal.SIGTERM, signal.SIGKILL)
+
+
+def group_alive(proc):
+    """True while ``proc`` or anything else in its process group is still running. The shell that
+    launched perftest can exit on SIGINT while perftest itself lives on and holds the output pipe."""
+    if proc.poll() is None:
+        return True
+    try:
+        os.killpg(proc.pid, 0)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+
+
+def escalate(procs, grace=3.0, signals=ESCALATION):
+    """Signal each process group in turn (SIGINT -> SIGTERM -> SIGKILL) until every group is empty.
+    Returns the signal that ended the last survivor, or None if nothing was running."""
+    running = [p for p in procs if group_alive(p)]
+    last = None
+    for sig in signals:
+        if not running:
+            break
+        last = sig
+        for proc in running:
+            try:
+                os.killpg(proc.pid, sig)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + grace
+        while time.monotonic() < deadline and any(group_alive(p) for p in running):
+            time.sleep(0.1)
+        running = [p for p in running if group_alive(p)]
+    return last
+
+
+class StreamWatchdog:
+    """Kill client streams that hang so ``run()`` (and sweeps built on it) always returns.
+
+    Every running stream registers its process and output times in ``perf.stream_activity``. A
+    stream times out when it:
+    - prints nothing within ``setup_grace`` seconds (``no_output``),
+    - stops producing per-second rows for ``stall_timeout`` seconds (``stalled``; bw streams with
+      ``--report_per_second`` only),
+    - outlives ``duration + setup_grace`` (``lifetime``; bw streams only, a latency stream runs for
+      ``-n`` iterations and ``--duration`` does not bound it).
+
+    A timed-out stream's process group is escalated SIGINT -> SIGTERM -> SIGKILL, and the stream
+    is reported with ``status="timed_out"`` and whatever samples it produced.
+    """
+
+    def __init__(self, perf, setup_grace=15.0, stall_timeout=10.0, kill_grace=3.0, interval=0.5):
+        self.perf = perf
+        self.setup_grace = setup_grace
+        self.stall_timeout = stall_timeout
+        self.kill_grace = kill_grace
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self._thread = None
+
+    def check(self, activity, now):
+        """Timeout reason for one stream, or None while it looks healthy."""
+        if activity["last_output"] is None:
+            if now - activity["started"] > self.setup_grace:
+                return "no_output"
+        elif activity["per_second"] and activity["samples"] and now - activity["last_output"] > self.stall_timeout:
+            return "stalled"
+        if self.perf.latency == "bw" and now - activity["started"] > self.perf.duration + self.setup_grace:
+            return "lifetime"
+        return None
+
+    def loop(self):
+        while not self.stop_event.wait(self.interval):
+            now = time.monotonic()
+            for thread_id, activity in list(self.perf.stream_activity.items()):
+                if activity.get("timed_out") or not group_alive(activity["proc"]):
+                    continue
+                reason = self.check(activity, now)
+                if reason is None:
+                    continue
+                activity["timed_out"] = reason
+                print(f"[Watchdog] Thread {thread_id} timed out ({reason} after "
+                      f"{now - activity['started']:.0f}s); stopping its process group")
+                threading.Thread(target=self.kill, args=(thread_id, activity), daemon=True).start()
+
+    def kill(self, thread_id, activity):
+        sig = escalate([activity["proc"]], grace=self.kill_grace)
+        activity["signal"] = sig.name if sig else None
+        if sig == signal.SIGKILL:
+            print(f"[Watchdog] Thread {thread_id} ignored SIGINT/SIGTERM; killed")
+
+    def start(self):
+        self._thread = threading.Thread(target=self.loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self._thread:
+            self._thread.join()
@@ -0,0 +1,98 @@
+# tests/test_bottleneck.py
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+import bottleneck
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "bottleneck")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# fixture -> (expected bottleneck, text the winning evidence must mention)
+EXPECTED = {
+    "link.json": ("link", "wire ceiling"),
+    "pcie.json": ("pcie", "PCIe Gen4 x8"),
+    "congestion.json": ("congestion", "CNPs"),
+    "numa.json": ("numa", "outside NIC node 1"),
+    "cpu_message_rate.json": ("cpu", "message-rate bound"),
+    "recorded_cpu_shared_core.json": ("cpu", "share 1 core"),
+    "qp_count.json": ("qp_count", "only 1 QPs in flight"),
+    "unknown.json": ("unknown", "no ceiling"),
+}
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        data = json.load(f)
+    # Recorded logs/<role>_<id>_diagnosis_<ts>.json files keep the metrics next to the verdict
+    return data.get("metrics", data)
+
+
+class ClassifyFixturesTest(unittest.TestCase):
+    def test_every_fixture_is_covered(self):
+        self.assertEqual(sorted(os.listdir(FIXTURES)), sorted(EXPECTED))
+        covered = {category for category, _ in EXPECTED.values()}
+        self.assertEqual(covered, set(bottleneck.CATEGORIES) | {"unknown"})
+
+    def test_fixtures(self):
+        for name, (category, evidence) in EXPECTED.items():
+            with self.subTest(fixture=name):
+                result = bottleneck.classify(load(name))
+                self.assertEqual(result["bottleneck"], category)
+                self.assertIn(evidence, " ".join(result["evidence"]))
+                if category != "unknown":
+                    self.assertGreaterEqual(result["score"], 0.5)
+
+    def test_recorded_diagnosis_replays(self):
+        with open(os.path.join(FIXTURES, "recorded_cpu_shared_core.json")) as f:
+            recorded = json.load(f)
+        replay = bottleneck.classify(recorded["metrics"])
+        # Evidence wording may change between releases; the verdict and the scores must not
+        self.assertEqual((replay["bottleneck"], replay["score"]), (recorded["bottleneck"], recorded["score"]))
+        self.assertEqual([(c["category"], c["score"]) for c in replay["candidates"]],
+                         [(c["category"], c["score"]) for c in recorded["candidates"]])
+
+    def test_thresholds(self):
+        link = load("link.json")
+        link["link"]["pct_of_achievable"] = bottleneck.AT_CEILING_PCT - 1
+        self.assertEqual(bottleneck.classify(link)["bottleneck"], "unknown")
+
+        congestion = load("congestion.json")
+        c = congestion["congestion"]
+        c.update(cnp_per_s=0.0, pause_per_s=0.0, pause_frames=0)
+        self.assertEqual(bottleneck.classify(congestion)["score"], 0.5)
+        c.update(cnp_per_s=bottleneck.CONGESTION_RATE / 2)
+        self.assertEqual(bottleneck.classify(congestion)["score"], 0.7)
+
+        cpu = load("cpu_message_rate.json")
+        cpu["size"] = bottleneck.SMALL_MESSAGE + 1
+        self.assertEqual(bottleneck.classify(cpu)["bottleneck"], "unknown")
+        cpu = load("cpu_message_rate.json")
+        for s in cpu["streams"]:
+            s["cpu_util"] = bottleneck.CPU_SATURATED - 0.01
+        self.assertEqual(bottleneck.classify(cpu)["bottleneck"], "unknown")
+
+        qps = load("qp_count.json")
+        qps["qdepth"] = bottleneck.MIN_QPS
+        self.assertEqual(bottleneck.classify(qps)["bottleneck"], "unknown")
+
+    def test_numa_mixed_placement_scores_slower_remote_streams(self):
+        metrics = load("numa.json")
+        for s in metrics["streams"][4:]:
+            s["numa_node"] = 1
+        for s in metrics["streams"][:4]:
+            s["bw_gbps"] = 30.0
+        result = bottleneck.classify(metrics)
+        self.assertEqual((result["bottleneck"], result["score"]), ("numa", 0.75))
+        self.assertIn("remote streams average 30.0 Gbps", result["evidence"][0])
+
+    def test_cli_replays_fixture(self):
+        out = subprocess.check_output([sys.executable, os.path.join(ROOT, "bottleneck.py"),
+                                       os.path.join(FIXTURES, "congestion.json"), "--json"], text=True)
+        self.assertEqual(json.loads(out)["bottleneck"], "congestion")
+
+
+if __name__ == "__main__":
+    unittest.main()
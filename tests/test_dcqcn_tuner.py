@@ -0,0 +1,149 @@
+# tests/test_dcqcn_tuner.py
+import os
+import tempfile
+import unittest
+
+import port_counters
+from dcqcn_tuner import DCQCNTuner, DebugfsParamBackend
+
+PCI_ADDR = "0000:a0:00.0"
+ORIGINAL = {"ecn_en": "1", "rp_threshold": "5", "rp_ai_rate": "5", "np_min_time_between_cnps": "4"}
+
+
+def make_debugfs(root, layout):
+    """Fake ``<root>/<pci_addr>/cc_params`` in either layout, holding ORIGINAL."""
+    path = os.path.join(root, PCI_ADDR, "cc_params")
+    if layout == "dir":
+        os.makedirs(path)
+        for name, value in ORIGINAL.items():
+            with open(os.path.join(path, name), "w") as f:
+                f.write(f"{value}\n")
+    else:
+        os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write("".join(f"{name}: {value}\n" for name, value in ORIGINAL.items()))
+
+
+def make_counters(root, cnp=0):
+    path = os.path.join(root, "mlx5_0", "ports", "1", "hw_counters")
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "np_cnp_sent"), "w") as f:
+        f.write(f"{cnp}\n")
+
+
+class DebugfsParamBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def check_layout(self, layout):
+        make_debugfs(self.root, layout)
+        backend = DebugfsParamBackend(PCI_ADDR, root=self.root)
+        self.assertEqual(backend.available(), sorted(ORIGINAL))
+        self.assertEqual(backend.snapshot(list(ORIGINAL)), ORIGINAL)
+
+        backend.apply({"rp_threshold": "10", "np_min_time_between_cnps": "0"})
+        expected = dict(ORIGINAL, rp_threshold="10", np_min_time_between_cnps="0")
+        self.assertEqual(backend.snapshot(list(ORIGINAL)), expected)
+
+        backend.apply(ORIGINAL)
+        self.assertEqual(backend.snapshot(list(ORIGINAL)), ORIGINAL)
+
+    def test_directory_layout(self):
+        self.check_layout("dir")
+
+    def test_single_file_layout_keeps_other_keys(self):
+        self.check_layout("file")
+        with open(os.path.join(self.root, PCI_ADDR, "cc_params")) as f:
+            self.assertEqual(f.read(), "".join(f"{n}: {v}\n" for n, v in ORIGINAL.items()))
+
+    def test_single_file_write_adds_missing_key(self):
+        make_debugfs(self.root, "file")
+        backend = DebugfsParamBackend(PCI_ADDR, root=self.root)
+        backend.write("rp_gd", "7")
+        self.assertEqual(backend.read("rp_gd"), "7")
+        self.assertEqual(backend.read("ecn_en"), "1")
+
+    def test_missing_cc_params(self):
+        with self.assertRaises(RuntimeError):
+            DebugfsParamBackend(PCI_ADDR, root=self.root)
+
+
+class DCQCNTunerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.counter_root = os.path.join(self.root, "ib")
+        make_counters(self.counter_root)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_tuner(self, layout, fail_at=None):
+        debugfs = os.path.join(self.root, f"debugfs_{layout}")
+        make_debugfs(debugfs, layout)
+        backend = DebugfsParamBackend(PCI_ADDR, root=debugfs)
+        seen = []
+        sent = [0]
+
+        def trial():
+            # Faster reaction (lower rp_threshold) trades throughput for fewer CNPs
+            params = backend.snapshot(["rp_threshold", "np_min_time_between_cnps", "ecn_en"])
+            seen.append(params)
+            if len(seen) == fail_at:
+                raise RuntimeError("trial failed")
+            threshold = int(params["rp_threshold"])
+            sent[0] += 100 * threshold
+            make_counters(self.counter_root, cnp=sent[0])
+            return {"throughput_gbps": 90.0 + threshold}
+
+        grid = {"rp_threshold": ["1", "10"], "np_min_time_between_cnps": ["0", "4"]}
+        tuner = DCQCNTuner(backend, grid, trial, rdma_dev="mlx5_0", settle=0, counter_root=self.counter_root)
+        try:
+            tuner.run()
+        finally:
+            restored = backend.snapshot(list(ORIGINAL))
+        return tuner, seen, restored
+
+    def check_run(self, layout):
+        tuner, seen, restored = self.run_tuner(layout)
+        self.assertEqual([(p["rp_threshold"], p["np_min_time_between_cnps"]) for p in seen],
+                         [("1", "0"), ("1", "4"), ("10", "0"), ("10", "4")])
+        # Keys outside the grid are untouched while the grid is applied
+        self.assertTrue(all(p["ecn_en"] == "1" for p in seen))
+        self.assertEqual(restored, ORIGINAL)
+        self.assertEqual([r["cnp"] for r in tuner.rows], [100, 100, 1000, 1000])
+        self.assertEqual({r["rp_threshold"] for r in tuner.rows}, {"1", "10"})
+
+    def test_directory_layout_restores(self):
+        self.check_run("dir")
+
+    def test_single_file_layout_restores(self):
+        self.check_run("file")
+
+    def test_restores_after_failed_trial(self):
+        for layout in ("dir", "file"):
+            with self.subTest(layout=layout):
+                with self.assertRaises(RuntimeError):
+                    self.run_tuner(layout, fail_at=2)
+                backend = DebugfsParamBackend(PCI_ADDR, root=os.path.join(self.root, f"debugfs_{layout}"))
+                self.assertEqual(backend.snapshot(list(ORIGINAL)), ORIGINAL)
+
+
+
+class PauseCountTest(unittest.TestCase):
+    def test_port_wide_counters_win(self):
+        diff = {"rx_pause_ctrl_phy": 10, "tx_pause_ctrl_phy": 5, "rx_prio3_pause": 10, "tx_prio3_pause": 5,
+                "tx_prio3_bytes": 4096}
+        self.assertEqual(port_counters.congestion_summary(1.0, diff)["pause_frames"], 15)
+
+    def test_per_priority_counters_without_port_wide(self):
+        diff = {"rx_prio3_pause": 10, "tx_prio3_pause": 5, "rx_prio4_pause": 1, "tx_prio3_bytes": 4096}
+        self.assertEqual(port_counters.congestion_summary(1.0, diff)["pause_frames"], 16)
+
+
+if __name__ == "__main__":
+    unittest.main()
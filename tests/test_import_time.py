@@ -0,0 +1,29 @@
+# tests/test_import_time.py
+import os
+import subprocess
+import sys
+import unittest
+
+import check_import_time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ImportTimeTest(unittest.TestCase):
+    """Runs the startup check so a slow or leaky import fails the suite, not just the CI step."""
+
+    def test_cli_import_within_budget(self):
+        result = check_import_time.check(runs=3)
+        self.assertEqual(result["optional_loaded"], [])
+        self.assertTrue(result["ok"], f"best {result['best_ms']} ms over the {result['budget_ms']} ms budget "
+                                      f"(runs {result['runs_ms']})")
+
+    def test_script_exit_status(self):
+        proc = subprocess.run([sys.executable, os.path.join(ROOT, "check_import_time.py"), "--runs", "3"],
+                              capture_output=True, text=True)
+        self.assertEqual(proc.returncode, 0, proc.stdout + proc.stderr)
+        self.assertIn("[Import Time] run_rdma_test: best", proc.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+# tests/test_rdma_device.py
+import ipaddress
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import rdma_device
+from rdma_device import resolve_gid_index
+
+# index: (gid, type, ndev)
+GIDS = {
+    0: ("fe80:0000:0000:0000:0a00:27ff:fe00:0001", "IB/RoCE v1", "ens1f0np0"),
+    1: ("fe80:0000:0000:0000:0a00:27ff:fe00:0001", "RoCE v2", "ens1f0np0"),
+    2: ("0000:0000:0000:0000:0000:ffff:0a01:0002", "IB/RoCE v1", "ens1f0np0"),
+    3: ("0000:0000:0000:0000:0000:ffff:0a01:0002", "RoCE v2", "ens1f0np0"),  # 10.1.0.2
+    4: ("0000:0000:0000:0000:0000:ffff:0a02:0002", "RoCE v2", "ens1f0v1"),  # 10.2.0.2
+    5: ("2001:0db8:0000:0000:0000:0000:0000:0002", "RoCE v2", "ens1f0np0"),
+}
+NETWORKS = {
+    "ens1f0np0": [ipaddress.ip_interface("10.1.0.2/24"), ipaddress.ip_interface("2001:db8::2/64")],
+    "ens1f0v1": [ipaddress.ip_interface("10.2.0.2/24")],
+}
+
+
+class ResolveGidIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        port = os.path.join(self.tmp.name, "mlx5_0", "ports", "1")
+        for sub in ("gids", "gid_attrs/types", "gid_attrs/ndevs"):
+            os.makedirs(os.path.join(port, sub))
+        for index, (gid, kind, ndev) in GIDS.items():
+            for sub, value in (("gids", gid), ("gid_attrs/types", kind), ("gid_attrs/ndevs", ndev)):
+                with open(os.path.join(port, sub, str(index)), "w") as f:
+                    f.write(value + "\n")
+        rdma_device._gid_tables.clear()
+        patcher = mock.patch.object(rdma_device, "interface_networks", lambda ndev: NETWORKS.get(ndev, []))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        rdma_device._gid_tables.clear()
+        self.tmp.cleanup()
+
+    def resolve(self, server_ip, route):
+        with mock.patch.object(rdma_device, "egress_route", lambda target: route):
+            return resolve_gid_index("mlx5_0", server_ip, base_path=self.tmp.name)
+
+    def test_routed_server_uses_route_source(self):
+        # 10.9.0.5 is in no local subnet; the kernel routes it out of ens1f0v1 from 10.2.0.2
+        res = self.resolve("10.9.0.5", {"dev": "ens1f0v1", "src": "10.2.0.2"})
+        self.assertEqual((res["gid_index"], res["match"]), (4, "route source"))
+        reasons = {r["index"]: r["reason"] for r in res["rejected"]}
+        self.assertEqual(reasons[0], "type IB/RoCE v1")
+        self.assertEqual(reasons[1], "link-local")
+        self.assertIn("IPv6 GID for IPv4 server", reasons[5])
+
+    def test_routed_server_uses_egress_netdev(self):
+        res = self.resolve("10.9.0.5", {"dev": "ens1f0v1", "src": None})
+        self.assertEqual((res["gid_index"], res["match"]), (4, "egress netdev"))
+
+    def test_subnet_is_a_tie_break(self):
+        res = self.resolve("10.2.0.9", {})
+        self.assertEqual((res["gid_index"], res["match"]), (4, "subnet"))
+
+    def test_no_route_falls_back_to_global_roce_v2(self):
+        res = self.resolve("10.9.0.5", {})
+        self.assertEqual((res["gid_index"], res["match"]), (3, "global"))
+
+    def test_ipv6_server(self):
+        res = self.resolve("2001:db8:1::9", {"dev": "ens1f0np0", "src": "2001:db8::2"})
+        self.assertEqual((res["gid_index"], res["match"]), (5, "route source"))
+
+    def test_server_role(self):
+        res = self.resolve(None, {})
+        self.assertEqual(res["gid_index"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
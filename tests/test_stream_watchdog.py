@@ -0,0 +1,34 @@
+# tests/test_stream_watchdog.py
+import types
+import unittest
+
+from stream_watchdog import StreamWatchdog
+
+
+def activity(started, last_output=None, per_second=False, samples=False):
+    return {"started": started, "last_output": last_output, "per_second": per_second, "samples": samples}
+
+
+class CheckTest(unittest.TestCase):
+    def watchdog(self, latency):
+        perf = types.SimpleNamespace(latency=latency, duration=10)
+        return StreamWatchdog(perf, setup_grace=15.0, stall_timeout=10.0)
+
+    def test_bw_stream_lifetime(self):
+        wd = self.watchdog("bw")
+        self.assertIsNone(wd.check(activity(0.0, last_output=20.0), now=24.0))
+        self.assertEqual(wd.check(activity(0.0, last_output=24.0), now=26.0), "lifetime")
+
+    def test_bw_stream_stall(self):
+        wd = self.watchdog("bw")
+        self.assertEqual(wd.check(activity(0.0, last_output=2.0, per_second=True, samples=True), now=13.0), "stalled")
+
+    def test_latency_stream_has_no_lifetime_limit(self):
+        # -n iterations, not --duration, bound a latency run; it prints its table only at the end
+        wd = self.watchdog("lat")
+        self.assertIsNone(wd.check(activity(0.0, last_output=1.0), now=600.0))
+        self.assertEqual(wd.check(activity(0.0), now=16.0), "no_output")
+
+
+if __name__ == "__main__":
+    unittest.main()
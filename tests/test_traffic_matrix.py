@@ -0,0 +1,88 @@
+# tests/test_traffic_matrix.py
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from rdma_agent import RDMAAgent
+from traffic_matrix import TrafficMatrix, parse_host
+
+# Stand-in for perftest: servers wait to be stopped, clients (``... --port P SERVER``) print a
+# per-second report and the final average
+FAKE_IB_WRITE_BW = '''#!/usr/bin/env python3
+import sys, time
+args = sys.argv[1:]
+if "--help" in args:
+    print(" --report_per_second\\n --run_infinitely\\n -x, --gid-index=<index>")
+    sys.exit(0)
+if "--version" in args:
+    print("Version: 6.10")
+    sys.exit(0)
+print(" local address: LID 0000 QPN 0x0108 PSN 0x1b5f2d RKey 0x17ec7b VAddr 0x007f0a2b1b0000")
+if len(args) < 3 or args[-3] != "--port":
+    time.sleep(3600)
+    sys.exit(0)
+print(" #bytes     #iterations    BW peak[Gb/sec]    BW average[Gb/sec]   MsgRate[Mpps]", flush=True)
+for i in range(int(args[args.index("--duration") + 1])):
+    time.sleep(0.2)
+    print(f" 65536      {100000 + i}          0.00               50.00              95.419847", flush=True)
+print(" 65536      5263700          0.00               50.00              95.419847")
+'''
+
+
+@unittest.skipUnless(shutil.which("taskset"), "needs taskset")
+class LocalhostMatrixTest(unittest.TestCase):
+    """Four agents on localhost driving a ring through a fake ib_write_bw on PATH."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        bindir = os.path.join(self.tmp.name, "bin")
+        os.makedirs(bindir)
+        binary = os.path.join(bindir, "ib_write_bw")
+        with open(binary, "w") as f:
+            f.write(FAKE_IB_WRITE_BW)
+        os.chmod(binary, 0o755)
+        self.old_path, self.old_cwd = os.environ["PATH"], os.getcwd()
+        os.environ["PATH"] = bindir + os.pathsep + self.old_path
+        os.chdir(self.tmp.name)
+        self.agents = [RDMAAgent("127.0.0.1", 0) for _ in range(4)]
+        for agent in self.agents:
+            threading.Thread(target=agent.serve_forever, daemon=True).start()
+        deadline = time.monotonic() + 5
+        while any(a.httpd is None for a in self.agents) and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def tearDown(self):
+        for agent in self.agents:
+            if agent.httpd:
+                agent.httpd.shutdown()
+            agent.shutdown()
+        os.environ["PATH"] = self.old_path
+        os.chdir(self.old_cwd)
+        self.tmp.cleanup()
+
+    def test_parse_host_resolves_agent_address(self):
+        self.assertEqual(parse_host("localhost:18611")["rdma_ip"], "127.0.0.1")
+        self.assertEqual(parse_host("localhost:18611=10.200.10.11")["rdma_ip"], "10.200.10.11")
+
+    def test_ring_on_localhost(self):
+        hosts = [parse_host(f"localhost:{a.httpd.server_address[1]}") for a in self.agents]
+        tm = TrafficMatrix(hosts, "ring", device="mlx5_0", duration=2, base_port=19500, port_stride=10, lead=0.5)
+        report = tm.run()
+
+        self.assertEqual([(c["src"], c["dst"]) for c in report["pairs"]], [(3, 0), (0, 1), (1, 2), (2, 3)])
+        for c in report["pairs"]:
+            self.assertEqual((c["state"], c["error"]), ("done", None))
+            self.assertAlmostEqual(c["bw_gbps"], 50.0)
+        self.assertEqual(report["matrix"][0], [None, 50.0, None, None])
+        self.assertAlmostEqual(report["total_gbps"], 200.0)
+        self.assertFalse(any(c["flagged"] for c in report["pairs"]))
+        # Every server was stopped once the clients finished
+        for agent in self.agents:
+            self.assertTrue(all(j.state == "done" for j in agent.jobs.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
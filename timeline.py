@@ -0,0 +1,199 @@
+# timeline.py
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import port_counters
+from rdma_stats import mean, stdev, percentile, lagged_correlation
+
+# Counter deltas kept as their own columns (when the NIC exposes them)
+TIMELINE_COUNTERS = [*port_counters.CNP_COUNTERS, *port_counters.ECN_COUNTERS, "port_xmit_data", "port_rcv_data"]
+
+
+class TimelineSampler:
+    """Sample stream bandwidth and port counters on one clock into a columnar timeline.
+
+    A background thread ticks every ``interval`` seconds on a fixed schedule and records the
+    wall-clock tick time plus the delta of every port counter since the previous tick. Stream
+    bandwidth comes from perftest's per-second rows, which carry their own arrival time; at
+    ``stop()`` each sample is placed in the tick interval it arrived in, so every column
+    shares the tick timestamps.
+    """
+
+    def __init__(self, perf, interval=1.0, rdma_dev=None, iface=None, counter_root=port_counters.IB_ROOT):
+        self.perf = perf
+        self.interval = interval
+        self.rdma_dev = rdma_dev or perf.device
+        self.iface = iface or perf.interface
+        self.counter_root = counter_root
+        self.ticks = []
+        self.counter_deltas = []
+        self.stop_event = threading.Event()
+        self._thread = None
+
+    def _snapshot(self):
+        return port_counters.snapshot(self.rdma_dev, self.iface, root=self.counter_root)
+
+    def loop(self):
+        previous = self._snapshot()
+        start = time.monotonic()
+        k = 1
+        while not self.stop_event.wait(max(0.0, start + k * self.interval - time.monotonic())):
+            current = self._snapshot()
+            self.ticks.append(current["ts"])
+            self.counter_deltas.append(port_counters.deltas(previous, current))
+            previous = current
+            k += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self._thread:
+            self._thread.join()
+        return self.build()
+
+    def build(self):
+        """Columnar timeline: {"ts": [...], "bw_total_gbps": [...], "bw_<tid>": [...], "cnp": [...], ...}."""
+        n = len(self.ticks)
+        columns = {"ts": [round(t, 3) for t in self.ticks]}
+        edges = [self.ticks[0] - self.interval if n else 0.0, *self.ticks]
+
+        streams = {}
+        for tid, result in sorted(self.perf.results.items(), key=lambda kv: str(kv[0])):
+            bins = [[] for _ in range(n)]
+            for s in result.get("samples", []):
+                k = _bin_index(edges, s["ts"])
+                if k is not None:
+                    bins[k].append(s["bw_gbps"])
+            streams[tid] = [round(mean(b), 3) if b else None for b in bins]
+        columns["bw_total_gbps"] = [round(sum(v[k] for v in streams.values() if v[k] is not None), 3)
+                                    if any(v[k] is not None for v in streams.values()) else None
+                                    for k in range(n)]
+        for tid, values in streams.items():
+            columns[f"bw_{tid}"] = values
+        for prio in sorted({r["priority"] for r in self.perf.results.values() if "priority" in r}):
+            members = [streams[tid] for tid, r in self.perf.results.items() if r.get("priority") == prio]
+            columns[f"bw_prio{prio}_gbps"] = [
+                round(sum(v[k] for v in members if v[k] is not None), 3)
+                if any(v[k] is not None for v in members) else None for k in range(n)]
+
+        summaries = [port_counters.congestion_summary(elapsed, diff) for elapsed, diff in self.counter_deltas]
+        for field in ("cnp", "ecn_marked", "pause_frames"):
+            columns[field] = [s[field] for s in summaries]
+        names = sorted({name for _, diff in self.counter_deltas for name in diff
+                        if name in TIMELINE_COUNTERS or port_counters.PAUSE_STAT.match(name)})
+        for name in names:
+            columns[name] = [diff.get(name) for _, diff in self.counter_deltas]
+        prio_summaries = [port_counters.priority_summary(elapsed, diff) for elapsed, diff in self.counter_deltas]
+        for prio in sorted({p for summary in prio_summaries for p, c in summary.items() if any(c.values())}):
+            for field in ("tx_gbps", "rx_gbps"):
+                columns[f"{field[:2]}_prio{prio}_gbps"] = [s.get(prio, {}).get(field) for s in prio_summaries]
+        if "port_xmit_data" in names:
+            # port_xmit_data counts 4-byte words
+            columns["port_xmit_gbps"] = [
+                round(diff.get("port_xmit_data", 0) * 32 / elapsed / 1e9, 3) if elapsed else None
+                for elapsed, diff in self.counter_deltas]
+        return columns
+
+
+def _bin_index(edges, ts):
+    """Index k with edges[k] < ts <= edges[k + 1], or None outside the timeline."""
+    lo, hi = 0, len(edges) - 1
+    if hi < 1 or ts <= edges[0] or ts > edges[-1]:
+        return None
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if ts <= edges[mid]:
+            hi = mid
+        else:
+            lo = mid
+    return lo
+
+
+def correlations(columns, max_lag=5, lead="cnp", follow="bw_total_gbps"):
+    """Correlation of ``lead`` with ``follow`` shifted 0..max_lag ticks later."""
+    result = {}
+    for lag in range(max_lag + 1):
+        c = lagged_correlation(columns[lead], columns[follow], lag)
+        result[lag] = round(c, 4) if c is not None else None
+    return result
+
+
+def find_drop_events(columns, drop_pct=0.10, window=5, max_lag=3, burst_sigma=2.0):
+    """BW drops (below (1 - drop_pct) x the median of the previous ``window`` ticks) and the CNP
+    burst (above median + burst_sigma x stdev of the run) that preceded each within ``max_lag`` ticks.
+    """
+    bw, cnp, ts = columns["bw_total_gbps"], columns["cnp"], columns["ts"]
+    valid_cnp = [c for c in cnp if c is not None]
+    threshold = percentile(valid_cnp, 50) + burst_sigma * stdev(valid_cnp) if valid_cnp else float("inf")
+    bursts = [k for k, c in enumerate(cnp) if c is not None and c > 0 and c > threshold]
+
+    events = []
+    for k in range(window, len(bw)):
+        history = [v for v in bw[k - window:k] if v is not None]
+        if bw[k] is None or len(history) < window // 2 + 1:
+            continue
+        reference = percentile(history, 50)
+        if reference <= 0 or bw[k] >= reference * (1 - drop_pct):
+            continue
+        preceding = [j for j in bursts if k - max_lag <= j <= k]
+        event = {"ts": ts[k], "tick": k, "bw_total_gbps": bw[k], "reference_gbps": reference,
+                 "drop_pct": round((1 - bw[k] / reference) * 100, 2), "cnp_burst": bool(preceding)}
+        if preceding:
+            j = preceding[-1]
+            event.update({"burst_tick": j, "lag_s": round(ts[k] - ts[j], 3), "cnp": cnp[j]})
+        events.append(event)
+    return {"cnp_burst_threshold": round(threshold, 3) if valid_cnp else None, "bursts": bursts, "drops": events}
+
+
+def analyze(columns, max_lag=5, drop_pct=0.10, burst_sigma=2.0):
+    return {"correlations": correlations(columns, max_lag),
+            **find_drop_events(columns, drop_pct=drop_pct, max_lag=min(max_lag, 3), burst_sigma=burst_sigma)}
+
+
+def print_analysis(analysis):
+    corr = ", ".join(f"{lag}s: {c:+.2f}" if c is not None else f"{lag}s: N/A"
+                     for lag, c in analysis["correlations"].items())
+    print(f"\n[Timeline] corr(CNP at t, BW at t+lag): {corr}")
+    drops = analysis["drops"]
+    if not drops:
+        print("[Timeline] No bandwidth drops detected")
+    for e in drops:
+        line = (f"[Timeline] BW drop at {datetime.fromtimestamp(e['ts']).strftime('%X')}: "
+                f"{e['bw_total_gbps']:.2f} Gbps ({e['drop_pct']:.1f}% below {e['reference_gbps']:.2f})")
+        if e["cnp_burst"]:
+            line += f" preceded by CNP burst ({e['cnp']} CNPs, {e['lag_s']:.1f}s earlier)"
+        print(line)
+
+
+def write_timeline(columns, analysis, name):
+    os.makedirs("logs", exist_ok=True)
+    base = f"logs/timeline_{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    with open(base + ".json", "w") as f:
+        json.dump({"columns": columns, "analysis": analysis}, f, indent=2)
+    with open(base + ".csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(list(columns))
+        writer.writerows(zip(*columns.values()))
+    print(f"[Timeline] Written to {base}.json and {base}.csv")
+    return base + ".json"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-analyze a saved bandwidth/counter timeline")
+    parser.add_argument("timeline", help="logs/timeline_*.json written by run_rdma_test.py --timeline")
+    parser.add_argument("--max-lag", type=int, default=5, help="Largest CNP -> BW lag (ticks) to correlate")
+    parser.add_argument("--drop-pct", type=float, default=0.10, help="Relative BW drop counted as an event")
+    parser.add_argument("--burst-sigma", type=float, default=2.0, help="CNP burst threshold in stdevs above median")
+    args = parser.parse_args()
+
+    with open(args.timeline) as f:
+        columns = json.load(f)["columns"]
+    print_analysis(analyze(columns, args.max_lag, args.drop_pct, args.burst_sigma))
@@ -0,0 +1,239 @@
+# traffic_matrix.py
+import argparse
+import csv
+import json
+import os
+import random
+import socket
+import time
+from datetime import datetime
+
+from rdma_agent import AgentClient
+
+PATTERNS = ["all-to-all", "ring", "bisection", "permutation"]
+
+
+def resolve_ip(host):
+    """``host`` as an IP address string (IPv4 preferred, as perftest connects); unchanged if it does not resolve."""
+    try:
+        infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError):
+        return host
+    infos.sort(key=lambda i: i[0] != socket.AF_INET)
+    return infos[0][4][0] if infos else host
+
+
+def parse_host(spec):
+    """``AGENT[=RDMA_IP]``: agent address (host[:port]) and the RDMA address clients connect to.
+
+    Without ``RDMA_IP`` clients connect to the agent host's resolved address, so a name like
+    ``localhost`` never reaches perftest or GID matching.
+    """
+    agent, _, rdma_ip = spec.partition("=")
+    return {"agent": agent, "rdma_ip": rdma_ip or resolve_ip(agent.partition(":")[0]), "name": spec}
+
+
+def make_pairs(n, pattern, seed=None):
+    """(src, dst) host index pairs for a traffic pattern over ``n`` hosts."""
+    if n < 2:
+        raise ValueError("A traffic matrix needs at least two hosts")
+    if pattern == "all-to-all":
+        return [(i, j) for i in range(n) for j in range(n) if i != j]
+    if pattern == "ring":
+        return [(i, (i + 1) % n) for i in range(n)]
+    if pattern == "bisection":
+        if n % 2:
+            raise ValueError("bisection needs an even number of hosts")
+        half = n // 2
+        return [(i, i + half) for i in range(half)] + [(i + half, i) for i in range(half)]
+    if pattern == "permutation":
+        # Random derangement: every host sends to exactly one other host and receives from one
+        rng = random.Random(seed)
+        while True:
+            dst = list(range(n))
+            rng.shuffle(dst)
+            if all(i != d for i, d in enumerate(dst)):
+                return list(enumerate(dst))
+    raise ValueError(f"Unknown pattern {pattern}")
+
+
+def plan_ports(pairs, n, streams, base_port, port_stride):
+    """Give every pair its own ports on the destination host's server.
+
+    Host ``j`` listens on ``base_port + j * port_stride`` upwards so hosts sharing an address
+    (agents on localhost) never collide. A pair is a client with ``client_id`` = its position
+    among the destination's incoming pairs, which is how RDMAPerf clients pick their ports.
+    """
+    incoming = {j: [p for p in pairs if p[1] == j] for j in range(n)}
+    servers, clients = {}, []
+    for j, flows in incoming.items():
+        if not flows:
+            continue
+        base = base_port + j * port_stride
+        if len(flows) * streams > port_stride:
+            raise ValueError(f"{len(flows) * streams} ports needed on host {j}; raise --port-stride")
+        servers[j] = {"base_port": base, "threads": len(flows) * streams}
+        for cid, (i, _) in enumerate(flows):
+            clients.append({"src": i, "dst": j, "client_id": cid, "base_port": base,
+                            "ports": [base + cid * streams + t for t in range(streams)]})
+    return servers, clients
+
+
+def pair_bw(job):
+    """Pair bandwidth: sum of per-stream steady-state BW when available, else the reported average."""
+    total = 0.0
+    for r in job.get("results", []):
+        total += r.get("bw_ss_mean_gbps", r.get("bw_avg_gbps", 0.0)) or 0.0
+    return round(total, 3)
+
+
+class TrafficMatrix:
+    """Drive a host-to-host traffic pattern through per-host agents and collect a BW matrix."""
+
+    def __init__(self, hosts, pattern, streams=1, device=None, size=65536, qdepth=1024, test_type="write",
+                 duration=30, base_port=18515, port_stride=100, lead=3.0, seed=None, worst=5, tolerance=0.10):
+        self.hosts = hosts
+        self.agents = [AgentClient(h["agent"]) for h in hosts]
+        self.pattern = pattern
+        self.streams = streams
+        self.device = device
+        self.size = size
+        self.qdepth = qdepth
+        self.test_type = test_type
+        self.duration = duration
+        self.base_port = base_port
+        self.port_stride = port_stride
+        self.lead = lead
+        self.seed = seed
+        self.worst = worst
+        self.tolerance = tolerance
+
+    def perf_args(self):
+        return {"device": self.device, "size": self.size, "qdepth": self.qdepth, "test_type": self.test_type}
+
+    def run(self):
+        n = len(self.hosts)
+        pairs = make_pairs(n, self.pattern, self.seed)
+        servers, clients = plan_ports(pairs, n, self.streams, self.base_port, self.port_stride)
+        print(f"[Traffic Matrix] {self.pattern}: {len(pairs)} pairs x {self.streams} streams over {n} hosts")
+        for agent in self.agents:
+            agent.sync_clock()
+
+        server_jobs = {}
+        try:
+            for j, srv in servers.items():
+                server_jobs[j] = self.agents[j].start_server(**srv, **self.perf_args())
+                print(f"[Traffic Matrix] Server on {self.hosts[j]['name']}: ports {srv['base_port']}.."
+                      f"{srv['base_port'] + srv['threads'] - 1}")
+
+            start_at = time.time() + self.lead
+            jobs = []
+            for c in clients:
+                agent = self.agents[c["src"]]
+                job_id = agent.start_client(start_at=start_at, server_ip=self.hosts[c["dst"]]["rdma_ip"],
+                                            threads=self.streams, client_id=c["client_id"],
+                                            base_port=c["base_port"], duration=self.duration, **self.perf_args())
+                jobs.append((c, agent, job_id))
+
+            for c, agent, job_id in jobs:
+                job = agent.wait(job_id, timeout=self.lead + self.duration + 30)
+                c["state"] = job["state"]
+                c["error"] = job["error"]
+                c["bw_gbps"] = pair_bw(job)
+                c["streams"] = [{k: r.get(k) for k in ("thread_id", "bw_avg_gbps", "bw_ss_mean_gbps")}
+                                for r in job.get("results", [])]
+        finally:
+            for j, job_id in server_jobs.items():
+                self.agents[j].stop(job_id)
+        return self.report(pairs, clients)
+
+    def report(self, pairs, clients):
+        n = len(self.hosts)
+        matrix = [[None] * n for _ in range(n)]
+        for c in clients:
+            matrix[c["src"]][c["dst"]] = c.get("bw_gbps")
+        values = sorted(c["bw_gbps"] for c in clients if c.get("bw_gbps") is not None)
+        median = values[len(values) // 2] if values else 0.0
+        ranked = sorted(clients, key=lambda c: c.get("bw_gbps") or 0.0)
+        for c in clients:
+            c["flagged"] = median > 0 and (c.get("bw_gbps") or 0.0) < median * (1 - self.tolerance)
+        return {
+            "pattern": self.pattern,
+            "hosts": [h["name"] for h in self.hosts],
+            "streams_per_pair": self.streams,
+            "duration": self.duration,
+            "median_pair_gbps": median,
+            "tolerance_pct": self.tolerance * 100,
+            "total_gbps": round(sum(values), 3),
+            "matrix": matrix,
+            "pairs": clients,
+            "worst_pairs": [{"src": self.hosts[c["src"]]["name"], "dst": self.hosts[c["dst"]]["name"],
+                             "bw_gbps": c.get("bw_gbps"), "state": c.get("state")}
+                            for c in ranked[:self.worst]],
+        }
+
+
+def print_report(report):
+    hosts = report["hosts"]
+    flagged = {(c["src"], c["dst"]) for c in report["pairs"] if c["flagged"]}
+    width = max(10, *(len(h) for h in hosts)) + 1
+    print(f"\n[Traffic Matrix] {report['pattern']} BW (Gbps), rows send to columns; "
+          f"* = more than {report['tolerance_pct']:.0f}% below the median pair "
+          f"({report['median_pair_gbps']:.2f} Gbps)")
+    corner = "src \\ dst"
+    print(f"{corner:>{width}}" + "".join(f"{h:>{width}}" for h in hosts))
+    for i, row in enumerate(report["matrix"]):
+        cells = []
+        for j, bw in enumerate(row):
+            if bw is None:
+                cells.append(f"{'-':>{width}}")
+            else:
+                cells.append(f"{(f'{bw:.2f}' + ('*' if (i, j) in flagged else ' ')):>{width}}")
+        print(f"{hosts[i]:>{width}}" + "".join(cells))
+    print(f"- Total: {report['total_gbps']:.2f} Gbps across {len(report['pairs'])} pairs")
+    print("- Worst pairs:")
+    for w in report["worst_pairs"]:
+        print(f"  {w['src']} -> {w['dst']}: {w['bw_gbps']:.2f} Gbps ({w['state']})")
+
+
+def write_report(report):
+    os.makedirs("logs", exist_ok=True)
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base = f"logs/traffic_matrix_{report['pattern']}_{ts}"
+    with open(base + ".json", "w") as f:
+        json.dump(report, f, indent=2)
+    with open(base + ".csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["src", *report["hosts"]])
+        for host, row in zip(report["hosts"], report["matrix"]):
+            writer.writerow([host, *("" if bw is None else bw for bw in row)])
+    print(f"[Traffic Matrix] Written to {base}.json and {base}.csv")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run an all-to-all, ring, bisection or permutation traffic "
+                                                 "pattern across hosts through rdma_agent.py")
+    parser.add_argument("--hosts", nargs="+", required=True,
+                        help="AGENT[=RDMA_IP] per host, e.g. 10.0.0.1 or mgmt1:18600=10.200.10.11")
+    parser.add_argument("--pattern", choices=PATTERNS, default="all-to-all")
+    parser.add_argument("--streams", type=int, default=1, help="Streams (QP groups) per host pair")
+    parser.add_argument("--device", help="RDMA device on every host (auto-detected by the agent if not set)")
+    parser.add_argument("--size", type=int, default=65536, help="Message size in bytes")
+    parser.add_argument("--qdepth", type=int, default=1024, help="Queue depth per thread")
+    parser.add_argument("--test-type", choices=["write", "read", "send"], default="write")
+    parser.add_argument("--duration", type=int, default=30, help="Test duration in seconds")
+    parser.add_argument("--base-port", type=int, default=18515, help="First server port of host 0")
+    parser.add_argument("--port-stride", type=int, default=100, help="Server port range reserved per host")
+    parser.add_argument("--seed", type=int, help="Seed for the permutation pattern")
+    parser.add_argument("--worst", type=int, default=5, help="Number of worst pairs to list")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Flag pairs more than this fraction below the median pair")
+    args = parser.parse_args()
+
+    tm = TrafficMatrix([parse_host(h) for h in args.hosts], args.pattern, streams=args.streams, device=args.device,
+                       size=args.size, qdepth=args.qdepth, test_type=args.test_type, duration=args.duration,
+                       base_port=args.base_port, port_stride=args.port_stride, seed=args.seed, worst=args.worst,
+                       tolerance=args.tolerance)
+    report = tm.run()
+    print_report(report)
+    write_report(report)
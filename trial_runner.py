@@ -0,0 +1,177 @@
+# trial_runner.py
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+from rdma_stats import mean, stdev, bootstrap_ci
+from rdma_device import get_run_environment
+import result_db
+
+
+# Streams in these states ran short or not at all; a trial with any of them is left out of the summary
+INVALID_STATUSES = ("failed", "timed_out")
+
+
+def trial_metric(latency, trials):
+    """Per-stream metric compared across trials, chosen once for the whole run: steady-state BW when every
+    stream of every valid trial has it, else the reported average."""
+    if latency != "bw":
+        return "t_avg_usec"
+    rows = [r for t in trials if t["valid"] for r in t["results"]]
+    if rows and all("bw_ss_mean_gbps" in r for r in rows):
+        return "bw_ss_mean_gbps"
+    return "bw_avg_gbps"
+
+
+def describe(values, confidence=0.95, seed=None):
+    low, high = bootstrap_ci(values, confidence=confidence, seed=seed)
+    return {
+        "n": len(values),
+        "mean": round(mean(values), 4),
+        "stdev": round(stdev(values), 4),
+        "ci_low": round(low, 4),
+        "ci_high": round(high, 4),
+    }
+
+
+class TrialRunner:
+    """Run the same client configuration ``repeat`` times and summarize across trials.
+
+    With ``shuffle`` each trial launches its streams in a random order so launch position
+    does not systematically favour the same ports. Requires a persistent server.
+    """
+
+    def __init__(self, perf, repeat, shuffle=False, gap=2.0, confidence=0.95, seed=None):
+        self.perf = perf
+        self.repeat = repeat
+        self.shuffle = shuffle
+        self.gap = gap
+        self.confidence = confidence
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.trials = []
+
+    def run_trial(self, index):
+        self.perf.reset_results()
+        order = list(range(self.perf.threads))
+        if self.shuffle:
+            self.rng.shuffle(order)
+        self.perf.launch_order = order
+        print(f"\n[Trials] Trial {index + 1}/{self.repeat} (launch order {order})")
+
+        started = time.time()
+        self.perf.run()
+        results = list(self.perf.results.values())
+        invalid = sorted(str(r.get("thread_id")) for r in results if r.get("status") in INVALID_STATUSES)
+        missing = self.perf.threads - len(results)
+        valid = not invalid and missing <= 0
+        if invalid:
+            print(f"[Trials] Trial {index + 1} left out of the summary: streams {', '.join(invalid)} "
+                  f"failed or timed out")
+        elif missing > 0:
+            print(f"[Trials] Trial {index + 1} left out of the summary: {missing} streams reported nothing")
+        return {
+            "trial": index,
+            "started": round(started, 3),
+            "launch_order": order,
+            "valid": valid,
+            "invalid_streams": invalid,
+            "results": results,
+        }
+
+    def score_trials(self):
+        """Per-stream values and the aggregate of every trial, all in the run's single metric; a valid
+        trial missing the metric on any stream is marked invalid rather than summed partially."""
+        metric = trial_metric(self.perf.latency, self.trials)
+        for trial in self.trials:
+            streams = {str(r.get("thread_id")): r.get(metric) for r in trial["results"]}
+            if trial["valid"] and any(v is None for v in streams.values()):
+                trial["valid"] = False
+                trial["invalid_streams"] = sorted(tid for tid, v in streams.items() if v is None)
+            trial["metric"] = metric
+            trial["streams"] = {tid: v for tid, v in streams.items() if v is not None}
+            values = list(trial["streams"].values())
+            if not trial["valid"] or not values:
+                trial["aggregate"] = None
+            else:
+                trial["aggregate"] = round(sum(values), 4) if self.perf.latency == "bw" else round(mean(values), 4)
+        return metric
+
+    def run(self):
+        # Trials are stored once, from the trials file, instead of per perf.run()
+        log_csv, log_json, results_db = self.perf.log_csv, self.perf.log_json, self.perf.results_db
+        self.perf.log_csv = self.perf.log_json = False
+        self.perf.results_db = None
+        try:
+            for i in range(self.repeat):
+                if i and self.gap:
+                    time.sleep(self.gap)
+                self.trials.append(self.run_trial(i))
+        finally:
+            self.perf.log_csv, self.perf.log_json = log_csv, log_json
+            self.perf.results_db = results_db
+            self.perf.launch_order = None
+
+        self.score_trials()
+        summary = self.summarize()
+        self.print_summary(summary)
+        path = self.write_trials(summary)
+        if results_db:
+            conn = result_db.connect(results_db)
+            with conn:
+                for run in result_db.parse_result_file(path):
+                    result_db.ingest_run(conn, run)
+            conn.close()
+            print(f"[Result DB] Stored {len(self.trials)} trials in {results_db}")
+        return summary
+
+    def summarize(self):
+        valid = [t for t in self.trials if t["valid"]]
+        per_stream = {}
+        for trial in valid:
+            for tid, value in trial["streams"].items():
+                per_stream.setdefault(tid, []).append(value)
+        aggregates = [t["aggregate"] for t in valid]
+        return {
+            "metric": self.trials[0]["metric"] if self.trials else None,
+            "valid_trials": len(valid),
+            "invalid_trials": [t["trial"] for t in self.trials if not t["valid"]],
+            "confidence": self.confidence,
+            "aggregate": describe(aggregates, self.confidence, self.seed),
+            "streams": {tid: describe(v, self.confidence, self.seed) for tid, v in sorted(per_stream.items())},
+        }
+
+    def print_summary(self, summary):
+        unit = "Gbps" if self.perf.latency == "bw" else "usec"
+        agg = summary["aggregate"]
+        label = "Aggregate" if self.perf.latency == "bw" else "Mean across streams"
+        print(f"\n[Summary] {summary['valid_trials']}/{self.repeat} valid trials, metric {summary['metric']}, "
+              f"{self.confidence * 100:.0f}% bootstrap CI:")
+        if summary["invalid_trials"]:
+            print(f"- Left out (failed, timed-out or incomplete streams): trials "
+                  f"{', '.join(str(t + 1) for t in summary['invalid_trials'])}")
+        if not summary["valid_trials"]:
+            return
+        print(f"- {label}: {agg['mean']:.2f} {unit} (stdev {agg['stdev']:.2f}, "
+              f"CI {agg['ci_low']:.2f} .. {agg['ci_high']:.2f})")
+        for tid, d in summary["streams"].items():
+            print(f"  [Thread {tid}] {d['mean']:.2f} {unit} (stdev {d['stdev']:.2f}, "
+                  f"CI {d['ci_low']:.2f} .. {d['ci_high']:.2f}, n={d['n']})")
+
+    def write_trials(self, summary):
+        os.makedirs("logs", exist_ok=True)
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = f"logs/trials_{self.perf.client_id}_{ts}.json"
+        with open(path, "w") as f:
+            json.dump({
+                "config": self.perf.run_config(),
+                "env": get_run_environment(self.perf.device),
+                "repeat": self.repeat,
+                "shuffle": self.shuffle,
+                "summary": summary,
+                "trials": self.trials,
+            }, f, indent=2)
+        print(f"[Trials] Raw trials written to {path}")
+        return path